@@ -0,0 +1,226 @@
+"""
+Benchmarks of the loss pipeline of the qbs_kerr package on CPU.
+
+Times each stage of the loss (F_terms, FTermsEngine, G_terms, NeuralNetwork.forward, the autograd gradients,
+the Taylor mode derivatives, a CustomLoss forward and forward+backward, and the last two with fused networks) and one full Adam step and one LBFGS step,
+for every combination of N_x = N_u, neurons_per_layer, hidden_layers and dtype,
+and the startup time of the modules of the package and of the qbs-kerr command in a new interpreter.
+The results are written to a JSON file, which can be compared with a stored baseline:
+
+	python bench_QBS_K.py --output bench_QBS_K.json
+	python bench_QBS_K.py --baseline bench_QBS_K.json --tolerance 0.2
+
+Stages more than tolerance slower than in the baseline are reported as regressions (and the exit status is 1).
+"""
+
+import argparse
+import datetime
+import itertools
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+import numpy as np
+import torch
+
+import qbs_kerr as QBS
+
+DTYPES = {"float64": torch.float64, "float32": torch.float32}
+
+def time_stage(function, repeats, warmup):
+	"""
+	Runs function warmup times and then times repeats runs.
+	Returns the median and the minimum time of a run, in milliseconds.
+	"""
+	for _ in range(warmup):
+		function()
+
+	times = []
+	for _ in range(repeats):
+		start = time.perf_counter()
+		function()
+		times.append(1e3*(time.perf_counter() - start))
+
+	return statistics.median(times), min(times)
+
+def stages(N, neurons_per_layer, hidden_layers, dtype, a = 0.9, mu = 0.4, l = 1, m = 1, sign = -1):
+	"""
+	Returns a dictionary with the functions that run each stage of the loss for one configuration.
+	"""
+	torch.set_default_dtype(torch.float64)
+	r_plus = 1 + np.sqrt(1 - a**2) #M = 1
+	x = torch.linspace(0,1/r_plus,N).view(-1,1).requires_grad_(True)
+	u = torch.linspace(-1,1,N).view(-1,1).requires_grad_(True)
+
+	init_w_real, init_w_img = QBS.Detweiler(l,m,a,mu)
+	hp = QBS.SWEEP_HYPERPARAMETERS
+	model = QBS.NeuralNetwork(activation = "tanh", std_radial = hp["std_radial"], std_ang_optuna = hp["std_ang"], random_seed = 15,
+		hidden_layers = hidden_layers, neurons_per_layer = neurons_per_layer, l = l, m = m, init_w_real = init_w_real, init_w_img = init_w_img)
+	model_loss = QBS.CustomLoss(model,a,mu,sign,w_real = init_w_real,w_img = init_w_img)
+
+	#The same networks evaluated together (see TwinNetwork)
+	fused_model = QBS.NeuralNetwork(activation = "tanh", std_radial = hp["std_radial"], std_ang_optuna = hp["std_ang"], random_seed = 15,
+		hidden_layers = hidden_layers, neurons_per_layer = neurons_per_layer, l = l, m = m, init_w_real = init_w_real, init_w_img = init_w_img,
+		fused = True)
+	fused_loss = QBS.CustomLoss(fused_model,a,mu,sign,w_real = init_w_real,w_img = init_w_img)
+
+	#Stages in the precision of the benchmark
+	model.to(dtype)
+	fused_model.to(dtype)
+	x = x.detach().to(dtype).requires_grad_(True)
+	u = u.detach().to(dtype).requires_grad_(True)
+	w, A = [value.detach() for value in model_loss.eigenvalues()]
+
+	def network_gradients():
+		f, g = model(x,u,a)
+		dfdx = QBS.gradients(f, x)
+		QBS.gradients(dfdx, x)
+		dgdu = QBS.gradients(g, u)
+		QBS.gradients(dgdu, u)
+
+	def backward(model = model, model_loss = model_loss):
+		model.zero_grad()
+		model_loss(x,u,1).backward()
+
+	adam = torch.optim.Adam(model.parameters(), lr = hp["lr_Adam"])
+	def adam_step():
+		adam.zero_grad()
+		model_loss(x,u,1).backward()
+		adam.step()
+
+	lbfgs = torch.optim.LBFGS(model.parameters(), lr = hp["lr_LBFGS"])
+	def closure():
+		lbfgs.zero_grad()
+		loss = model_loss(x,u,1)
+		loss.backward()
+		return loss
+
+	#The F and G terms are evaluated in double precision, as in CustomLoss
+	w, A = w.to(torch.complex128), A.to(torch.complex128)
+	x_double, u_double = x.detach().to(torch.float64), u.detach().to(torch.float64)
+	l_a, l_m, l_mu, l_sign = model_loss.a, model_loss.m, model_loss.mu, model_loss.sign
+
+	return {
+		"F_terms": lambda: QBS.F_terms(l_a,w,A,l_m,x_double,l_mu,l_sign),
+		"FTermsEngine": lambda: model_loss.F_engine(w,A,x,l_sign),
+		"G_terms": lambda: QBS.G_terms(l_a,w,A,l_m,u_double,l_mu,l_sign),
+		"NeuralNetwork.forward": lambda: model(x,u,a),
+		"gradients": network_gradients,
+		"forward_derivatives": lambda: model.forward_derivatives(x,u,a),
+		"CustomLoss.forward": lambda: model_loss(x,u,1),
+		"CustomLoss.forward+backward": backward,
+		"fused forward_derivatives": lambda: fused_model.forward_derivatives(x,u,a),
+		"fused CustomLoss.forward+backward": lambda: backward(fused_model, fused_loss),
+		"Adam step": adam_step,
+		"LBFGS step": lambda: lbfgs.step(closure),
+	}
+
+#Commands whose startup time (in a new interpreter) is measured, e.g. the import in each spawned worker of the study
+STARTUP = {
+	"import qbs_kerr": "import qbs_kerr",
+	"import qbs_kerr.physics": "import qbs_kerr.physics",
+	"import qbs_kerr.networks": "import qbs_kerr.networks",
+	"import qbs_kerr.loss": "import qbs_kerr.loss",
+	"import qbs_kerr.training": "import qbs_kerr.training",
+	"import qbs_kerr.study": "import qbs_kerr.study",
+	"qbs-kerr --help": "import contextlib, io\nfrom qbs_kerr.cli import main\nwith contextlib.redirect_stdout(io.StringIO()), contextlib.suppress(SystemExit): main(['--help'])",
+}
+
+def startup(repeats):
+	"""
+	Times each command of STARTUP in a new Python interpreter (repeats times) and checks that matplotlib is not imported.
+	Returns the list of results.
+	"""
+	directory = os.path.dirname(os.path.abspath(__file__))
+	results = []
+	for stage, command in STARTUP.items():
+		check = command + "\nimport sys\nprint('matplotlib' in sys.modules)"
+		times = []
+		for _ in range(repeats):
+			start = time.perf_counter()
+			output = subprocess.run([sys.executable, "-c", check], cwd = directory, capture_output = True, text = True, check = True).stdout
+			times.append(1e3*(time.perf_counter() - start))
+		matplotlib = output.split()[-1] == "True"
+		results.append({"stage": stage, "N": 0, "neurons_per_layer": 0, "hidden_layers": 0, "dtype": "", "median_ms": statistics.median(times),
+			"min_ms": min(times), "repeats": repeats, "matplotlib": matplotlib})
+		print(f"Startup: {stage} {statistics.median(times):.1f} ms" + (" (imports matplotlib)" if matplotlib else ""))
+
+	return results
+
+def run(N_list, neurons_list, layers_list, dtype_list, repeats, warmup, threads = None, startup_repeats = 0):
+	"""
+	Times every stage for every configuration. Returns the dictionary written to the JSON file.
+	"""
+	if threads is not None:
+		torch.set_num_threads(threads)
+
+	results = startup(startup_repeats) if startup_repeats else []
+	for N, neurons_per_layer, hidden_layers, dtype in itertools.product(N_list, neurons_list, layers_list, dtype_list):
+		for stage, function in stages(N, neurons_per_layer, hidden_layers, DTYPES[dtype]).items():
+			median, minimum = time_stage(function, repeats, warmup)
+			results.append({"stage": stage, "N": N, "neurons_per_layer": neurons_per_layer, "hidden_layers": hidden_layers,
+				"dtype": dtype, "median_ms": median, "min_ms": minimum, "repeats": repeats})
+			print(f"N = {N}, neurons = {neurons_per_layer}, layers = {hidden_layers}, {dtype}: {stage} {median:.3f} ms")
+
+	return {"date": datetime.datetime.now().isoformat(), "python": platform.python_version(), "torch": torch.__version__,
+		"numpy": np.__version__, "machine": platform.machine(), "processor": platform.processor(), "cpu_count": os.cpu_count(),
+		"threads": torch.get_num_threads(), "results": results}
+
+def key(result):
+	return (result["stage"], result["N"], result["neurons_per_layer"], result["hidden_layers"], result["dtype"])
+
+def compare(run, baseline, tolerance):
+	"""
+	Compares the median times of run with the ones of the baseline (both dictionaries returned by run).
+	Returns the list of regressions, the results more than tolerance (fraction) slower than the baseline.
+	"""
+	reference = {key(result): result for result in baseline["results"]}
+	regressions = []
+	for result in run["results"]:
+		old = reference.get(key(result))
+		if old is None:
+			continue
+		ratio = result["median_ms"]/old["median_ms"]
+		if ratio > 1 + tolerance:
+			regressions.append({**result, "baseline_ms": old["median_ms"], "ratio": ratio})
+			print(f"REGRESSION {key(result)}: {old['median_ms']:.3f} ms -> {result['median_ms']:.3f} ms ({ratio:.2f}x)")
+
+	return regressions
+
+def main(argv = None):
+	parser = argparse.ArgumentParser(description = "Benchmarks of the loss pipeline of the qbs_kerr package")
+	parser.add_argument("--N", type = int, nargs = "+", default = [100, 1000], help = "numbers of collocation points N_x = N_u")
+	parser.add_argument("--neurons", type = int, nargs = "+", default = [100, 300], help = "neurons per layer")
+	parser.add_argument("--layers", type = int, nargs = "+", default = [2], help = "hidden layers")
+	parser.add_argument("--dtype", nargs = "+", default = ["float64", "float32"], choices = list(DTYPES))
+	parser.add_argument("--repeats", type = int, default = 20)
+	parser.add_argument("--warmup", type = int, default = 3)
+	parser.add_argument("--startup-repeats", type = int, default = 3, help = "runs of each startup measurement (0 disables them)")
+	parser.add_argument("--threads", type = int, default = None, help = "torch threads (default: the torch default)")
+	parser.add_argument("--output", default = "bench_QBS_K.json", help = "JSON file with the results")
+	parser.add_argument("--baseline", default = None, help = "JSON file of a previous run to compare with")
+	parser.add_argument("--tolerance", type = float, default = 0.2, help = "relative slowdown reported as a regression")
+	args = parser.parse_args(argv)
+
+	results = run(args.N, args.neurons, args.layers, args.dtype, args.repeats, args.warmup, args.threads, args.startup_repeats)
+
+	regressions = []
+	if args.baseline is not None:
+		with open(args.baseline) as file:
+			baseline = json.load(file)
+		regressions = compare(results, baseline, args.tolerance)
+		results["baseline"] = args.baseline
+		results["regressions"] = regressions
+		print(f"{len(regressions)} regressions with respect to {args.baseline}")
+
+	with open(args.output, "w") as file:
+		json.dump(results, file, indent = 1)
+
+	return 1 if regressions else 0
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,59 @@
+"""
+Physics-informed neural networks for the quasi-bound states (QBS) of a massive Klein-Gordon field in the Kerr spacetime,
+with the hyperparameter study in Optuna.
+
+The package is split in modules that can be imported separately:
+- physics - Detweiler's frequencies and the F and G terms of the radial and angular equations;
+- networks - the neural networks and the derivatives of their outputs;
+- loss - the loss function (CustomLoss), its multi-mode version, its compiled backend and the ensemble of models;
+- reference - Leaver's reference frequencies and the errors of the results;
+- spectral - the Chebyshev spectral solver of the equations, a fast baseline and initial guess of the PINN;
+- training - the training loop (train_model) and its collocation points, checkpoints and convergence monitor,
+	and the training of ensembles and of several modes at once;
+- trajectories - the columnar store of the per-epoch trajectories of the trials;
+- study - the objective of the Optuna study and the parallel study runner;
+- pruning - the pruner that extrapolates the learning curves of the trials;
+- inference - the streaming export of the trained radial and angular functions on dense grids;
+- sweep, benchmarks, profiling, health, plotting and cli (the qbs-kerr command).
+The names of all of them are also available from the package, imported on first use,
+so "import qbs_kerr" does not load torch, optuna or matplotlib.
+"""
+import importlib
+
+#Module of each name exported by the package
+_EXPORTS = {
+	"device": "backend",
+	"plot_losses": "plotting",
+	"Detweiler": "physics", "F_numerators": "physics", "F_terms": "physics",
+	"Polynomial": "physics", "FTermsEngine": "physics", "G_terms": "physics",
+	"gradients": "networks", "taylor_forward": "networks", "NeuralNetwork": "networks", "MultiModeNetwork": "networks",
+	"PhaseProfiler": "profiling",
+	"HealthMonitor": "health", "NumericalInstability": "health",
+	"CustomLoss": "loss", "compile_function": "loss", "compile_loss": "loss", "NeuralNetworkEnsemble": "loss", "MultiModeLoss": "loss",
+	"LEAVER_CACHE_PATH": "reference", "spheroidal_eigenvalue": "reference", "leaver_continued_fraction": "reference",
+	"Leaver": "reference", "print_results_QNM": "reference",
+	"chebyshev_gauss": "spectral", "barycentric_row": "spectral", "SpectralSolver": "spectral", "spectral_QBS": "spectral",
+	"collocation_points": "training", "CollocationSampler": "training", "TrialCheckpointer": "training",
+	"ConvergenceMonitor": "training", "EigenvalueRefiner": "training", "train_model": "training", "train_ensemble": "training", "train_modes": "training",
+	"TRAJECTORY_COLUMNS": "trajectories", "TrajectoryWriter": "trajectories", "TrajectoryStore": "trajectories",
+	"SWEEP_HYPERPARAMETERS": "sweep", "nearest_solved": "sweep", "sweep_QBS": "sweep",
+	"benchmark_continuation": "benchmarks", "benchmark_compile": "benchmarks", "benchmark_precision": "benchmarks",
+	"benchmark_spectral": "benchmarks", "benchmark_modes": "benchmarks", "benchmark_refinement": "benchmarks",
+	"benchmark_chunks": "benchmarks", "benchmark_export": "benchmarks",
+	"TrajectoryExtrapolationPruner": "pruning", "create_pruner": "pruning",
+	"RADIAL_COLUMNS": "inference", "ANGULAR_COLUMNS": "inference", "export_profiles": "inference",
+	"FIDELITY_RUNGS": "study", "objective": "study", "get_storage": "study", "study_worker": "study",
+	"resume_interrupted_trials": "study", "run_parallel_study": "study", "print_study_statistics": "study",
+}
+
+__all__ = list(_EXPORTS)
+
+def __getattr__(name):
+	if name not in _EXPORTS:
+		raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+	value = getattr(importlib.import_module(f".{_EXPORTS[name]}", __name__), name)
+	globals()[name] = value
+	return value
+
+def __dir__():
+	return sorted(list(globals()) + __all__)
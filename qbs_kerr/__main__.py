@@ -0,0 +1,7 @@
+"""
+Runs the study from the command line (see qbs_kerr.cli).
+"""
+from .cli import main
+
+if __name__ == "__main__":
+	main()
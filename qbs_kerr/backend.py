@@ -0,0 +1,7 @@
+"""
+Device of the package: the first GPU if there is one, otherwise the CPU.
+"""
+import torch
+
+#Use GPUs to speed up code
+device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
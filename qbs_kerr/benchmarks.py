@@ -0,0 +1,342 @@
+"""
+Benchmarks of the continuation of the sweep, the compiled backend, the mixed precision policy, the spectral initial guess,
+the multi-mode training, the Levenberg-Marquardt refinement of the eigenvalues and the memory of the chunked loss.
+"""
+import torch
+import numpy as np
+import os
+import datetime
+import multiprocessing
+
+from .backend import device
+from .physics import Detweiler
+from .networks import NeuralNetwork
+from .loss import CustomLoss, compile_loss
+from .reference import print_results_QNM
+from .spectral import spectral_QBS
+from .health import NumericalInstability
+from .profiling import PhaseProfiler
+from .training import train_model, train_modes, EigenvalueRefiner
+from .sweep import SWEEP_HYPERPARAMETERS, sweep_QBS
+from .inference import export_profiles
+
+def benchmark_continuation(grid, hyperparameters = None, stop_loss = 1e-3, report_every = 10):
+	"""
+	Measures the saving of the warm-start continuation of sweep_QBS: the grid is solved from scratch at every point
+	and with continuation, both stopping when the loss reaches stop_loss (continuation with the full epoch budget,
+	so both runs are only limited by stop_loss), and the epochs and time per point are compared.
+	Returns a dictionary with both tables and the total epochs and seconds of each run.
+	"""
+	cold = sweep_QBS(grid, hyperparameters, table_path = None, warm_start = False, stop_loss = stop_loss, report_every = report_every)
+	warm = sweep_QBS(grid, hyperparameters, table_path = None, warm_start = True, warm_epochs_fraction = 1.0, stop_loss = stop_loss,
+		report_every = report_every)
+
+	summary = {"cold": cold, "warm": warm}
+	for name, table in (("cold", cold), ("warm", warm)):
+		summary[name + "_epochs"] = sum(row["epochs"] for row in table)
+		summary[name + "_seconds"] = sum(row["seconds"] for row in table)
+
+	print("Point (a, mu, l, m) | epochs cold | epochs warm")
+	for row_cold, row_warm in zip(cold, warm):
+		print(f"({row_cold['a']}, {row_cold['mu']}, {row_cold['l']}, {row_cold['m']}) | {row_cold['epochs']} | {row_warm['epochs']}")
+	print(f"Total epochs: {summary['cold_epochs']} cold, {summary['warm_epochs']} warm "
+		f"({summary['cold_seconds']:.1f} s and {summary['warm_seconds']:.1f} s)")
+
+	return summary
+
+def benchmark_compile(a = 0.9, mu = 0.4, l = 1, m = 1, sign = -1, N_x = 100, N_u = 100, hidden_layers = 2, neurons_per_layer = 300,
+		lr_Adam = 1e-3, epochs = 100, backend = "inductor", mode = None):
+	"""
+	Compares the eager and the compiled backend (compile_loss): the same model is trained for epochs Adam epochs with each one.
+	Prints the compilation time, the time per epoch of both and the largest relative difference of their losses.
+	Returns a dictionary with these values.
+	"""
+	torch.set_default_dtype(torch.float64)
+
+	r_plus = 1 + np.sqrt(1 - a**2) #M = 1
+	x = torch.linspace(0,1/r_plus,N_x).view(-1,1).requires_grad_(True).to(device)
+	u = torch.linspace(-1,1,N_u).view(-1,1).requires_grad_(True).to(device)
+	init_w_real, init_w_img = Detweiler(l,m,a,mu)
+
+	summary = {}
+	losses = {}
+	for name in ("eager", "compiled"):
+		model = NeuralNetwork(activation = "tanh", std_radial = SWEEP_HYPERPARAMETERS["std_radial"], std_ang_optuna = SWEEP_HYPERPARAMETERS["std_ang"],
+			random_seed = 15, hidden_layers = hidden_layers, neurons_per_layer = neurons_per_layer, l = l, m = m,
+			init_w_real = init_w_real, init_w_img = init_w_img).to(device)
+		model_loss = CustomLoss(model,a,mu,sign,w_real = init_w_real,w_img = init_w_img).to(device)
+		if name == "compiled":
+			compile_loss(model_loss, backend, mode)
+
+		#The first evaluation compiles the networks
+		start = datetime.datetime.now()
+		model_loss(x,u,1).backward()
+		summary[name + "_first_epoch"] = (datetime.datetime.now() - start).total_seconds()
+
+		start = datetime.datetime.now()
+		history = train_model(model, model_loss, x, u, 1, lr_Adam, epochs, 1, 0, 0)
+		summary[name + "_epoch"] = (datetime.datetime.now() - start).total_seconds()/epochs
+		losses[name] = history["loss"]
+
+	summary["speedup"] = summary["eager_epoch"]/summary["compiled_epoch"]
+	summary["loss_difference"] = float(np.max(np.abs(losses["compiled"] - losses["eager"])/np.abs(losses["eager"])))
+
+	print(f"First epoch: {summary['eager_first_epoch']:.3f} s eager, {summary['compiled_first_epoch']:.3f} s compiled")
+	print(f"Time per epoch: {1e3*summary['eager_epoch']:.2f} ms eager, {1e3*summary['compiled_epoch']:.2f} ms compiled "
+		f"(speedup {summary['speedup']:.2f})")
+	print(f"Largest relative difference of the losses: {summary['loss_difference']:.2e}")
+
+	return summary
+
+def benchmark_precision(a = 0.9, mu = 0.4, l = 1, m = 1, sign = -1, N_x = 100, N_u = 100, hyperparameters = None, epochs_Adam = None, epochs_LBFGS = None):
+	"""
+	Compares the training in float64 with the mixed precision policy (Adam phase in float32/complex64, LBFGS phase in float64)
+	for the same model: prints the time of the Adam phase and of the whole training and the errors of print_results_QNM of both.
+	The hyperparameters default to SWEEP_HYPERPARAMETERS (epochs_Adam and epochs_LBFGS override their epochs).
+	Returns a dictionary with these values.
+	"""
+	torch.set_default_dtype(torch.float64)
+	hp = dict(SWEEP_HYPERPARAMETERS if hyperparameters is None else hyperparameters)
+	epochs_Adam = hp["epochs_Adam"] if epochs_Adam is None else epochs_Adam
+	epochs_LBFGS = hp["epochs_LBFGS"] if epochs_LBFGS is None else epochs_LBFGS
+
+	r_plus = 1 + np.sqrt(1 - a**2) #M = 1
+	x = torch.linspace(0,1/r_plus,N_x).view(-1,1).requires_grad_(True).to(device)
+	u = torch.linspace(-1,1,N_u).view(-1,1).requires_grad_(True).to(device)
+	init_w_real, init_w_img = Detweiler(l,m,a,mu)
+
+	summary = {}
+	for name, adam_dtype in (("float64", None), ("mixed", torch.float32)):
+		model = NeuralNetwork(activation = "tanh", std_radial = hp["std_radial"], std_ang_optuna = hp["std_ang"], random_seed = 15,
+			hidden_layers = hp["hidden_layers"], neurons_per_layer = hp["neurons_per_layer"], l = l, m = m,
+			init_w_real = init_w_real, init_w_img = init_w_img).to(device)
+		model_loss = CustomLoss(model,a,mu,sign,w_real = init_w_real,w_img = init_w_img).to(device)
+
+		#The end of the Adam phase is the only reporting point before the last epoch
+		times = {}
+		def report(step, w_real, w_img, loss):
+			times.setdefault("Adam", (datetime.datetime.now() - start).total_seconds())
+
+		start = datetime.datetime.now()
+		train_model(model, model_loss, x, u, hp["weight_loss_factor"], hp["lr_Adam"], epochs_Adam, hp["restarts_optuna"],
+			hp["lr_LBFGS"], epochs_LBFGS, report = report, report_every = epochs_Adam + epochs_LBFGS, adam_dtype = adam_dtype)
+		summary[name + "_Adam_seconds"] = times["Adam"]
+		summary[name + "_seconds"] = (datetime.datetime.now() - start).total_seconds()
+		summary[name + "_error"] = print_results_QNM(model.w_real.item(), model.w_img.item(), a, mu, l, m)
+
+	for name in ("float64", "mixed"):
+		error_real, error_img, error_average = summary[name + "_error"]
+		print(f"{name}: Adam phase {summary[name + '_Adam_seconds']:.1f} s, total {summary[name + '_seconds']:.1f} s, "
+			f"errors {error_real:.3e} (real) {error_img:.3e} (imaginary) {error_average:.3e} (average)")
+
+	return summary
+
+def benchmark_spectral(grid = ((0.1, 0.4, 1, 1), (0.5, 0.4, 1, 1), (0.9, 0.4, 1, 1), (0.95, 0.4, 1, 1)), N_x = 48, N_u = 24):
+	"""
+	Compares the initial guesses of the PINN with Leaver's results: for every point (a, mu, l, m) of grid, prints the time
+	of spectral_QBS and the errors of print_results_QNM of its frequency and of Detweiler's frequency.
+	Returns a list with one dictionary per point.
+	"""
+	table = []
+	for a, mu, l, m in grid:
+		start = datetime.datetime.now()
+		seed = spectral_QBS(a, mu, l, m, N_x = N_x, N_u = N_u)
+		seconds = (datetime.datetime.now() - start).total_seconds()
+
+		table.append({"a": a, "mu": mu, "l": l, "m": m, "milliseconds": 1e3*seconds, "converged": seed["converged"],
+			"spectral_error": print_results_QNM(seed["w_real"], seed["w_img"], a, mu, l, m),
+			"Detweiler_error": print_results_QNM(*Detweiler(l,m,a,mu), a, mu, l, m)})
+
+	print("Point (a, mu, l, m) | time | errors spectral (real, imaginary) | errors Detweiler (real, imaginary)")
+	for row in table:
+		print(f"({row['a']}, {row['mu']}, {row['l']}, {row['m']}) | {row['milliseconds']:.1f} ms | "
+			f"{row['spectral_error'][0]:.2e} %, {row['spectral_error'][1]:.2e} % | {row['Detweiler_error'][0]:.2e} %, {row['Detweiler_error'][1]:.2e} %")
+
+	return table
+
+def benchmark_modes(modes = ((1, 1, 0), (1, 1, 1), (2, 2, 0)), a = 0.9, mu = 0.4, sign = -1, N_x = 100, N_u = 100, hidden_layers = 2,
+		neurons_per_layer = 300, epochs = 100):
+	"""
+	Compares the throughput of the multi-mode training (train_modes, one MultiModeNetwork for all the modes) with separate
+	runs of train_model (one NeuralNetwork per mode), with the same architecture, grids and epochs Adam epochs.
+	Prints the time per epoch and per mode of both and the final lossF and lossG of each mode.
+	Returns a dictionary with these values.
+	"""
+	torch.set_default_dtype(torch.float64)
+	hp = SWEEP_HYPERPARAMETERS
+
+	r_plus = 1 + np.sqrt(1 - a**2) #M = 1
+	x = torch.linspace(0,1/r_plus,N_x).view(-1,1).to(device)
+	u = torch.linspace(-1,1,N_u).view(-1,1).to(device)
+
+	summary = {"separate": []}
+	start = datetime.datetime.now()
+	for l, m, n in modes:
+		init_w_real, init_w_img = Detweiler(l,m,a,mu,n)
+		model = NeuralNetwork(activation = "tanh", std_radial = hp["std_radial"], std_ang_optuna = hp["std_ang"], random_seed = 15,
+			hidden_layers = hidden_layers, neurons_per_layer = neurons_per_layer, l = l, m = m, n = n,
+			init_w_real = init_w_real, init_w_img = init_w_img).to(device)
+		model_loss = CustomLoss(model,a,mu,sign,w_real = init_w_real,w_img = init_w_img).to(device)
+		history = train_model(model, model_loss, x, u, hp["weight_loss_factor"], hp["lr_Adam"], epochs, hp["restarts_optuna"], 0, 0)
+		summary["separate"].append((history["lossF"][-1], history["lossG"][-1]))
+	summary["separate_epoch_per_mode"] = (datetime.datetime.now() - start).total_seconds()/(epochs*len(modes))
+
+	start = datetime.datetime.now()
+	_, results = train_modes(modes, a, mu, sign, N_x = N_x, N_u = N_u, hidden_layers = hidden_layers, neurons_per_layer = neurons_per_layer,
+		std_radial = hp["std_radial"], std_ang = hp["std_ang"], lr_Adam = hp["lr_Adam"], epochs_Adam = epochs,
+		restarts_optuna = hp["restarts_optuna"], weight_loss_factor = hp["weight_loss_factor"], initial_guess = "detweiler")
+	summary["shared_epoch_per_mode"] = (datetime.datetime.now() - start).total_seconds()/(epochs*len(modes))
+	summary["shared"] = [(result["lossF"], result["lossG"]) for result in results]
+	summary["speedup"] = summary["separate_epoch_per_mode"]/summary["shared_epoch_per_mode"]
+
+	print(f"Time per epoch and per mode: {1e3*summary['separate_epoch_per_mode']:.2f} ms separate, "
+		f"{1e3*summary['shared_epoch_per_mode']:.2f} ms shared trunk (speedup {summary['speedup']:.2f})")
+	print("Mode (l, m, n) | lossF, lossG separate | lossF, lossG shared trunk")
+	for mode, separate, shared in zip(modes, summary["separate"], summary["shared"]):
+		print(f"{tuple(mode)} | {separate[0]:.3e}, {separate[1]:.3e} | {shared[0]:.3e}, {shared[1]:.3e}")
+
+	return summary
+
+def benchmark_refinement(a = 0.9, mu = 0.4, l = 1, m = 1, sign = -1, N_x = 100, N_u = 100, hyperparameters = None, epochs_Adam = None,
+		epochs_LBFGS = None, report_every = 10):
+	"""
+	Compares the refinement phases of train_model after the same Adam phase: the LBFGS steps of all the parameters, alone and
+	followed by the polish stage of Levenberg-Marquardt steps of the eigenvalues (EigenvalueRefiner).
+	Every report_every epochs prints the average error of print_results_QNM and the time of both phases
+	(a phase whose loss becomes NaN or Inf ends there).
+	The hyperparameters default to SWEEP_HYPERPARAMETERS (epochs_Adam and epochs_LBFGS override their epochs).
+	Returns a dictionary with the errors and seconds of each reporting point of both phases.
+	"""
+	torch.set_default_dtype(torch.float64)
+	hp = dict(SWEEP_HYPERPARAMETERS if hyperparameters is None else hyperparameters)
+	epochs_Adam = hp["epochs_Adam"] if epochs_Adam is None else epochs_Adam
+	epochs_LBFGS = hp["epochs_LBFGS"] if epochs_LBFGS is None else epochs_LBFGS
+
+	r_plus = 1 + np.sqrt(1 - a**2) #M = 1
+	x = torch.linspace(0,1/r_plus,N_x).view(-1,1).requires_grad_(True).to(device)
+	u = torch.linspace(-1,1,N_u).view(-1,1).requires_grad_(True).to(device)
+	init_w_real, init_w_img = Detweiler(l,m,a,mu)
+
+	model = NeuralNetwork(activation = "tanh", std_radial = hp["std_radial"], std_ang_optuna = hp["std_ang"], random_seed = 15,
+		hidden_layers = hp["hidden_layers"], neurons_per_layer = hp["neurons_per_layer"], l = l, m = m,
+		init_w_real = init_w_real, init_w_img = init_w_img).to(device)
+	model_loss = CustomLoss(model,a,mu,sign,w_real = init_w_real,w_img = init_w_img).to(device)
+	train_model(model, model_loss, x, u, hp["weight_loss_factor"], hp["lr_Adam"], epochs_Adam, hp["restarts_optuna"], 0, 0)
+	state = {name: value.clone() for name, value in model.state_dict().items()}
+
+	summary = {}
+	for name, refiner in (("LBFGS", None), ("LM", EigenvalueRefiner())):
+		model.load_state_dict(state)
+		rows = []
+		def report(step, w_real, w_img, loss):
+			rows.append((step + 1, print_results_QNM(w_real, w_img, a, mu, l, m)[2], (datetime.datetime.now() - start).total_seconds()))
+
+		start = datetime.datetime.now()
+		try:
+			train_model(model, model_loss, x, u, hp["weight_loss_factor"], hp["lr_Adam"], 0, hp["restarts_optuna"], hp["lr_LBFGS"], epochs_LBFGS,
+				report = report, report_every = report_every, refiner = refiner)
+		except NumericalInstability as error:
+			print(f"{name}: {error}")
+		summary[name] = rows
+
+	print("Epoch | average error LBFGS (time) | average error LBFGS + LM (time)")
+	for k in range(max(len(summary["LBFGS"]), len(summary["LM"]))):
+		rows = [summary["LBFGS"], summary["LM"]]
+		epoch = (rows[0] if k < len(rows[0]) else rows[1])[k][0]
+		columns = [f"{row[k][1]:.3e} % ({row[k][2]:.1f} s)" if k < len(row) else "-" for row in rows]
+		print(f"{epoch} | {columns[0]} | {columns[1]}")
+
+	return summary
+
+def _chunk_memory(a, mu, l, m, sign, N_x, N_u, hidden_layers, neurons_per_layer, chunk_size, activation_checkpointing):
+	#One evaluation of the loss and its gradients, in a fresh process (the peak memory of a process never decreases)
+	torch.set_default_dtype(torch.float64)
+	r_plus = 1 + np.sqrt(1 - a**2) #M = 1
+	x = torch.linspace(0,1/r_plus,N_x).view(-1,1).to(device)
+	u = torch.linspace(-1,1,N_u).view(-1,1).to(device)
+	init_w_real, init_w_img = Detweiler(l,m,a,mu)
+	model = NeuralNetwork(activation = "tanh", std_radial = SWEEP_HYPERPARAMETERS["std_radial"], std_ang_optuna = SWEEP_HYPERPARAMETERS["std_ang"],
+		random_seed = 15, hidden_layers = hidden_layers, neurons_per_layer = neurons_per_layer, l = l, m = m,
+		init_w_real = init_w_real, init_w_img = init_w_img).to(device)
+	model_loss = CustomLoss(model,a,mu,sign,w_real = init_w_real,w_img = init_w_img,chunk_size = chunk_size,
+		activation_checkpointing = activation_checkpointing).to(device)
+
+	baseline = PhaseProfiler.peak_memory()
+	start = datetime.datetime.now()
+	if chunk_size is not None and not activation_checkpointing:
+		loss = model_loss.blocks(x,u,1,backward = True)
+	else:
+		loss = model_loss(x,u,1)
+		loss.backward()
+	seconds = (datetime.datetime.now() - start).total_seconds()
+
+	return {"loss": loss.item(), "memory_MB": PhaseProfiler.peak_memory() - baseline, "seconds": seconds}
+
+def benchmark_chunks(a = 0.9, mu = 0.4, l = 1, m = 1, sign = -1, N_x = 100000, N_u = 100000, hidden_layers = 2, neurons_per_layer = 300,
+		chunk_sizes = (None, 16384, 4096, 1024)):
+	"""
+	Measures the memory of one evaluation of the loss and its gradients on a large grid, with all the points at once (chunk_size None)
+	and in blocks of each chunk_size (see CustomLoss.blocks), with the gradients accumulated block by block and with activation
+	checkpointing. Each evaluation runs in its own process, whose peak memory above the one after building the model is measured.
+	Prints the memory, the time and the loss of each one. Returns a list with one dictionary per evaluation.
+	"""
+	context = multiprocessing.get_context("spawn")
+	table = []
+	for chunk_size in chunk_sizes:
+		for activation_checkpointing in ((False,) if chunk_size is None else (False, True)):
+			with context.Pool(1) as pool:
+				row = pool.apply(_chunk_memory, (a, mu, l, m, sign, N_x, N_u, hidden_layers, neurons_per_layer, chunk_size, activation_checkpointing))
+			table.append(dict(row, chunk_size = chunk_size, activation_checkpointing = activation_checkpointing))
+
+	print("Chunk size | checkpointing | memory | time | loss")
+	for row in table:
+		print(f"{row['chunk_size']} | {row['activation_checkpointing']} | {row['memory_MB']:.0f} MB | {row['seconds']:.2f} s | {row['loss']:.15e}")
+
+	return table
+
+def _export_memory(a, N, hidden_layers, neurons_per_layer, batch_size, directory):
+	#One export of f and g, in a fresh process; batch_size None evaluates all the points at once with autograd enabled, as in the training
+	torch.set_default_dtype(torch.float64)
+	init_w_real, init_w_img = Detweiler(1,1,a,0.4)
+	model = NeuralNetwork(activation = "tanh", std_radial = SWEEP_HYPERPARAMETERS["std_radial"], std_ang_optuna = SWEEP_HYPERPARAMETERS["std_ang"],
+		random_seed = 15, hidden_layers = hidden_layers, neurons_per_layer = neurons_per_layer, l = 1, m = 1,
+		init_w_real = init_w_real, init_w_img = init_w_img).to(device)
+	paths = [os.path.join(directory, f"{batch_size}_{kind}.npy") for kind in ("radial", "angular")]
+
+	baseline = PhaseProfiler.peak_memory()
+	start = datetime.datetime.now()
+	if batch_size is None:
+		r_plus = 1 + np.sqrt(1 - a**2) #M = 1
+		x = torch.linspace(0,1/r_plus,N).view(-1,1).to(device)
+		u = torch.linspace(-1,1,N).view(-1,1).to(device)
+		f, g = model(x,u,a)
+		np.save(paths[0], torch.view_as_real(f).detach().cpu().numpy())
+		np.save(paths[1], torch.view_as_real(g).detach().cpu().numpy())
+	else:
+		export_profiles(model, a, *paths, N_x = N, N_u = N, batch_size = batch_size)
+	seconds = (datetime.datetime.now() - start).total_seconds()
+
+	for path in paths:
+		os.remove(path)
+	return {"memory_MB": PhaseProfiler.peak_memory() - baseline, "seconds": seconds}
+
+def benchmark_export(a = 0.9, N = 200000, hidden_layers = 2, neurons_per_layer = 300, batch_sizes = (None, 65536, 16384, 4096),
+		directory = "."):
+	"""
+	Measures the memory and the time of the evaluation of f and g of a model on N points of x and N of u, written to .npy files
+	in directory: all the points at once with autograd enabled (batch_size None) and streamed by export_profiles in batches
+	of each batch_size. Each export runs in its own process, whose peak memory above the one after building the model is measured.
+	Prints the memory, the time and the points per second of each one. Returns a list with one dictionary per export.
+	"""
+	context = multiprocessing.get_context("spawn")
+	table = []
+	for batch_size in batch_sizes:
+		with context.Pool(1) as pool:
+			row = pool.apply(_export_memory, (a, N, hidden_layers, neurons_per_layer, batch_size, directory))
+		table.append(dict(row, batch_size = batch_size))
+
+	print("Batch size | memory | time | points per second")
+	for row in table:
+		print(f"{row['batch_size']} | {row['memory_MB']:.0f} MB | {row['seconds']:.2f} s | {2*N/row['seconds']:.3e}")
+
+	return table
@@ -0,0 +1,75 @@
+"""
+Command line interface of the study (the qbs-kerr command, or python -m qbs_kerr).
+The configuration of the study can be given in a JSON file (--config), with the keys of run_parallel_study and an
+"objective" dictionary with the keyword arguments of objective, and overridden by the options of the command line, e.g.
+
+	qbs-kerr --n-trials 200 --workers 4 --objective fidelity_rungs='[[0.25, 0.2], [0.5, 0.3], [1.0, 0.5]]' --objective mixed_precision=true
+"""
+import argparse
+import json
+import os
+
+def parse_value(text):
+	"""
+	Returns the value of a command line option as JSON, or as a string if it is not valid JSON.
+	"""
+	try:
+		return json.loads(text)
+	except json.JSONDecodeError:
+		return text
+
+def parse_arguments(argv = None):
+	parser = argparse.ArgumentParser(prog = "qbs-kerr", description = "Optuna study of the PINN for the QBS of a massive scalar field in Kerr")
+	parser.add_argument("--config", help = "JSON file with the configuration of the study")
+	parser.add_argument("--n-trials", type = int, help = "number of finished (complete or pruned) trials of the study (default 2000)")
+	parser.add_argument("--workers", type = int, help = "number of worker processes (default: one per core)")
+	parser.add_argument("--storage", help = "journal file (or .db/.sqlite3 file) of the study (default optuna_QBS_K.log)")
+	parser.add_argument("--study-name", help = "name of the study (default QBS_Kerr)")
+	parser.add_argument("--threads-per-worker", type = int, help = "torch threads of each worker")
+	parser.add_argument("--no-pin-cores", action = "store_true", help = "do not pin each worker to its cores")
+	parser.add_argument("--pruner", choices = ("hyperband", "extrapolation"),
+		help = "pruner of the study (default hyperband; extrapolation also prunes the trials whose extrapolated learning curve cannot reach the best ones)")
+	parser.add_argument("--checkpoint-dir", help = "directory of the checkpoints of the trials (default checkpoints_QBS_K)")
+	parser.add_argument("--objective", action = "append", default = [], metavar = "KEY=VALUE",
+		help = "keyword argument of objective (the value is parsed as JSON), can be repeated")
+	return parser.parse_args(argv)
+
+def study_configuration(args):
+	"""
+	Returns the keyword arguments of run_parallel_study from the configuration file and the command line options.
+	"""
+	config = {"n_trials": 2000, "n_workers": os.cpu_count()}
+	if args.config is not None:
+		with open(args.config) as file:
+			config.update(json.load(file))
+
+	options = {"n_trials": args.n_trials, "n_workers": args.workers, "storage_path": args.storage, "study_name": args.study_name,
+		"threads_per_worker": args.threads_per_worker, "checkpoint_dir": args.checkpoint_dir, "pruner": args.pruner}
+	config.update({key: value for key, value in options.items() if value is not None})
+	if args.no_pin_cores:
+		config["pin_cores"] = False
+
+	objective_kwargs = dict(config.pop("objective", None) or {})
+	for option in args.objective:
+		key, separator, value = option.partition("=")
+		if not separator:
+			raise SystemExit(f"--objective expects KEY=VALUE, got {option!r}")
+		objective_kwargs[key] = parse_value(value)
+	config["objective_kwargs"] = objective_kwargs or None
+
+	return config
+
+def main(argv = None):
+	args = parse_arguments(argv)
+	config = study_configuration(args)
+
+	#The study (and torch and optuna) is only imported once the options are valid
+	from .backend import device
+	from .study import run_parallel_study, print_study_statistics
+	print(device)
+
+	#One worker per core by default, all of them sharing the journal file of the study
+	study = run_parallel_study(**config)
+
+	print_study_statistics(study)
+	return study
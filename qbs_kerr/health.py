@@ -0,0 +1,76 @@
+"""
+Numerical health of the training: device-side NaN/Inf flags of the F and G terms, the loss and the eigenvalues.
+"""
+import torch
+
+class NumericalInstability(RuntimeError):
+	"""
+	Raised by train_model when the HealthMonitor finds a NaN or Inf at a reporting point.
+	The attribute diagnostics is a dictionary with the quantities that are not finite, the epochs and the eigenvalues.
+	"""
+	def __init__(self, diagnostics):
+		super(NumericalInstability, self).__init__(f"Non-finite {', '.join(diagnostics['quantities'])} at epoch {diagnostics['step']}")
+		self.diagnostics = diagnostics
+
+class HealthMonitor:
+	"""
+	NaN/Inf flags of the quantities of the loss, accumulated on the device of the tensors (torch.isfinite and a logical or),
+	so checking them never synchronizes with the host. The flags are only read by healthy, which train_model calls at
+	its reporting points.
+	Receives as arguments:
+	- enabled - if False, check does nothing (e.g. inside torch.func.vmap, where the flags would be batched tensors);
+	- action - what the objective does with a trial that is not healthy: "prune" (the trial is pruned)
+		or "fail" (the trial fails); in both cases the diagnostics are stored as a user_attr of the trial.
+	"""
+
+	#Quantities with a flag
+	QUANTITIES = ("F", "G", "loss", "eigenvalues")
+
+	def __init__(self, enabled = True, action = "prune"):
+		if action not in ("prune", "fail"):
+			raise ValueError(f"Unknown action of the health monitor: {action}")
+		self.enabled = enabled
+		self.action = action
+		self.flags = None
+		self.last_healthy_step = None
+
+	def reset(self):
+		self.flags = None
+		self.last_healthy_step = None
+
+	def check(self, name, *tensors):
+		"""
+		Flags the quantity name if any of the tensors has a NaN or an Inf.
+		"""
+		if not self.enabled:
+			return
+		index = self.QUANTITIES.index(name)
+		for tensor in tensors:
+			if self.flags is None or self.flags.device != tensor.device:
+				self.flags = torch.zeros(len(self.QUANTITIES), dtype = torch.bool, device = tensor.device)
+			self.flags[index] |= ~torch.isfinite(tensor.detach()).all()
+
+	def unhealthy(self):
+		"""
+		Returns the list of the quantities flagged since the last reset (it synchronizes with the device).
+		"""
+		if self.flags is None:
+			return []
+		return [name for name, flag in zip(self.QUANTITIES, self.flags.tolist()) if flag]
+
+	def healthy(self, step = None):
+		"""
+		Returns True if no quantity has been flagged, keeping step as the last healthy step.
+		"""
+		if self.unhealthy():
+			return False
+		self.last_healthy_step = step
+		return True
+
+	def diagnostics(self, step, phase, loss, eigenvalues):
+		"""
+		Returns a dictionary with the flagged quantities, the epoch and phase where they were found, the last healthy
+		reporting step, and the loss and the eigenvalues [w_real, w_img, A_real, A_img] of the epoch.
+		"""
+		return {"quantities": self.unhealthy(), "step": step, "phase": phase, "last_healthy_step": self.last_healthy_step,
+			"loss": loss, "w_real": eigenvalues[0], "w_img": eigenvalues[1], "A_real": eigenvalues[2], "A_img": eigenvalues[3]}
@@ -0,0 +1,63 @@
+"""
+Streaming evaluation of the trained radial and angular functions on dense grids, exported to memory-mappable .npy files.
+"""
+import os
+
+import torch
+import numpy as np
+
+#Columns of the exported files (one pair of real and imaginary columns per mode for a MultiModeNetwork)
+RADIAL_COLUMNS = ("x", "r", "f_real", "f_img")
+ANGULAR_COLUMNS = ("u", "theta", "g_real", "g_img")
+
+def _stream(path, N, low, high, batch_size, evaluate, coordinate, heads, dtype, device):
+	#Writes the rows (point, coordinate(point), Re, Im, ...) of N equally spaced points of [low, high], batch by batch
+	profile = np.lib.format.open_memmap(path, mode = "w+", dtype = np.float64, shape = (N, 2 + 2*heads))
+	step = (high - low)/max(N - 1, 1)
+	for start in range(0, N, batch_size):
+		stop = min(start + batch_size, N)
+		points = (low + step*torch.arange(start, stop, dtype = torch.float64)).to(dtype = dtype, device = device).view(-1,1)
+		values = torch.view_as_real(evaluate(points).reshape(len(points), heads)).reshape(len(points), -1)
+
+		points = points.view(-1).to(torch.float64).cpu().numpy()
+		profile[start:stop, 0] = points
+		with np.errstate(divide = "ignore"):
+			profile[start:stop, 1] = coordinate(points)
+		profile[start:stop, 2:] = values.to(torch.float64).cpu().numpy()
+	profile.flush()
+	del profile
+
+	return np.load(path, mmap_mode = "r")
+
+def export_profiles(model, a, radial_path, angular_path, N_x = 1000000, N_u = 1000000, batch_size = 65536):
+	"""
+	Evaluates the hard enforced f(x) and g(u) of a trained NeuralNetwork (or MultiModeNetwork) on N_x equally spaced points
+	of x in [0, 1/r_plus] and N_u of u in [-1, 1] (both ends included), and streams them in batches of batch_size points
+	to two .npy files created with np.lib.format.open_memmap. The points are generated batch by batch and the networks are
+	evaluated under torch.inference_mode, so neither an autograd graph nor the whole grid or output is ever held in memory.
+	The rows of the radial file are (x, r = 1/x, Re f, Im f), with r = inf at x = 0, and the ones of the angular file are
+	(u, theta = arccos(u), Re g, Im g) (see RADIAL_COLUMNS and ANGULAR_COLUMNS), with one pair of columns Re, Im per mode
+	for a MultiModeNetwork.
+	Receives as arguments:
+	- model - the trained NeuralNetwork;
+	- a - the spin parameter;
+	- radial_path, angular_path - the .npy files (overwritten if they exist);
+	- N_x, N_u - number of points of each grid;
+	- batch_size - number of points evaluated at once.
+	Returns the radial and angular arrays, memory-mapped read-only (np.load(path, mmap_mode = "r") opens them again).
+	"""
+	parameter = next(model.parameters())
+	heads = model.w_real.numel()
+	r_plus = 1 + np.sqrt(1 - a**2) #M = 1, as in the hard enforcement of NeuralNetwork.radial
+
+	for path in (radial_path, angular_path):
+		directory = os.path.dirname(os.path.abspath(path))
+		os.makedirs(directory, exist_ok = True)
+
+	with torch.inference_mode():
+		radial = _stream(radial_path, N_x, 0.0, 1/r_plus, batch_size, lambda x: model.radial(x, a), lambda x: 1/x,
+			heads, parameter.dtype, parameter.device)
+		angular = _stream(angular_path, N_u, -1.0, 1.0, batch_size, model.angular, np.arccos,
+			heads, parameter.dtype, parameter.device)
+
+	return radial, angular
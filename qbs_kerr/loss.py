@@ -0,0 +1,393 @@
+"""
+Loss function of the Teukolsky equation (CustomLoss), its multi-mode version, its compiled backend and the vectorized ensemble of models.
+"""
+import torch
+import torch.nn as nn
+import torch.utils.checkpoint
+import copy
+import functools
+import warnings
+
+from .physics import F_terms, FTermsEngine, G_terms
+from .networks import gradients, taylor_forward
+from .profiling import PhaseProfiler
+from .health import HealthMonitor
+
+class CustomLoss(nn.Module):
+	"""
+	Returns the Loss Function, defined here specifically for the Teukolsky Equation
+	Receives as arguments:
+	- Neural Network - interpolator of the NN;
+	- a - the spin parameter, value between 0 and 1 (float);
+	- r_plus - outer horizon radii of the Kerr metric (float);
+	- F_engine - if True, the F terms are evaluated with the precomputed FTermsEngine instead of F_terms;
+	- derivatives - "taylor" to propagate the derivatives of f and g through the networks in one pass,
+		or "autograd" to compute them with nested calls of gradients;
+	- chunk_size - optional number of points of each block of the chunked evaluation of the loss (see blocks);
+	- activation_checkpointing - if True, the blocks are evaluated with activation checkpointing (see blocks);
+	"""
+	def __init__(self,NeuralNetwork,a,mu,sign,w_real,w_img,M=1,F_engine=True,derivatives="taylor",chunk_size=None,activation_checkpointing=False):
+		super(CustomLoss,self).__init__()
+
+		self.NeuralNetwork = NeuralNetwork
+		self.a = torch.tensor(a)
+		self.mu = torch.tensor(mu)
+		self.sign = torch.tensor(sign)
+		self.w_real = torch.tensor(w_real)
+		self.w_img = torch.tensor(w_img)
+		self.M = torch.tensor(M)
+
+		self.l = NeuralNetwork.l
+		self.m = NeuralNetwork.m
+
+		#Precomputed coefficients of the F terms (None evaluates the full Mathematica expressions every call)
+		self.F_engine = FTermsEngine(a,self.m.item(),mu,M) if F_engine else None
+
+		if derivatives not in ("taylor", "autograd"):
+			raise ValueError(f"Unknown derivatives mode: {derivatives}")
+		self.derivatives = derivatives
+
+		#Blocks of points of the chunked evaluation (None evaluates all the points at once)
+		self.chunk_size = chunk_size
+		self.activation_checkpointing = activation_checkpointing
+
+		#NaN/Inf flags of the F and G terms, the loss and the eigenvalues, read by train_model at its reporting points
+		self.health = HealthMonitor()
+
+		#Timers of the phases of the loss (disabled unless train_model receives a profiler)
+		self.profiler = PhaseProfiler(enabled = False)
+
+		#The detached lossF and lossG of the last evaluation, kept for the history of train_model
+		#(not inside torch.func.vmap, where they would be batched tensors)
+		self.keep_components = True
+		self.components = None
+
+	def eigenvalues(self):
+		"""
+		Returns the eigenvalues w and A of the NeuralNetwork as complex numbers (with shape (K,) for a MultiModeNetwork).
+		"""
+
+		#Recover eigenvalues
+		w_real = self.NeuralNetwork.w_real
+		w_img = self.NeuralNetwork.w_img
+		A_real = self.NeuralNetwork.A_real
+		A_img = self.NeuralNetwork.A_img
+
+		#To call the function F_terms and G_terms, we need to convert the eigenvalues to complex numbers
+		w = torch.view_as_complex(torch.stack((w_real,w_img),dim=-1))
+		A = torch.view_as_complex(torch.stack((A_real,A_img),dim=-1))
+
+		return w, A
+
+	def network_outputs(self,x,u):
+		"""
+		Evaluates the fused networks of the NeuralNetwork (see TwinNetwork) on x and u at once, in Taylor mode.
+		(With autograd the backward of the padded joint pass costs more than it saves, so both are evaluated apart.)
+		Returns the tuples (f, f', f'') and (g, g', g'') for residual_F and residual_G.
+		"""
+		with self.profiler.phase("network"):
+			outputs = self.NeuralNetwork.forward_derivatives(x,u,self.a)
+		return outputs[:3], outputs[3:]
+
+	def radial_terms(self,w,A,x,rows=None):
+		"""
+		Returns the F terms F0, F1 and F2 at the points x (x[rows] if rows is given), for the complex128 eigenvalues w and A.
+		"""
+		if self.F_engine is not None:
+			return self.F_engine(w,A,x,self.sign,rows)
+		x = x if rows is None else x[rows]
+		return F_terms(self.a,w,A,self.m,x.detach().to(torch.float64),self.mu,self.sign,self.M)
+
+	def angular_terms(self,w,A,u):
+		"""
+		Returns the G terms G0, G1 and G2 at the points u, for the complex128 eigenvalues w and A.
+		"""
+		return G_terms(self.a,w,A,self.m,u.detach().to(torch.float64),self.mu,self.sign)
+
+	def residual_F(self,x,w,A,radial = None,rows = None):
+		"""
+		Returns the residual of the radial equation, F2 f'' + F1 f' + F0 f, at each point of x (shape (N_x,1)).
+		The F terms are evaluated in float64/complex128 (the Mathematica expressions cancel large terms)
+		and cast to the precision of the network.
+		radial - the tuple (f, f', f'') if it was already evaluated (see network_outputs);
+		rows - optional slice of x where the residual is evaluated (a block of blocks, which reuses the F terms grid of x).
+		"""
+
+		a = self.a
+		dtype = w.dtype
+
+		# Calculate the F terms for the Loss Function
+		with self.profiler.phase("F_terms"):
+			F0,F1,F2 = self.radial_terms(w.to(torch.complex128),A.to(torch.complex128),x,rows)
+			self.health.check("F",F0,F1,F2)
+			x = x if rows is None else x[rows]
+			F0, F1, F2 = F0.to(dtype), F1.to(dtype), F2.to(x.dtype)
+
+		if radial is not None:
+			f, dfdt, d2fdt2 = radial
+		elif self.derivatives == "taylor":
+			#Recover the hard enforced f together with its derivatives
+			with self.profiler.phase("network"):
+				f, dfdt, d2fdt2 = self.NeuralNetwork.radial_derivatives(x,a)
+		else:
+			#Recover the value of the hard enforced f
+			with self.profiler.phase("network"):
+				f = self.NeuralNetwork.radial(x,a)
+
+			# Compute the derivatives of hard enforced f needed for the Loss Function
+			with self.profiler.phase("gradients"):
+				dfdt = gradients(outputs = f, inputs = x)
+				d2fdt2 = gradients(outputs = dfdt, inputs = x)
+
+		return F2*d2fdt2 + F1*dfdt + F0*f
+
+	def residual_G(self,u,w,A,angular = None,rows = None):
+		"""
+		Returns the residual of the angular equation, G2 g'' + G1 g' + G0 g, at each point of u (shape (N_u,1)).
+		As in residual_F, the G terms are evaluated in float64/complex128.
+		angular - the tuple (g, g', g'') if it was already evaluated (see network_outputs);
+		rows - optional slice of u where the residual is evaluated.
+		"""
+		u = u if rows is None else u[rows]
+
+		# Calculate the G terms for the Loss Function
+		with self.profiler.phase("G_terms"):
+			G0, G1, G2 = self.angular_terms(w.to(torch.complex128),A.to(torch.complex128),u)
+			self.health.check("G",G0,G1,G2)
+			G0, G1, G2 = G0.to(w.dtype), G1.to(w.dtype), G2.to(u.dtype)
+
+		if angular is not None:
+			g, dgdt, d2gdt2 = angular
+		elif self.derivatives == "taylor":
+			#Recover the hard enforced g together with its derivatives
+			with self.profiler.phase("network"):
+				g, dgdt, d2gdt2 = self.NeuralNetwork.angular_derivatives(u)
+		else:
+			#Recover the value of the hard enforced g
+			with self.profiler.phase("network"):
+				g = self.NeuralNetwork.angular(u)
+
+			# Compute the derivatives of hard enforced g needed for the Loss Function
+			with self.profiler.phase("gradients"):
+				dgdt = gradients(outputs = g, inputs = u)
+				d2gdt2 = gradients(outputs = dgdt, inputs = u)
+
+		return G2*d2gdt2 + G1*dgdt + G0*g
+
+	def _block_loss(self,residual,points,rows,N):
+		w, A = self.eigenvalues()
+		return torch.sum(torch.abs(residual(points,w,A,rows=rows)), dim=0)/N
+
+	def blocks(self,x,u,weight_loss_factor_optuna,backward=False):
+		"""
+		Evaluates the loss in blocks of chunk_size points of x and u: lossF and lossG are the sums over the blocks of sum |R|/N_x
+		and sum |R|/N_u, so the loss is the one of forward (up to the rounding of the sums).
+		With backward, the contribution of each block to the loss is backpropagated as soon as it is evaluated, accumulating
+		the gradients of the parameters, so the graph of only one block is alive at a time and the peak memory depends on
+		chunk_size instead of N_x and N_u; the returned loss is then detached (train_model does this when the loss has a
+		chunk_size and no activation checkpointing).
+		With activation_checkpointing, each block is evaluated with torch.utils.checkpoint, which only keeps its points for the
+		backward and evaluates the block again there, so the returned loss is differentiable as usual and its backward also
+		holds one block of activations at a time, at the cost of a second evaluation of the residuals.
+		The blocks are slices of x and u (see residual_F), so the grid of the F terms is evaluated once for the whole x.
+		"""
+		sums = {}
+		for name, points, residual, weight in (("F", x, self.residual_F, 10**weight_loss_factor_optuna), ("G", u, self.residual_G, 1)):
+			sums[name] = 0
+			for start in range(0, len(points), self.chunk_size):
+				rows = slice(start, start + self.chunk_size)
+				if self.activation_checkpointing:
+					part = torch.utils.checkpoint.checkpoint(self._block_loss, residual, points, rows, len(points), use_reentrant = False)
+				else:
+					part = self._block_loss(residual, points, rows, len(points))
+				if backward:
+					torch.sum(weight*part).backward()
+					part = part.detach()
+				sums[name] = sums[name] + part
+
+		lossF, lossG = sums["F"], sums["G"]
+		loss = torch.sum((10**weight_loss_factor_optuna) * lossF + lossG)
+		self.health.check("loss",loss)
+		self.health.check("eigenvalues",*self.eigenvalues())
+		if self.keep_components:
+			self.components = torch.stack((lossF, lossG)).detach().view(2, *self.NeuralNetwork.w_real.shape)
+
+		return loss
+
+	def forward(self,x,u,weight_loss_factor_optuna):
+
+		if self.chunk_size is not None:
+			return self.blocks(x,u,weight_loss_factor_optuna)
+
+		w, A = self.eigenvalues()
+
+		#Both networks are evaluated at once when they are fused
+		fused = self.NeuralNetwork.fused and self.derivatives == "taylor"
+		radial, angular = self.network_outputs(x,u) if fused else (None, None)
+
+		#Now focus on the radial equation:
+
+		lossF = torch.mean(torch.abs(self.residual_F(x,w,A,radial)))
+		lossG = torch.mean(torch.abs(self.residual_G(u,w,A,angular)))
+
+		loss =  (10**weight_loss_factor_optuna) * lossF + lossG
+		self.health.check("loss",loss)
+		self.health.check("eigenvalues",w,A)
+		if self.keep_components:
+			self.components = torch.stack((lossF, lossG)).detach()
+
+		return loss
+
+class MultiModeLoss(CustomLoss):
+	"""
+	The loss of a MultiModeNetwork: the sum over its K modes of the CustomLoss of each mode,
+	(10**weight_loss_factor)*lossF_k + lossG_k, where lossF_k and lossG_k are the mean absolute residuals of the
+	radial and angular equations of the mode k with its own w, A and m. The residuals are evaluated for all the modes at once,
+	with shapes (N_x,K) and (N_u,K), so the shared trunk is only evaluated once per epoch (in Taylor mode).
+	The components kept for the history of train_model are lossF and lossG of each mode, with shape (2,K).
+	Receives as arguments:
+	- NeuralNetwork - the MultiModeNetwork;
+	- a, mu, sign, M, F_engine, chunk_size, activation_checkpointing - as in CustomLoss (with one FTermsEngine per value of m).
+	"""
+	def __init__(self,NeuralNetwork,a,mu,sign,M=1,F_engine=True,chunk_size=None,activation_checkpointing=False):
+		super(MultiModeLoss,self).__init__(NeuralNetwork,a,mu,sign,w_real=0.0,w_img=0.0,M=M,F_engine=False,derivatives="taylor",
+			chunk_size=chunk_size,activation_checkpointing=activation_checkpointing)
+
+		self.F_engines = {m: FTermsEngine(a,m,mu,M) for m in set(self.m.tolist())} if F_engine else None
+
+	def radial_terms(self,w,A,x,rows=None):
+		"""
+		Returns the F terms of every mode, each one with shape (N_x,K) (at x[rows] if rows is given).
+		"""
+		terms = []
+		for k, m in enumerate(self.m.tolist()):
+			if self.F_engines is not None:
+				terms.append(self.F_engines[m](w[k],A[k],x,self.sign,rows))
+			else:
+				points = x if rows is None else x[rows]
+				terms.append(F_terms(self.a,w[k],A[k],self.m[k],points.detach().to(torch.float64),self.mu,self.sign,self.M))
+		return [torch.cat(F, dim=1) for F in zip(*terms)]
+
+	def angular_terms(self,w,A,u):
+		"""
+		Returns the G terms of every mode, with shape (N_u,K) (G2 does not depend on the mode and has shape (N_u,1)).
+		"""
+		return G_terms(self.a,w.view(1,-1),A.view(1,-1),self.m.view(1,-1),u.detach().to(torch.float64),self.mu,self.sign)
+
+	def forward(self,x,u,weight_loss_factor_optuna):
+
+		if self.chunk_size is not None:
+			return self.blocks(x,u,weight_loss_factor_optuna)
+
+		w, A = self.eigenvalues()
+
+		fused = self.NeuralNetwork.fused
+		radial, angular = self.network_outputs(x,u) if fused else (None, None)
+
+		#Mean over the points of each mode, sum over the modes
+		lossF = torch.mean(torch.abs(self.residual_F(x,w,A,radial)), dim=0)
+		lossG = torch.mean(torch.abs(self.residual_G(u,w,A,angular)), dim=0)
+
+		loss = torch.sum((10**weight_loss_factor_optuna) * lossF + lossG)
+		self.health.check("loss",loss)
+		self.health.check("eigenvalues",w,A)
+		if self.keep_components:
+			self.components = torch.stack((lossF, lossG)).detach()
+
+		return loss
+
+def _compilation_errors():
+	#Errors of Dynamo and of the backends (the compile errors of Inductor are not always wrapped by Dynamo)
+	import torch._dynamo.exc
+	import torch._inductor.exc
+	names = ("CppCompileError", "CUDACompileError", "XPUCompileError", "LoweringException", "InductorError")
+	return (torch._dynamo.exc.TorchDynamoException,) + tuple(getattr(torch._inductor.exc, name) for name in names
+		if isinstance(getattr(torch._inductor.exc, name, None), type))
+
+def compile_function(function, backend = "inductor", mode = None):
+	"""
+	Returns function compiled with torch.compile, which falls back to the eager function (with a warning) the first time
+	the compilation fails with an error of Dynamo or of the backend. The call is then repeated in eager mode, so an error
+	of function itself (e.g. a shape or dtype bug, which Dynamo also reports while tracing) is raised as in eager mode
+	instead of being hidden by the fallback. Any other error is raised.
+	"""
+	compiled = torch.compile(function, backend = backend, mode = mode)
+	current = [compiled]
+	errors = _compilation_errors()
+
+	@functools.wraps(function)
+	def call(*args, **kwargs):
+		if current[0] is function:
+			return function(*args, **kwargs)
+		try:
+			return current[0](*args, **kwargs)
+		except errors as error:
+			result = function(*args, **kwargs)
+			warnings.warn(f"torch.compile of {function.__name__} failed, falling back to eager mode ({type(error).__name__}: {error})",
+				RuntimeWarning)
+			current[0] = function
+			return result
+
+	return call
+
+def compile_loss(model_loss, backend = "inductor", mode = None):
+	"""
+	Compiled backend of a CustomLoss (opt-in), modified in place and returned.
+	The Taylor mode passes through the networks (real Linear and Tanh layers, where the time of an epoch is spent) are compiled
+	with torch.compile, fusing the elementwise propagation of the derivatives into the matrix products.
+	The complex residuals stay in eager mode: Inductor has no code generation for complex operators and view_as_complex,
+	and the NaN check and the grid cache of the F terms are data-dependent.
+	Receives as arguments:
+	- model_loss - the CustomLoss, with derivatives = "taylor";
+	- backend, mode - arguments of torch.compile.
+	"""
+	if model_loss.derivatives != "taylor":
+		raise ValueError("The compiled backend needs the Taylor mode derivatives")
+
+	model_loss.NeuralNetwork.taylor = compile_function(taylor_forward, backend, mode)
+	return model_loss
+
+class NeuralNetworkEnsemble:
+	"""
+	K independent copies of NeuralNetwork (with the same architecture) trained as one batched computation.
+	The parameters of the K models are stacked along a leading dimension with torch.func.stack_module_state
+	and the loss of every model is evaluated at once with torch.func.vmap over torch.func.functional_call,
+	so each model keeps its own weights, its own w_real/w_img/A_real/A_img and its own initialization.
+	Since the total loss is the sum of the individual losses, the gradients (and the Adam updates) of each model
+	are independent of the others.
+	Receives as arguments:
+	- models - list of NeuralNetwork objects, all with the same hidden_layers and neurons_per_layer;
+	- a, mu, sign, M - as in CustomLoss.
+	"""
+
+	def __init__(self, models, a, mu, sign, M=1):
+		params, _ = torch.func.stack_module_state(models)
+		self.names = list(params)
+		self.params = {name: params[name].detach().requires_grad_(True) for name in self.names}
+
+		#Stateless copy of one model, whose parameters are replaced by each slice of the stacked ones
+		base_model = copy.deepcopy(models[0]).to("meta")
+		self.base_loss = CustomLoss(base_model, a, mu, sign, w_real = 0.0, w_img = 0.0, M = M, derivatives = "taylor")
+		self.base_loss.health = HealthMonitor(enabled = False)
+		self.base_loss.keep_components = False
+
+		self.size = len(models)
+
+	def parameters(self):
+		return list(self.params.values())
+
+	def _loss(self, params, x, u, weight_loss_factor):
+		params = {"NeuralNetwork." + name: value for name, value in params.items()}
+		return torch.func.functional_call(self.base_loss, params, (x, u, weight_loss_factor))
+
+	def __call__(self, x, u, weight_loss_factor):
+		"""
+		Returns the loss of each model, a tensor with shape (K,).
+		"""
+		return torch.func.vmap(self._loss, in_dims = (0, None, None, None))(self.params, x, u, weight_loss_factor)
+
+	def eigenvalues(self):
+		"""
+		Returns the current w_real, w_img, A_real and A_img of each model, as tensors with shape (K,).
+		"""
+		return tuple(self.params[name].detach() for name in ("w_real", "w_img", "A_real", "A_img"))
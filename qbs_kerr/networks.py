@@ -0,0 +1,371 @@
+"""
+Neural networks of the radial and angular functions, with the hard enforcement of the normalization,
+and the derivatives of their outputs (autograd and Taylor mode).
+"""
+import torch
+import torch.nn as nn
+import numpy as np
+
+def gradients(outputs, inputs, order = 1):
+	"""
+	Compute the derivatives of a complex function f(x) via automatic differentiation.
+
+	-param outputs- PyTorch complex tensor of shape (N, 1) with the values of f(x)
+	-param inputs-  PyTorch real tensor of shape (N, 1) with the values of x
+	-param order-   Order of the derivative (default: 1)
+	-return-        PyTorch complex tensor of shape (N, 1) with the values of f'(x)
+	"""
+
+	re_outputs = torch.real(outputs)
+	im_outputs = torch.imag(outputs)
+	if order == 1:
+		d_re = torch.autograd.grad(re_outputs, inputs, grad_outputs=torch.ones_like(re_outputs), create_graph=True)[0]
+		d_im = torch.autograd.grad(im_outputs, inputs, grad_outputs=torch.ones_like(im_outputs), create_graph=True)[0]
+		return d_re + (1j) * d_im
+	elif order > 1:
+		return gradients(gradients(outputs, inputs, 1), inputs, order - 1)
+	else:
+		return outputs
+
+def taylor_forward(network, inputs, index = None):
+	"""
+	Evaluates a nn.Sequential of Linear and Tanh layers together with its first and second derivatives
+	with respect to the (scalar) input, propagating them layer by layer in a single pass (Taylor mode),
+	instead of differentiating the outputs twice with autograd.
+
+	-param network- nn.Sequential with nn.Linear and nn.Tanh modules, input size 1, or a TwinNetwork (see TwinNetwork.taylor)
+	-param inputs-  PyTorch real tensor of shape (N, 1)
+	-param index-   for a TwinNetwork, the network to evaluate (None evaluates both)
+	-return-        three tensors of shape (N, output_size) with y, dy/dx and d2y/dx2
+	"""
+
+	if isinstance(network, TwinNetwork):
+		return network.taylor(inputs, index)
+
+	y = inputs
+	dy = None
+	d2y = None
+	for layer in network:
+		if isinstance(layer, nn.Linear):
+			if dy is None:
+				# First layer: d(Wx+b)/dx = W and the second derivative vanishes
+				dy = layer.weight.view(1, -1).expand(y.shape[0], -1)
+				y = layer(y)
+			else:
+				y = layer(y)
+				dy = dy @ layer.weight.t()
+				d2y = None if d2y is None else d2y @ layer.weight.t()
+		elif isinstance(layer, nn.Tanh):
+			y = torch.tanh(y)
+			sech2 = 1 - y**2
+			curvature = -2*y*sech2*dy**2
+			d2y = curvature if d2y is None else sech2*d2y + curvature
+			dy = sech2*dy
+		else:
+			raise NotImplementedError(f"Taylor mode is not implemented for {type(layer).__name__} layers")
+
+	if d2y is None:
+		d2y = torch.zeros_like(y)
+
+	return y, dy, d2y
+
+class TwinNetwork(nn.Module):
+	"""
+	The radial and angular networks, two nn.Sequential of Linear and Tanh layers with the same shapes,
+	stored as stacked weights so both are evaluated together with batched matrix products (torch.baddbmm and torch.bmm).
+	The weights and biases of layer i are weights[i] and biases[i], with shapes (2, out, in) and (2, out):
+	index 0 is the radial network and index 1 the angular network.
+	Receives as arguments:
+	- x_network, u_network - the networks, whose parameters are copied (so their initialization is kept).
+	"""
+	def __init__(self, x_network, u_network):
+		super(TwinNetwork, self).__init__()
+
+		layers = list(zip(x_network, u_network))
+		for k, (layer_x, layer_u) in enumerate(layers):
+			linear = k % 2 == 0
+			if not isinstance(layer_x, nn.Linear if linear else nn.Tanh) or type(layer_x) is not type(layer_u) \
+					or (linear and layer_x.weight.shape != layer_u.weight.shape):
+				raise ValueError("TwinNetwork needs two networks of alternating Linear and Tanh layers with the same shapes")
+		if len(x_network) != len(u_network) or len(layers) % 2 == 0:
+			raise ValueError("TwinNetwork needs two networks of alternating Linear and Tanh layers with the same shapes")
+
+		linears = layers[::2]
+		self.weights = nn.ParameterList([nn.Parameter(torch.stack((x.weight.detach(), u.weight.detach()))) for x, u in linears])
+		self.biases = nn.ParameterList([nn.Parameter(torch.stack((x.bias.detach(), u.bias.detach()))) for x, u in linears])
+
+	def layers(self, index = None):
+		"""
+		Returns the list of the transposed weights (2, in, out) and biases (2, 1, out) of each layer,
+		or only the ones of the network index (with a first dimension of size 1).
+		"""
+		layers = []
+		for weight, bias in zip(self.weights, self.biases):
+			if index is not None:
+				weight, bias = weight[index:index + 1], bias[index:index + 1]
+			layers.append((weight.transpose(1, 2), bias.unsqueeze(1)))
+		return layers
+
+	def forward(self, inputs, index = None):
+		"""
+		Evaluates both networks on inputs, with shape (2, N, 1), or only the network index on inputs with shape (1, N, 1).
+		Returns the outputs, with shape (2, N, output_size) or (1, N, output_size).
+		"""
+		layers = self.layers(index)
+		y = inputs
+		for weight, bias in layers[:-1]:
+			y = torch.tanh(torch.baddbmm(bias, y, weight))
+		weight, bias = layers[-1]
+		return torch.baddbmm(bias, y, weight)
+
+	def taylor(self, inputs, index = None):
+		"""
+		Evaluates the networks as forward, together with the first and second derivatives of the outputs with respect
+		to the inputs, propagated layer by layer as in taylor_forward.
+		"""
+		layers = self.layers(index)
+		N = inputs.shape[1]
+
+		# First layer: d(Wx+b)/dx = W and the second derivative vanishes
+		weight, bias = layers[0]
+		y = torch.baddbmm(bias, inputs, weight)
+		dy = weight.expand(-1, N, -1)
+		d2y = None
+		for weight, bias in layers[1:]:
+			y = torch.tanh(y)
+			sech2 = 1 - y**2
+			curvature = -2*y*sech2*dy**2
+			d2y = curvature if d2y is None else sech2*d2y + curvature
+			dy = sech2*dy
+			y = torch.baddbmm(bias, y, weight)
+			dy, d2y = torch.bmm(dy, weight), torch.bmm(d2y, weight)
+
+		if d2y is None:
+			d2y = torch.zeros_like(y)
+
+		return y, dy, d2y
+
+class NeuralNetwork(nn.Module):
+	"""
+	Defines both Neural Networks, for F and G. Returns the hard enforced values of both radial and angular functions.
+	Receives as arguments:
+	-l,m - Spherical harmonic indicies l and m;
+	- input_size_x, input_size_u - The input size of each neural network (1)
+	- hidden_layers - number of hidden layers
+	- neurons_per_layer - number of neurons per each hidden layer
+	- ouput_size - size of the output of the neural network(=2, separation of real and imaginary part)
+	- n - Spherical harmonic indice n, as default we use the fundamental mode
+	- fused - if True, both networks are stored as one TwinNetwork and evaluated together with batched matrix products
+	"""
+
+	def __init__(self,activation,std_radial,std_ang_optuna,random_seed, l, m, init_w_real,init_w_img, input_size_x = 1, input_size_u = 1, hidden_layers = 3,neurons_per_layer = 200, output_size = 2 ,n = 0, fused = False):
+		super(NeuralNetwork, self).__init__()
+
+		#Spherical harmonic indicies l and m
+		self.l = torch.tensor(l)
+		self.m = torch.tensor(m)
+		self.n = torch.tensor(n)
+
+		#Activation function
+		if activation == "tanh":
+			activation = nn.Tanh()
+		else:
+			raise ValueError(f"Activation function not implemented: {activation}")
+
+		#Parameters of the Neural Network:
+
+		self.w_real = torch.nn.Parameter(data = torch.tensor(init_w_real), requires_grad = True)
+		self.w_img = torch.nn.Parameter(data = torch.tensor(init_w_img), requires_grad = True)
+
+		self.A_real = torch.nn.Parameter(data = torch.tensor(float(l*(l+1)) ), requires_grad = True)
+		self.A_img = torch.nn.Parameter(data = torch.tensor(0.0), requires_grad = True)
+
+
+		#Network for the Radial Equation (depends on x)
+		self.x_network = nn.Sequential()
+		self.x_network.add_module("Input",nn.Linear(input_size_x, neurons_per_layer))
+		self.x_network.add_module("Input activatation",activation)
+		for i in range(hidden_layers):
+			self.x_network.add_module(f"Hidden layer number: {i+1} ",nn.Linear(neurons_per_layer, neurons_per_layer))
+			self.x_network.add_module(f"Hidden {i+1} activation",activation)
+		self.x_network.add_module("Output", nn.Linear(neurons_per_layer, output_size))
+
+		#Network for the Angular Equation (depends on u)
+		self.u_network = nn.Sequential()
+		self.u_network.add_module("Input",nn.Linear(input_size_u, neurons_per_layer))
+		self.u_network.add_module("Input activatation",activation)
+		for i in range(hidden_layers):
+			self.u_network.add_module(f"Hidden layer number: {i+1} ",nn.Linear(neurons_per_layer, neurons_per_layer))
+			self.u_network.add_module(f"Hidden {i+1} activation",activation)
+		self.u_network.add_module("Output", nn.Linear(neurons_per_layer, output_size))
+
+		#Taylor mode pass through each network (replaced by its compiled version in compile_loss)
+		self.taylor = taylor_forward
+
+		#Random initialization of the network parameters:
+
+		#Maybe try different seeds in further tests
+		torch.manual_seed(random_seed)
+
+		#Talvez mudar tambem a std da inicialização, secundariamente
+
+
+		for z in self.x_network.modules():
+			if isinstance(z,nn.Linear):
+				nn.init.normal_(z.weight,mean = 0,std = std_radial)
+				nn.init.constant_(z.bias,val=0)
+
+		for z in self.u_network.modules():
+			if isinstance(z,nn.Linear):
+				nn.init.normal_(z.weight,mean=0,std= std_ang_optuna)
+				nn.init.constant_(z.bias,val=0)
+
+		#Both networks stored as stacked weights (initialized as above), replacing x_network and u_network
+		self.fused = fused
+		if fused:
+			self.twin_network = TwinNetwork(self.x_network, self.u_network)
+			del self.x_network, self.u_network
+	
+	def stack(self, x, u):
+		"""
+		Returns x and u stacked as the inputs of the TwinNetwork, with shape (2, max(N_x, N_u), 1) (the shorter one is padded with zeros).
+		"""
+		N = max(len(x), len(u))
+		return torch.stack([t if len(t) == N else torch.cat((t, t.new_zeros(N - len(t), 1))) for t in (x, u)])
+
+	def forward(self, x, u,a):
+		"""
+		Evaluates the NN and applies the hard enforcement of normalization
+		Receives as arguments:
+		x,u : the vectors with dimensions (N_x,1) and (N_u,1) that defined
+			the radial and angular space, respectively;
+			a : the spin parameter, useful for the hard enforcement of the boundary conditions.
+		"""
+
+		if self.fused:
+			outputs = self.twin_network(self.stack(x, u))
+			return self.radial(x,a,outputs[0,:len(x)]), self.angular(u,outputs[1,:len(u)])
+
+		return self.radial(x,a), self.angular(u)
+
+	def radial(self, x, a, output = None):
+		"""
+		Evaluates the radial NN and applies the hard enforcement of normalization of f(x), with shape (N_x,1)
+		(or (N_x,K) for the K output heads of a MultiModeNetwork).
+		output - the output of the radial NN, if it was already evaluated.
+		"""
+
+		# calculate r_plus:
+		r_plus = 1 + np.sqrt(1-a**2) #Note that this already has M = 1 !!!!!!!!!!!!!
+
+		if output is None:
+			output = self.twin_network(x.unsqueeze(0), 0)[0] if self.fused else self.x_network(x)
+
+		#Get the value of the NN for x, turning each pair of collumns into a complex number
+		f_complex_tensor = torch.view_as_complex(output.contiguous().view(len(output),-1,2))
+
+		#After joining them, one needs to hard enforce f:
+		return (torch.exp(x- (1/r_plus) )-1)*f_complex_tensor + 1 #Hard Enforcement for f(x)
+
+	def angular(self, u, output = None):
+		"""
+		Evaluates the angular NN and applies the hard enforcement of normalization of g(u), with shape (N_u,1)
+		(or (N_u,K) for the K output heads of a MultiModeNetwork).
+		output - the output of the angular NN, if it was already evaluated.
+		"""
+
+		if output is None:
+			output = self.twin_network(u.unsqueeze(0), 1)[0] if self.fused else self.u_network(u)
+
+		#Get the value of the NN for u, turning each pair of collumns into a complex number
+		g_complex_tensor = torch.view_as_complex(output.contiguous().view(len(output),-1,2))
+
+		return (torch.exp(u+1)-1)*g_complex_tensor + 1 #Hard Enforcement for g(u)
+
+	def forward_derivatives(self, x, u, a):
+		"""
+		Evaluates the hard enforced f and g together with their first and second derivatives
+		with respect to x and u, in a single Taylor mode pass through each network (see taylor_forward),
+		or through both networks at once if they are fused.
+		Receives the same arguments as forward.
+		Returns f, df/dx, d2f/dx2, g, dg/du, d2g/du2, each one with shape (N_x,1) or (N_u,1) ((N_x,K) or (N_u,K) for a MultiModeNetwork).
+		"""
+
+		if self.fused:
+			outputs = self.taylor(self.twin_network, self.stack(x, u))
+			return self.radial_derivatives(x,a,[t[0,:len(x)] for t in outputs]) + self.angular_derivatives(u,[t[1,:len(u)] for t in outputs])
+
+		return self.radial_derivatives(x,a) + self.angular_derivatives(u)
+
+	def radial_derivatives(self, x, a, outputs = None):
+		"""
+		Returns the hard enforced f, df/dx and d2f/dx2 (see forward_derivatives).
+		outputs - the radial NN and its derivatives, if they were already evaluated.
+		"""
+
+		# calculate r_plus:
+		r_plus = 1 + np.sqrt(1-a**2) #Note that this already has M = 1 !!!!!!!!!!!!!
+
+		if outputs is None:
+			outputs = [t[0] for t in self.taylor(self.twin_network, x.unsqueeze(0), 0)] if self.fused else self.taylor(self.x_network, x)
+		f_net, df_net, d2f_net = [torch.view_as_complex(t.contiguous().view(len(t),-1,2)) for t in outputs]
+
+		#Hard enforcement f = (e^(x - 1/r_plus) - 1)*f_net + 1, differentiated twice
+		exp_x = torch.exp(x - (1/r_plus))
+		f = (exp_x - 1)*f_net + 1
+		dfdx = exp_x*f_net + (exp_x - 1)*df_net
+		d2fdx2 = exp_x*(f_net + 2*df_net) + (exp_x - 1)*d2f_net
+
+		return f, dfdx, d2fdx2
+
+	def angular_derivatives(self, u, outputs = None):
+		"""
+		Returns the hard enforced g, dg/du and d2g/du2 (see forward_derivatives).
+		outputs - the angular NN and its derivatives, if they were already evaluated.
+		"""
+
+		if outputs is None:
+			outputs = [t[0] for t in self.taylor(self.twin_network, u.unsqueeze(0), 1)] if self.fused else self.taylor(self.u_network, u)
+		g_net, dg_net, d2g_net = [torch.view_as_complex(t.contiguous().view(len(t),-1,2)) for t in outputs]
+
+		#Hard enforcement g = (e^(u + 1) - 1)*g_net + 1, differentiated twice
+		exp_u = torch.exp(u + 1)
+		g = (exp_u - 1)*g_net + 1
+		dgdu = exp_u*g_net + (exp_u - 1)*dg_net
+		d2gdu2 = exp_u*(g_net + 2*dg_net) + (exp_u - 1)*d2g_net
+
+		return g, dgdu, d2gdu2
+
+class MultiModeNetwork(NeuralNetwork):
+	"""
+	A NeuralNetwork solving K modes (l, m, n) at once: the hidden layers of the radial and angular networks are a trunk
+	shared by all the modes, and the output layer of each network holds one head per mode (the collumns 2k and 2k+1 are
+	the real and imaginary parts of the mode k). The hard enforcement is applied to each head, so f and g (and their
+	derivatives) have shapes (N_x,K) and (N_u,K), and each mode has its own eigenvalues: w_real, w_img, A_real and A_img
+	are parameters with shape (K,), as l, m and n.
+	Receives as arguments:
+	- activation, std_radial, std_ang_optuna, random_seed, input_size_x, input_size_u, hidden_layers, neurons_per_layer, fused - as in NeuralNetwork;
+	- modes - list of the K modes (l, m, n);
+	- init_w_real, init_w_img - lists with the initial frequency of each mode;
+	- init_A_real, init_A_img - optional lists with the initial separation constant of each mode (default: l(l+1) and 0).
+	"""
+
+	def __init__(self,activation,std_radial,std_ang_optuna,random_seed,modes,init_w_real,init_w_img,init_A_real = None,init_A_img = None,
+			input_size_x = 1, input_size_u = 1, hidden_layers = 3,neurons_per_layer = 200, fused = False):
+		self.modes = [tuple(mode) for mode in modes]
+		l, m, n = [list(indices) for indices in zip(*self.modes)]
+
+		super(MultiModeNetwork, self).__init__(activation,std_radial,std_ang_optuna,random_seed,l[0],m[0],init_w_real[0],init_w_img[0],
+			input_size_x,input_size_u,hidden_layers,neurons_per_layer,output_size = 2*len(self.modes),n = n[0],fused = fused)
+
+		#Spherical harmonic indicies and eigenvalues of each mode
+		self.l = torch.tensor(l)
+		self.m = torch.tensor(m)
+		self.n = torch.tensor(n)
+
+		init_A_real = [float(k*(k+1)) for k in l] if init_A_real is None else init_A_real
+		init_A_img = [0.0]*len(l) if init_A_img is None else init_A_img
+		self.w_real = torch.nn.Parameter(data = torch.tensor(init_w_real, dtype = torch.get_default_dtype()), requires_grad = True)
+		self.w_img = torch.nn.Parameter(data = torch.tensor(init_w_img, dtype = torch.get_default_dtype()), requires_grad = True)
+		self.A_real = torch.nn.Parameter(data = torch.tensor(init_A_real, dtype = torch.get_default_dtype()), requires_grad = True)
+		self.A_img = torch.nn.Parameter(data = torch.tensor(init_A_img, dtype = torch.get_default_dtype()), requires_grad = True)
@@ -0,0 +1,426 @@
+"""
+Physics of the massive scalar field in Kerr: Detweiler's approximation of the frequencies
+and the coefficients F_i and G_i of the radial and angular equations (Appendix A).
+"""
+import torch
+import numpy as np
+import math
+import weakref
+
+def Detweiler(l,m,a,mu,n=0,M=1):
+	"""
+	Defines the initial values of the frequencies, using Detweiler (1980) approximation.
+	Receives as arguments:
+	- l,m - Spherical harmonic indicies l and m;
+	- a - the spin parameter, value between 0 and 1 (float);
+	- mu - the mass of the particle that is perturbing the black hole (float);
+	- n - Spherical harmonic indice n, as default we use the fundamental mode
+	- M - Mass of the black hole (default = 1)
+	Returns:
+	- w_real - the frequency of the perturbation (float);
+	- w_img - the damping time of the perturbation (float);
+	"""
+
+	rplus = M + np.sqrt(M**2 - a**2)
+
+	prod = 1
+
+	for j in range(1,l+1):
+		prod = prod * (j**2 * (1 - a**2 / M**2) + (a*m / M - 2*mu*rplus)**2)
+
+	w_real = mu
+
+	w_img = mu * (mu * M)**(4*l+4) * (a*m / M - 2*mu*rplus) * \
+	(2**(4*l+2) * math.factorial(2*l + 1 + n)) / ((l+1+n)**(2*l+4) * math.factorial(n)) * \
+	(math.factorial(l) / (math.factorial(2*l) * math.factorial(2*l+1) ) )**2 *\
+	prod
+
+	return w_real, w_img
+
+def F_numerators(a,w,A,m,x,mu,q,xi,sigma,rminus,rplus,M=1):
+	"""
+	All these values were calculated by Mathematica.
+	Calculates the numerators of the F_i terms defined in the Appendix A, such that
+	F0 = F0_num / ((-1 + rminus*x)**2*xi**2), F1 = F1_num / ((-1 + rminus*x)*xi) and F2 has no denominator.
+	Each numerator is a polynomial in x (degree up to 8) with coefficients that are polynomials in q, xi, sigma, A and w,
+	so the same expressions can be evaluated on tensors (F_terms) or on Polynomial objects (FTermsEngine).
+	Receives as arguments:
+	- a, m, mu, M - as in F_terms;
+	- w, A - the frequency and the separation constant (complex);
+	- x - the compactified radial coordinate;
+	- q, xi, sigma - the intermediate values of F_terms;
+	- rminus, rplus - the inner and outer horizon radii.
+	"""
+
+	if (a == 0):
+		#These terms are doing according Kerr_QBS_SamNotation.nb, the last particular case with a = 0
+		# Numerator of the F0 term:
+		F0_num = ((-mu**2 + q**2 + w**2)*xi**2 - 2*x*xi*(-(mu**2*(M + rminus + rplus)*xi) + q**2*(2*M + rminus + rplus)*xi + (rminus + rplus)*w**2*xi - q*(1 + xi)) + 2*M*rminus*rplus*x**7*xi*(A*rminus*rplus*xi +\
+		2j*M*rminus*sigma*xi + 2*M*rplus*(-1 + q*rminus*xi - 1j*sigma*xi)) + x**2*(1 + xi*(1 - 2*q*(4*M + rminus + 2*rplus) - A*xi + (4*M**2*q**2 - 4*q*(rminus + rplus) + q**2*(rminus**2 + 4*rminus*rplus +\
+		rplus**2) + M*(-6*q - 4*mu**2*(rminus + rplus) + 8*q**2*(rminus + rplus)) + 2j*q*(rminus - rplus)*sigma - (rminus**2 + 4*rminus*rplus + rplus**2)*(mu - w)*(mu + w))*xi)) - 2*x**3*(rplus + \
+		2*M**2*q*xi*(-2 + (-1 + 2*q*(rminus + rplus))*xi) + xi*(rminus + rplus - 2*q*rminus*rplus - q*rplus**2 - 1j*rminus*sigma + 1j*rplus*sigma - (A*(rminus + rplus) - q**2*rminus*rplus*(rminus +\
+		rplus) + q*(rminus**2 + 4*rminus*rplus + rplus**2 - 1j*(rminus - rplus)*(rminus + rplus)*sigma) + rminus*rplus*(rminus + rplus)*(mu - w)*(mu + w))*xi) + M*(2 + xi - 4*q*(rminus + 2*rplus)*xi -\
+		(A + 6*q*(rminus + rplus) + mu**2*(rminus**2 + 4*rminus*rplus + rplus**2) - 2*q**2*(rminus**2 + 4*rminus*rplus + rplus**2) - 4j*q*(rminus - rplus)*sigma)*xi**2)) + x**6*(-(A*rminus**2*rplus**2*xi**2)\
+		- 2*M*rminus*rplus*xi*(-3*rplus + (3*q*rminus*rplus + 2*A*(rminus + rplus) + 3j*(rminus - rplus)*sigma)*xi) + 4*M**2*(rplus**2 + 2*rplus*(rminus - q*rminus*rplus - 1j*rminus*sigma +\
+		1j*rplus*sigma)*xi + (q*rminus*rplus*(-2*rplus + rminus*(-2 + q*rplus)) + 2j*q*rminus*(rminus - rplus)*rplus*sigma - (rminus - rplus)**2*sigma**2)*xi**2)) + x**4*(-(rminus**2*(A + sigma*(1j +\
+		sigma))*xi**2) + 2*M*(4*rplus + 3*rminus*xi + 2*(rplus - 2*q*rplus*(2*rminus + rplus) + 2j*(-rminus + rplus)*sigma)*xi - (2*A*(rminus + rplus) + 2*mu**2*rminus*rplus*(rminus + rplus) -\
+		4*q**2*rminus*rplus*(rminus + rplus) + 3*q*(rminus**2 + 4*rminus*rplus + rplus**2) + 1j*(-rminus + rplus)*sigma - 4j*q*(rminus - rplus)*(rminus + rplus)*sigma)*xi**2) + 2*rminus*rplus*xi*(2 -\
+		2*(A + q*rminus)*xi + sigma**2*xi + 1j*sigma*(-1 + q*rminus*xi)) + rplus**2*(1 + xi*(1 - 2*q*rminus + 2j*sigma - (A - q**2*rminus**2 + 2*q*rminus*(2 + 1j*sigma) + sigma*(-1j + sigma) +\
+		rminus**2*(mu - w)*(mu + w))*xi)) + 4*M**2*(1 + q*xi*(q*rminus**2*xi + rplus*(-4 + (-2 + q*rplus - 2j*sigma)*xi) + rminus*(-2 + (-2 + 4*q*rplus + 2j*sigma)*xi)))) + 2*x**5*(rminus*rplus*xi*(-rplus +\
+		(q*rminus*rplus + A*(rminus + rplus) + 1j*(rminus - rplus)*sigma)*xi) + M*(-2*rplus**2 + rplus*(-6*rminus - rplus + 4*q*rminus*rplus + 4j*(rminus - rplus)*sigma)*xi + (A*(rminus**2 + 4*rminus*rplus +\
+		rplus**2) + rminus*rplus*(mu**2*rminus*rplus - 2*q**2*rminus*rplus + 6*q*(rminus + rplus)) - 1j*(rminus - rplus)*(-rplus + rminus*(-1 + 4*q*rplus))*sigma + 2*(rminus - rplus)**2*sigma**2)*xi**2) +\
+		2*M**2*(q*rplus**2*xi*(2 + xi - 2*q*rminus*xi + 2j*sigma*xi) + rminus*xi*(-1 + q*rminus*xi - 1j*sigma*(-2 + xi + 2*q*rminus*xi)) + rplus*(-2 + xi*(1j*sigma*(-2 + xi) - 2*q**2*rminus**2*xi +\
+		4*q*rminus*(1 + xi))))))
+
+		# Numerator of the F1 term:
+		F1_num = (2*x**2*(-1 + 2*M*x)*(-1 + rplus*x)*(x*(-1 + 2*M*x)*(-1 + rplus*x) - q*(-1 + 2*M*x)*(-1 + rminus*x)*(-1 + rplus*x)*xi + x**2*(M + 1j*(rminus - rplus)*sigma + M*x*(rplus*(-1 + 2j*sigma) +\
+		rminus*(-1 - 2j*sigma + rplus*x)))*xi))
+
+		# F2 term:
+		F2 = x**4*(1 - 2*M*x)**2*(-1 + rplus*x)**2
+
+	else:
+		#These terms are doing according Kerr_QBS_SamNotation.nb, the last particular case with a != 0
+		# Numerator of the F0 term:
+
+		F0_num = ((-mu**2 + q**2 + w**2)*xi**2 - 2*x*xi*(-(mu**2*(M + rminus + \
+		rplus)*xi) + q**2*(2*M + rminus + rplus)*xi + (rminus + \
+		rplus)*w**2*xi - q*(1 + xi)) + x**2*(1 + xi*(1 - 8*M*q - 2*q*(rminus \
+		+ 2*rplus) + 4*M**2*q**2*xi - 4*q*(rminus + rplus)*xi + q**2*(2*a**2 \
+		+ rminus**2 + 4*rminus*rplus + rplus**2)*xi + 2*M*(-2*mu**2*(rminus + \
+		rplus) + q*(-3 + 4*q*(rminus + rplus)))*xi + 2j*q*(rminus - \
+		rplus)*sigma*xi - (A + (a**2 + rminus**2 + 4*rminus*rplus + \
+		rplus**2)*(mu - w)*(mu + w))*xi)) + \
+		x**8*(a**2*rminus*rplus*xi*(2*M*rplus + (-A + m**2 - \
+		2*M*q)*rminus*rplus*xi - 2j*M*(rminus - rplus)*sigma*xi) + \
+		a**4*(rplus**2 - rplus*(rplus + 2*q*rminus*rplus + 2j*rminus*sigma - \
+		2j*rplus*sigma)*xi + (q**2*rminus**2*rplus**2 + 1j*(rminus - \
+		rplus)*(rminus + rplus + 2*q*rminus*rplus)*sigma - (rminus - \
+		rplus)**2*sigma**2)*xi**2)) - \
+		2*x**7*(2*a*M*rminus**2*rplus**2*w*xi**2 - \
+		M*rminus*rplus*xi*(-2*M*rplus + (A + 2*M*q)*rminus*rplus*xi + \
+		2j*M*(rminus - rplus)*sigma*xi) + a**4*(rplus - (rplus + \
+		q*rplus*(2*rminus + rplus) + 1j*(rminus - rplus)*sigma)*xi + \
+		(q**2*rminus*rplus*(rminus + rplus) + 1j*(rminus - rplus)*(1 + \
+		q*(rminus + rplus))*sigma)*xi**2) + a**2*(rminus*rplus*xi*(rplus + \
+		rminus*(-A + m**2 - 1j*sigma)*xi + rplus*(-A + m**2 - q*rminus + \
+		1j*sigma)*xi) + M*(2*rplus**2 - rplus*(-2*rminus + rplus + \
+		4*q*rminus*rplus + 4j*(rminus - rplus)*sigma)*xi + \
+		(2*q**2*rminus**2*rplus**2 + 2j*q*rminus*rplus*(1j*(rminus + rplus) + \
+		2*(rminus - rplus)*sigma) + (rminus - rplus)*sigma*(1j*(rminus + \
+		rplus) + 2*(-rminus + rplus)*sigma) - \
+		rminus**2*rplus**2*w**2)*xi**2))) + x**4*(4*M**2 + 8*M*rplus + \
+		rplus**2 + a**4*q**2*xi**2 + 8*a*M*(rminus + rplus)*w*xi**2 + a**2*(2 \
+		- 4*q*(2*M + rminus + 2*rplus)*xi + (-A + m**2 - 4*q*(rminus + rplus) \
+		+ 2*q**2*(rminus**2 + 4*rminus*rplus + rplus**2) + 2*M*q*(-1 + \
+		4*q*(rminus + rplus)) + 4j*q*(rminus - rplus)*sigma - 4*M*(rminus + \
+		rplus)*w**2 - (rminus**2 + 4*rminus*rplus + rplus**2)*(mu - w)*(mu + \
+		w))*xi**2) + xi*(-(rminus**2*(A - q**2*rplus**2 + 2*q*rplus*(2 - \
+		1j*sigma) + sigma*(1j + sigma) + rplus**2*(mu - w)*(mu + w))*xi) + \
+		2*M*(3*rminus + 2*rplus - 8*q*rminus*rplus - 4*q*rplus**2 - \
+		4j*rminus*sigma + 4j*rplus*sigma - (2*A*(rminus + rplus) + \
+		2*mu**2*rminus*rplus*(rminus + rplus) - 4*q**2*rminus*rplus*(rminus + \
+		rplus) + 3*q*(rminus**2 + 4*rminus*rplus + rplus**2) + 1j*(-rminus + \
+		rplus)*sigma - 4j*q*(rminus - rplus)*(rminus + rplus)*sigma)*xi) + \
+		rplus**2*(1 + 2j*sigma - (A + sigma*(-1j + sigma))*xi) + \
+		4*M**2*q*(q*rminus**2*xi + rplus*(-4 + (-2 + q*rplus - 2j*sigma)*xi) \
+		+ rminus*(-2 + (-2 + 4*q*rplus + 2j*sigma)*xi)) - 2*rminus*rplus*(-2 \
+		+ 2*A*xi + q*rplus*(1 + (2 + 1j*sigma)*xi) + sigma*(1j - sigma*xi)))) \
+		+ x**6*(-(A*rminus**2*rplus**2*xi**2) + 8*a*M*rminus*rplus*(rminus + \
+		rplus)*w*xi**2 - 2*M*rminus*rplus*xi*(-3*rplus + 2*A*rminus*xi + \
+		(2*A*rplus + 3*q*rminus*rplus + 3j*(rminus - rplus)*sigma)*xi) + \
+		a**4*(1 + xi*(-1 - 2*q*(rminus + 2*rplus) + q*(q*(rminus**2 + \
+		4*rminus*rplus + rplus**2) + 2j*(rminus - rplus)*sigma)*xi)) + \
+		4*M**2*(-(rminus**2*sigma**2*xi**2) + 2*rminus*rplus*xi*(1 - \
+		q*rminus*xi + sigma**2*xi + 1j*sigma*(-1 + q*rminus*xi)) + \
+		rplus**2*(1 + xi*(-2*q*rminus + 2j*sigma + (q*rminus*(-2 + q*rminus) \
+		- 2j*q*rminus*sigma - sigma**2)*xi))) + a**2*(rminus**2*(-A + m**2 - \
+		2*sigma**2)*xi**2 + 4*rminus*rplus*xi*(1 - 1j*sigma + (-A + m**2 + \
+		sigma**2 + 1j*q*rminus*(1j + sigma))*xi) + 2*M*(4*rplus + rminus*xi - \
+		2*(rplus + 2*q*rplus*(2*rminus + rplus) + 2j*(rminus - \
+		rplus)*sigma)*xi + (4*q**2*rminus*rplus*(rminus + rplus) - \
+		q*(rminus**2 + 4*rminus*rplus + rplus**2) + 3j*(rminus - rplus)*sigma \
+		+ 4j*q*(rminus - rplus)*(rminus + rplus)*sigma - \
+		2*rminus*rplus*(rminus + rplus)*w**2)*xi**2) + rplus**2*(2 + \
+		xi*(-4*q*rminus + 4j*sigma - (A - m**2 - 2*q**2*rminus**2 + \
+		2*sigma**2 + 4*q*(rminus + 1j*rminus*sigma) + rminus**2*(mu - w)*(mu \
+		+ w))*xi)))) - 2*x**5*(2*a*M*(rminus**2 + 4*rminus*rplus + \
+		rplus**2)*w*xi**2 + a**4*q*xi*(-1 + q*(rminus + rplus)*xi) - \
+		rminus*rplus*xi*(-rplus + (q*rminus*rplus + A*(rminus + rplus) + \
+		1j*(rminus - rplus)*sigma)*xi) + M*(2*rplus**2 + rplus*(6*rminus + \
+		rplus - 4*q*rminus*rplus + 4j*(-rminus + rplus)*sigma)*xi - \
+		(A*(rminus**2 + 4*rminus*rplus + rplus**2) + \
+		rminus*rplus*(mu**2*rminus*rplus - 2*q**2*rminus*rplus + 6*q*(rminus \
+		+ rplus)) - 1j*(rminus - rplus)*(-rplus + rminus*(-1 + \
+		4*q*rplus))*sigma + 2*(rminus - rplus)**2*sigma**2)*xi**2) + \
+		a**2*(rplus**2*xi*(-2*q + (-(mu**2*rminus) + q*(-1 + 2*q*rminus - \
+		2j*sigma) + rminus*w**2)*xi) + rminus*xi*(1 - (A - m**2 + \
+		q*rminus)*xi + 1j*sigma*(-2 + xi + 2*q*rminus*xi)) + M*(2 + xi*(-1 - \
+		4*q*(rminus + 2*rplus) + (-2*q*(rminus + rplus) + 2*q**2*(rminus**2 + \
+		4*rminus*rplus + rplus**2) + 4j*q*(rminus - rplus)*sigma - (rminus**2 \
+		+ 4*rminus*rplus + rplus**2)*w**2)*xi)) + rplus*(2 + xi*(-4*q*rminus \
+		+ 2j*sigma + (-A + m**2 - 1j*sigma + rminus*(-(mu**2*rminus) + \
+		2*q*(-2 + q*rminus) + rminus*w**2))*xi))) + 2*M**2*(q*rplus**2*xi*(-2 \
+		+ (-1 + 2*q*rminus - 2j*sigma)*xi) + rminus*xi*(1 - q*rminus*xi + \
+		1j*sigma*(-2 + xi + 2*q*rminus*xi)) + rplus*(2 + xi*(-1j*sigma*(-2 + \
+		xi) + 2*q**2*rminus**2*xi - 4*q*rminus*(1 + xi))))) - 2*x**3*(rplus + \
+		2*M**2*q*xi*(-2 + (-1 + 2*q*(rminus + rplus))*xi) + xi*(rminus + \
+		rplus - q*rplus*(2*rminus + rplus) - 1j*(rminus - rplus)*sigma + \
+		q**2*rminus*rplus*(rminus + rplus)*xi + q*(-4*rminus*rplus + \
+		rplus**2*(-1 - 1j*sigma) + 1j*rminus**2*(1j + sigma))*xi - (rminus + \
+		rplus)*(A + rminus*rplus*(mu - w)*(mu + w))*xi + a**2*(2*q**2*(rminus \
+		+ rplus)*xi - (rminus + rplus)*(mu - w)*(mu + w)*xi - q*(2 + xi))) + \
+		M*(2 + xi*(1 + 2*q**2*(a**2 + rminus**2 + 4*rminus*rplus + \
+		rplus**2)*xi - (A + mu**2*(rminus**2 + 4*rminus*rplus + rplus**2) + \
+		a*w*(-2 + a*w))*xi + q*(2*rplus*(-4 - 3*xi - 2j*sigma*xi) + \
+		rminus*(-4 - 6*xi + 4j*sigma*xi))))))
+
+		# Numerator of the F1 term:
+		F1_num = (2*x**2*(-1 + rplus*x)*(1 - 2*M*x + a**2*x**2)*(x*(-1 + rplus*x)*(1 - \
+		2*M*x + a**2*x**2) - q*(-1 + rminus*x)*(-1 + rplus*x)*(1 - 2*M*x + \
+		a**2*x**2)*xi + x**2*(-M - 1j*(rminus - rplus)*sigma + a**2*x + \
+		M*(rminus + rplus + 2j*(rminus - rplus)*sigma)*x - (M*rminus*rplus + \
+		a**2*(rminus + rplus + 1j*(rminus - rplus)*sigma))*x**2 + \
+		a**2*rminus*rplus*x**3)*xi))
+
+		# F2 term:
+		F2 = x**4*(-1 + rplus*x)**2*(1 - 2*M*x + a**2*x**2)**2
+
+	return F0_num,F1_num,F2
+
+def F_terms(a,w,A,m,x,mu,sign,M=1):
+	"""
+	All these values were calculated by Mathematica.
+	Calculates The F_i terms defined in the Appendix A, each one with shape (N_x,1).
+	Receives as arguments:
+	- a - the spin parameter, value between 0 and 1 (float);
+	- w - the frequency of the QNM (parameter of the Neural Network);
+	- A - the separation constant of thr Teukolsky equation (parameter of the Neural Network);
+	- m - the azimuthal number of the perturbation;
+	- x: vector with dimensions (N_x,1) that defines the radial space (compactified radial coordiante).
+	- mu: the mass of the particle that is perturbing the black hole (float);
+	- sign : the sign of the frequency (1 for QNM and -1 for QNMs);
+	- M: the mass of the black hole (float, default value = 1).
+	"""
+
+	# Important intermediate values:
+	rminus = M - np.sqrt(M**2 - a**2)
+	rplus = M + np.sqrt(M**2 - a**2)
+	q = sign * torch.sqrt(-w**2 + mu**2)
+	xi = (mu**2 - 2*w**2)/q
+	wc = a*m / (2*M*rplus)# Critical frequency for the superradiance
+	sigma = 2 * rplus * (w - wc) / (rplus - rminus)
+
+	F0_num,F1_num,F2 = F_numerators(a,w,A,m,x,mu,q,xi,sigma,rminus,rplus,M)
+
+	F0 = F0_num/((-1 + rminus*x)**2*xi**2)
+	F1 = F1_num/((-1 + rminus*x)*xi)
+
+	return F0,F1,F2
+
+class Polynomial:
+	"""
+	Minimal sparse multivariate polynomial with complex coefficients, used to expand the Mathematica
+	expressions of F_numerators once per configuration.
+	The terms are stored as a dictionary {exponents: coefficient}, where exponents is a tuple with
+	the power of each variable.
+	"""
+
+	# Stops numpy scalars from trying to broadcast over a Polynomial
+	__array_ufunc__ = None
+
+	def __init__(self, terms, n_vars):
+		self.terms = terms
+		self.n_vars = n_vars
+
+	@classmethod
+	def variable(cls, index, n_vars):
+		exponents = [0]*n_vars
+		exponents[index] = 1
+		return cls({tuple(exponents): 1.0}, n_vars)
+
+	def _coerce(self, other):
+		if isinstance(other, Polynomial):
+			return other
+		return Polynomial({(0,)*self.n_vars: complex(other)}, self.n_vars)
+
+	def __add__(self, other):
+		terms = dict(self.terms)
+		for exponents, coefficient in self._coerce(other).terms.items():
+			terms[exponents] = terms.get(exponents, 0) + coefficient
+		return Polynomial(terms, self.n_vars)
+
+	__radd__ = __add__
+
+	def __neg__(self):
+		return Polynomial({exponents: -coefficient for exponents, coefficient in self.terms.items()}, self.n_vars)
+
+	def __sub__(self, other):
+		return self + (-self._coerce(other))
+
+	def __rsub__(self, other):
+		return self._coerce(other) + (-self)
+
+	def __mul__(self, other):
+		if not isinstance(other, Polynomial):
+			other = complex(other)
+			return Polynomial({exponents: coefficient*other for exponents, coefficient in self.terms.items()}, self.n_vars)
+		terms = {}
+		for e1, c1 in self.terms.items():
+			for e2, c2 in other.terms.items():
+				exponents = tuple(i + j for i, j in zip(e1, e2))
+				terms[exponents] = terms.get(exponents, 0) + c1*c2
+		return Polynomial(terms, self.n_vars)
+
+	__rmul__ = __mul__
+
+	def __truediv__(self, other):
+		return self * (1/complex(other))
+
+	def __pow__(self, power):
+		result = self._coerce(1)
+		for _ in range(power):
+			result = result * self
+		return result
+
+	def coefficients(self, variable, degree, monomials):
+		"""
+		Returns the coefficient matrix of this polynomial with shape (degree+1, len(monomials)),
+		where the rows are the powers of the chosen variable and the columns are the monomials
+		(exponent tuples of the remaining variables).
+		"""
+		matrix = np.zeros((degree + 1, len(monomials)), dtype = np.complex128)
+		for exponents, coefficient in self.terms.items():
+			rest = exponents[:variable] + exponents[variable + 1:]
+			matrix[exponents[variable], monomials.index(rest)] += coefficient
+		return matrix
+
+
+class FTermsEngine:
+	"""
+	Precomputed coefficient engine for F_terms.
+	The F_numerators are polynomials in x whose coefficients are polynomials in (q, xi, sigma, A, w),
+	so they are expanded once per configuration into constant matrices. Each call then only computes
+	the monomials of (q, xi, sigma, A, w), a short list of complex coefficients in x (one matrix-vector product)
+	and evaluates them on the cached powers of x and denominators of the grid.
+	Receives as arguments:
+	- a - the spin parameter, value between 0 and 1 (float);
+	- m - the azimuthal number of the perturbation;
+	- mu - the mass of the particle that is perturbing the black hole (float);
+	- M - the mass of the black hole (float, default value = 1).
+	"""
+
+	variables = ("x", "q", "xi", "sigma", "A", "w")
+
+	def __init__(self, a, m, mu, M=1):
+		self.a = float(a)
+		self.m = float(m)
+		self.mu = float(mu)
+		self.M = float(M)
+		self.rminus = self.M - np.sqrt(self.M**2 - self.a**2)
+		self.rplus = self.M + np.sqrt(self.M**2 - self.a**2)
+		self.wc = self.a*self.m / (2*self.M*self.rplus) # Critical frequency for the superradiance
+
+		# Expand the numerators symbolically (in x, q, xi, sigma, A and w)
+		x, q, xi, sigma, A, w = [Polynomial.variable(i, len(self.variables)) for i in range(len(self.variables))]
+		F0_num, F1_num, F2 = F_numerators(self.a, w, A, self.m, x, self.mu, q, xi, sigma, self.rminus, self.rplus, self.M)
+
+		monomials = sorted({exponents[1:] for poly in (F0_num, F1_num) for exponents in poly.terms})
+		self.degree = max(exponents[0] for poly in (F0_num, F1_num, F2) for exponents in poly.terms)
+		self.exponents = np.array(monomials, dtype = np.int64).reshape(len(monomials), len(self.variables) - 1)
+		self.C0 = F0_num.coefficients(0, self.degree, monomials)
+		self.C1 = F1_num.coefficients(0, self.degree, monomials)
+		self.C2 = F2.coefficients(0, self.degree, [(0,)*(len(self.variables) - 1)])[:, 0].real
+
+		self._constants = {}
+		self._grid_x = None
+		self._grid_key = None
+		self._grid = None
+
+	def constants(self, dtype, device):
+		"""
+		Returns the coefficient matrices cast to the complex dtype and device of the eigenvalues.
+		"""
+		key = (dtype, device)
+		if key not in self._constants:
+			self._constants[key] = (torch.tensor(self.C0, dtype = dtype, device = device),
+				torch.tensor(self.C1, dtype = dtype, device = device),
+				torch.tensor(self.exponents, device = device))
+		return self._constants[key]
+
+	def grid(self, x, dtype):
+		"""
+		Returns the powers of x (N_x, degree+1), the denominators of F0 and F1 and F2, cached for the last grid.
+		They are always evaluated in float64, also for a float32 grid.
+		The cache holds a weak reference to x, so a new tensor allocated at the address of a freed one never hits it.
+		"""
+		key = (x._version, dtype)
+		if self._grid_x is None or self._grid_x() is not x or key != self._grid_key:
+			points = x.detach().reshape(-1).to(torch.float64)
+			powers = points.unsqueeze(1) ** torch.arange(self.degree + 1, device = points.device, dtype = points.dtype)
+			inv_den1 = 1/(-1 + self.rminus*points)
+			F2 = (powers @ torch.tensor(self.C2, dtype = points.dtype, device = points.device)).view(-1,1)
+			self._grid = (powers.to(dtype), inv_den1**2, inv_den1, F2)
+			self._grid_x = weakref.ref(x)
+			self._grid_key = key
+		return self._grid
+
+	def coefficients(self, w, A, sign):
+		"""
+		Returns the complex coefficients (in powers of x) of the numerators of F0 and F1 and the value of xi.
+		"""
+		C0, C1, exponents = self.constants(w.dtype, w.device)
+		q = sign * torch.sqrt(-w**2 + self.mu**2)
+		xi = (self.mu**2 - 2*w**2)/q
+		sigma = 2 * self.rplus * (w - self.wc) / (self.rplus - self.rminus)
+
+		monomials = torch.ones(exponents.shape[0], dtype = w.dtype, device = w.device)
+		for i, value in enumerate((q, xi, sigma, A, w)):
+			max_power = int(self.exponents[:, i].max())
+			if max_power > 0:
+				powers = torch.stack([value**k for k in range(max_power + 1)])
+				monomials = monomials * powers[exponents[:, i]]
+
+		return C0 @ monomials, C1 @ monomials, xi
+
+	def __call__(self, w, A, x, sign, rows = None):
+		"""
+		Calculates the F_i terms, each one with shape (N_x,1), with the same values as F_terms(a,w,A,m,x,mu,sign,M).
+		rows - optional slice of the points x where the terms are evaluated; the grid is cached for the whole x,
+		so the blocks of a chunked loss (see CustomLoss.blocks) share it.
+		"""
+		c0, c1, xi = self.coefficients(w, A, sign)
+		powers, inv_den0, inv_den1, F2 = self.grid(x, w.dtype)
+		if rows is not None:
+			powers, inv_den0, inv_den1, F2 = powers[rows], inv_den0[rows], inv_den1[rows], F2[rows]
+
+		F0 = ((powers @ c0) * inv_den0 / xi**2).view(-1,1)
+		F1 = ((powers @ c1) * inv_den1 / xi).view(-1,1)
+
+		return F0, F1, F2
+
+def G_terms(a,w,A,m,u,mu,sign):
+	"""
+	Calculates The F_i terms defined in the Appendix A, each one with shape (N_x,1).
+	Receives as arguments:
+	- a - the spin parameter, value between 0 and 0.5 (float);
+	- w - the frequency of the QNM (parameter of the Neural Network);
+	- A - the separation constant of thr Teukolsky equation (parameter of the Neural Network).
+	- m - Spherical harmonic indicies l and m;
+	- u: vector with dimensions (N_u,1) that defines the angular space.
+	- mu: the mass of the particle that is perturbing the black hole (float);
+	- sign : the sign of the frequency (1 for QNM and -1 for QNMs).
+	"""
+
+	# Important intermediate values:
+	w1 = sign*torch.sqrt(w**2 - mu**2)
+	b = - 1 + u**2
+
+	G0 =m**2 + b*(A + a*(-2*u*w1 + a*(w1**2))) - b*(1 + 2*a*u*w1)*torch.abs(m) - m**2 * u**2
+
+	G1 = -2*b*(u + a*b*w1 + u*torch.abs(m))
+
+	G2 = -b**2
+
+
+	return G0,G1,G2
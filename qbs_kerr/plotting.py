@@ -0,0 +1,29 @@
+"""
+Plots of the training. matplotlib is only imported when a plot is made.
+"""
+
+def plot_losses(loss,a,mu,lossF=None,lossG=None):
+	"""
+	Function that plots the evolution of the loss function(s) over the epoch.
+	Receives as arguments:
+	- loss - The "Global" Loss function (list of values for each epoch);
+	- a - the spin parameter (int);
+	- lossF - the loss of the radial solution (list of values for each epoch);
+	- lossG - the loss of the angular solution (list of values for each epoch);
+	"""
+	import matplotlib.pyplot as plt
+
+	plt.figure()
+	plt.title(f"Loss over epoch for a={a} and $\mu$={mu}")
+	# convert y-axis to Logarithmic scale
+	plt.yscale("log")
+	plt.plot(loss,label="total loss")
+	if None not in (lossF, lossG):
+		plt.plot(lossF,label="Loss of F")
+		plt.plot(lossG,label="Loss of G")
+
+	plt.legend()
+	plt.xlabel("Epoch")
+	plt.ylabel("Loss")
+	plt.show()
+	plt.savefig(f"Loss_over_epoch_a={a}_mu={mu}.png")
@@ -0,0 +1,116 @@
+"""
+Instrumentation of the phases of the training.
+"""
+import torch
+import os
+import contextlib
+import time
+try:
+	import resource
+except ImportError: #Not available on Windows
+	resource = None
+
+from .backend import device
+
+class PhaseProfiler:
+	"""
+	Named timers and counters of the phases of the training (F_terms, network, backward, optimiser step, ...).
+	When disabled, phase returns a shared no-op context manager, so the instrumented code only pays a function call.
+	Phases can be nested, so the total of a phase includes the phases inside it (e.g. the LBFGS_step contains the
+	loss and backward of its closure evaluations).
+	Receives as arguments:
+	- enabled - if False, nothing is timed or counted;
+	- trace_epochs - epochs whose execution is recorded with torch.profiler and exported as a Chrome trace
+		(trace_dir/epoch_<epoch>.json, readable in chrome://tracing or Perfetto), with the phases as named ranges;
+	- trace_dir - directory of the Chrome traces (None disables them).
+	"""
+	def __init__(self, enabled = True, trace_epochs = (), trace_dir = None):
+		self.enabled = enabled
+		self.trace_epochs = set(trace_epochs) if trace_dir is not None else set()
+		self.trace_dir = trace_dir
+		self.seconds = {}
+		self.counts = {}
+		self._tracing = False
+		self._disabled = contextlib.nullcontext()
+
+		#The peak of the GPU is measured from here, for each trial (the one of the CPU is only known for the whole process)
+		if enabled and device.type == "cuda":
+			torch.cuda.reset_peak_memory_stats()
+
+	def phase(self, name):
+		"""
+		Returns a context manager that adds the time spent inside it to the total of the phase name.
+		"""
+		if not self.enabled:
+			return self._disabled
+		return self._phase(name)
+
+	@contextlib.contextmanager
+	def _phase(self, name):
+		with torch.profiler.record_function(name) if self._tracing else self._disabled:
+			start = time.perf_counter()
+			try:
+				yield
+			finally:
+				self.seconds[name] = self.seconds.get(name, 0.0) + time.perf_counter() - start
+				self.counts[name] = self.counts.get(name, 0) + 1
+
+	def count(self, name, n = 1):
+		"""
+		Adds n to the counter name.
+		"""
+		if self.enabled:
+			self.counts[name] = self.counts.get(name, 0) + n
+
+	def epoch(self, epoch):
+		"""
+		Returns a context manager that records the epoch with torch.profiler if it is one of the trace_epochs.
+		"""
+		if epoch not in self.trace_epochs:
+			return self._disabled
+		return self._trace(epoch)
+
+	@contextlib.contextmanager
+	def _trace(self, epoch):
+		os.makedirs(self.trace_dir, exist_ok = True)
+		activities = [torch.profiler.ProfilerActivity.CPU]
+		if device.type == "cuda":
+			activities.append(torch.profiler.ProfilerActivity.CUDA)
+
+		self._tracing = True
+		try:
+			with torch.profiler.profile(activities = activities) as profile:
+				yield
+		finally:
+			self._tracing = False
+		profile.export_chrome_trace(os.path.join(self.trace_dir, f"epoch_{epoch}.json"))
+
+	@staticmethod
+	def peak_memory():
+		"""
+		Returns the peak memory in MB: on a GPU, the peak allocated by torch since its statistics were reset (by the last
+		PhaseProfiler created); on the CPU, the peak resident memory of the whole process, which in a worker running
+		many trials also includes the earlier ones.
+		"""
+		if device.type == "cuda":
+			return torch.cuda.max_memory_allocated() / 2**20
+		if resource is None:
+			return None
+		return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**10 #kB on Linux
+
+	def summary(self):
+		"""
+		Returns the totals of the phases, the counters and the peak memory as a flat dictionary. The peak memory is
+		"peak_memory_MB" (of this profiler) on a GPU and "process_peak_memory_MB" (of the whole process, see peak_memory) on the CPU.
+		"""
+		summary = {f"time_{name}": seconds for name, seconds in self.seconds.items()}
+		summary.update({f"calls_{name}": count for name, count in self.counts.items()})
+		summary["peak_memory_MB" if device.type == "cuda" else "process_peak_memory_MB"] = self.peak_memory()
+		return summary
+
+	def attach(self, trial):
+		"""
+		Stores the summary as user_attrs of the Optuna trial.
+		"""
+		for key, value in self.summary().items():
+			trial.set_user_attr(key, value)
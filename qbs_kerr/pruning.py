@@ -0,0 +1,113 @@
+"""
+Pruner of the study that extrapolates the learning curve of each trial (TrajectoryExtrapolationPruner).
+"""
+import math
+
+import numpy as np
+import optuna
+from optuna.trial import TrialState
+
+class TrajectoryExtrapolationPruner(optuna.pruners.BasePruner):
+	"""
+	Prunes the trials whose extrapolated final error cannot beat the best quantile of the complete trials.
+	The intermediate values reported by objective are the errors of the eigenvalue trajectory with respect to Leaver's results,
+	so a trial that diverges, oscillates or reaches a plateau far from them shows it in the shape of its learning curve.
+	At every step, a power law log(error) = c + b log(step) is fitted (least squares) to the last window reported values,
+	and extrapolated to the final step of the trial. The standard error s of the extrapolation grows with the scatter d of the fit
+	and with the distance to the final step, but the scatter of an oscillating trajectory must not make its prediction optimistic:
+	with r the fraction of sign changes of the successive differences of log(error) in the window (0 for a monotone trajectory,
+	about 2/3 for random noise and 1 for a zigzag), the prediction is
+	exp(min(extrapolation, last value) - tolerance*(1 - r)*s + oscillation*r*d),
+	and the trial is pruned if it is above the quantile of the values of the complete trials.
+	The final step is the user_attr "final_step" of the trial (set by objective), or final_step, or the last step of the complete trials.
+	Receives as arguments:
+	- wrapped_pruner - optional pruner (e.g. HyperbandPruner) that is also asked at every step: the trial is pruned if either prunes it;
+	- quantile - the quantile of the values of the complete trials that the prediction must beat;
+	- window - number of reported values of the fit;
+	- min_points - minimum number of reported values before the trial can be pruned;
+	- n_startup_trials - minimum number of complete trials before any trial is pruned;
+	- n_warmup_steps - steps of each trial before it can be pruned;
+	- tolerance - number of standard errors of the extrapolation subtracted from the prediction;
+	- oscillation - number of scatters of the fit added to the prediction of an oscillating trajectory;
+	- final_step - default final step of the trials.
+	"""
+	def __init__(self, wrapped_pruner = None, quantile = 0.25, window = 20, min_points = 10, n_startup_trials = 5, n_warmup_steps = 0,
+			tolerance = 2.0, oscillation = 1.0, final_step = None):
+		if not 0 < quantile < 1:
+			raise ValueError(f"The quantile must be between 0 and 1, got {quantile}")
+		if min_points < 3 or window < min_points:
+			raise ValueError("The fit needs window >= min_points >= 3")
+		self.wrapped_pruner = wrapped_pruner
+		self.quantile = quantile
+		self.window = window
+		self.min_points = min_points
+		self.n_startup_trials = n_startup_trials
+		self.n_warmup_steps = n_warmup_steps
+		self.tolerance = tolerance
+		self.oscillation = oscillation
+		self.final_step = final_step
+
+	def predict(self, steps, values, final_step):
+		"""
+		Returns the optimistic prediction of the error at final_step from the reported steps and values (see the class),
+		or None if there are not enough finite and positive values.
+		"""
+		steps, values = np.asarray(steps, dtype = np.float64), np.asarray(values, dtype = np.float64)
+		valid = np.isfinite(values) & (values > 0)
+		steps, values = steps[valid][-self.window:], values[valid][-self.window:]
+		if len(values) < self.min_points:
+			return None
+
+		s, y = np.log(steps + 1), np.log(values)
+		slope, intercept = np.polyfit(s, y, 1)
+		scatter = np.sqrt(np.sum((y - (intercept + slope*s))**2)/(len(s) - 2))
+
+		#Standard error of the prediction of the fit at the final step
+		s_final = math.log(max(final_step, steps[-1]) + 1)
+		error = scatter*math.sqrt(1 + 1/len(s) + (s_final - s.mean())**2/np.sum((s - s.mean())**2))
+		extrapolation = intercept + slope*s_final
+
+		#Fraction of the successive differences that change sign (the flat ones are not counted as changes)
+		differences = np.diff(y)
+		roughness = np.mean(differences[1:]*differences[:-1] < 0)
+
+		return math.exp(min(extrapolation, y[-1]) - self.tolerance*(1 - roughness)*error + self.oscillation*roughness*scatter)
+
+	def prune(self, study, trial):
+		if study.direction != optuna.study.StudyDirection.MINIMIZE:
+			raise ValueError("TrajectoryExtrapolationPruner needs a study that minimizes the error")
+
+		#The wrapped pruner keeps its own state (e.g. the brackets of Hyperband), so it is always asked
+		if self.wrapped_pruner is not None and self.wrapped_pruner.prune(study, trial):
+			return True
+
+		step = trial.last_step
+		if step is None or step < self.n_warmup_steps:
+			return False
+
+		complete = study.get_trials(deepcopy = False, states = (TrialState.COMPLETE,))
+		finals = [t.value for t in complete if t.value is not None and math.isfinite(t.value)]
+		if len(finals) < max(1, self.n_startup_trials):
+			return False
+
+		final_step = trial.user_attrs.get("final_step", self.final_step)
+		if final_step is None:
+			final_step = max([t.last_step for t in complete if t.last_step is not None], default = step)
+
+		steps = sorted(trial.intermediate_values)
+		prediction = self.predict(steps, [trial.intermediate_values[s] for s in steps], final_step)
+		if prediction is None:
+			return False
+
+		return prediction > np.quantile(finals, self.quantile)
+
+def create_pruner(name):
+	"""
+	Returns the pruner of the study called name: "hyperband" (optuna's HyperbandPruner) or "extrapolation"
+	(a TrajectoryExtrapolationPruner wrapping the HyperbandPruner).
+	"""
+	if name == "hyperband":
+		return optuna.pruners.HyperbandPruner()
+	if name == "extrapolation":
+		return TrajectoryExtrapolationPruner(optuna.pruners.HyperbandPruner())
+	raise ValueError(f"Unknown pruner: {name}")
@@ -0,0 +1,200 @@
+"""
+Reference frequencies of Leaver's continued fraction method and the errors of the results with respect to them.
+"""
+import numpy as np
+import os
+import json
+
+#Lock of the cache file shared by the workers of a study (POSIX only; elsewhere the writes are only atomic)
+try:
+	import fcntl
+except ImportError:
+	fcntl = None
+
+from .physics import Detweiler
+
+#Reference frequencies computed with Leaver's continued fraction method (see Leaver), memoized on disk
+LEAVER_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "QBS_Kerr", "leaver_cache.json")
+_leaver_cache = None
+
+def spheroidal_eigenvalue(c2, l, m, n_basis = 40):
+	"""
+	Computes the separation constant A of the angular equation
+	(1/sin(theta)) d/dtheta(sin(theta) dS/dtheta) + (c2*cos(theta)**2 - m**2/sin(theta)**2 + A) S = 0,
+	with c2 = a**2*(w**2 - mu**2), as an eigenvalue of the equation in the basis of normalized associated Legendre functions.
+	Receives as arguments:
+	- c2 - the (complex) spheroidal parameter;
+	- l, m - Spherical harmonic indicies l and m (A = l(l+1) when c2 = 0);
+	- n_basis - number of Legendre functions of the basis.
+	"""
+	am = abs(m)
+	ls = np.arange(am, am + n_basis)
+
+	# <l|cos(theta)**2|l> and <l+2|cos(theta)**2|l>
+	diagonal = (2*ls*(ls+1) - 2*am**2 - 1) / ((2*ls-1)*(2*ls+3))
+	off_diagonal = np.sqrt(((ls[:-2]+1)**2 - am**2)*((ls[:-2]+2)**2 - am**2) / ((2*ls[:-2]+1)*(2*ls[:-2]+3)**2*(2*ls[:-2]+5)))
+
+	matrix = np.diag(ls*(ls+1) - c2*diagonal) - c2*(np.diag(off_diagonal, 2) + np.diag(off_diagonal, -2))
+	eigenvalues = np.linalg.eigvals(matrix)
+
+	# The eigenvalue continuously connected with l(l+1)
+	return eigenvalues[np.argmin(np.abs(eigenvalues - (l*(l+1) - c2*diagonal[l - am])))]
+
+def leaver_continued_fraction(w, a, mu, l, m, sign = -1, n_terms = 2000):
+	"""
+	Evaluates Leaver's continued fraction for the radial equation of a massive scalar field in the Kerr spacetime (M = 1),
+	which vanishes at the quasi-bound state frequencies. It uses the same ansatz as the F terms,
+	R = (r - r_plus)**(-i*sigma) * (r - r_minus)**(i*sigma + xi - 1) * exp(q*r) * sum_n a_n ((r - r_plus)/(r - r_minus))**n,
+	whose coefficients satisfy alpha_n a_{n+1} + beta_n a_n + gamma_n a_{n-1} = 0.
+	Receives as arguments:
+	- w - the complex frequency;
+	- a, mu, l, m - the spin parameter, the mass of the field and the harmonic indicies;
+	- sign - the sign of q, as in F_terms (-1 for QBSs);
+	- n_terms - depth of the continued fraction.
+	Returns beta_0 - alpha_0 gamma_1/(beta_1 - alpha_1 gamma_2/(beta_2 - ...)).
+	"""
+	b = np.sqrt(1 - a**2)
+	rplus, rminus, d = 1 + b, 1 - b, 2*b
+	q = sign*np.sqrt(complex(mu**2 - w**2))
+	xi = (mu**2 - 2*w**2)/q
+	sigma = (2*rplus*w - a*m)/d
+	A = spheroidal_eigenvalue(a**2*(w**2 - mu**2), l, m)
+
+	s = 1j*sigma
+	c = s + xi - 1
+	p0 = 1 - 2*s
+	p1 = 4*s + 2*xi - 4 + 2*q*d
+	p2 = 3 - 2*s - 2*xi
+	c3 = -2*s*c - 2*s*q*d - s + c + q*d + 2*sigma*(2*w*rplus - sigma) + 2*a*m*w - mu**2*rplus**2 - a**2*w**2 - A
+	c4 = (xi - 1)**2 + (xi - 1) - q*d*(2*c + 1) + w**2*(4*rminus**2 + 4*rminus + 4*d*rminus + d**2) - mu**2*rminus**2 - a**2*w**2 - A - c3
+
+	n = np.arange(n_terms + 1)
+	alpha = ((n + 1)*(n + p0)).tolist()
+	beta = (-2*n**2 + (2 + p1)*n + c3).tolist()
+	gamma = ((n - 1)*(n - 2 + p2) + c4).tolist()
+
+	#The coefficients are vectorised, but the backward recurrence of the tail is sequential: on Python complex numbers it is
+	#faster and more accurate than a log-depth reduction of the continued fraction as a product of 2x2 Moebius matrices
+	tail = 0j
+	for k in range(n_terms, 0, -1):
+		tail = alpha[k-1]*gamma[k]/(beta[k] - tail)
+
+	return beta[0] - tail
+
+def _read_leaver_cache(cache_path):
+	#The file is always replaced atomically, so it is either complete or missing
+	if not os.path.exists(cache_path):
+		return {}
+	with open(cache_path) as file:
+		return json.load(file)
+
+def _update_leaver_cache(cache_path, key, value):
+	#Read-modify-write of the cache under an exclusive lock, so concurrent workers never lose each other's results
+	os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok = True)
+	with open(f"{cache_path}.lock", "a") as lock:
+		if fcntl is not None:
+			fcntl.flock(lock, fcntl.LOCK_EX)
+		cache = _read_leaver_cache(cache_path)
+		cache[key] = value
+		temporary_path = f"{cache_path}.{os.getpid()}.tmp"
+		with open(temporary_path, "w") as file:
+			json.dump(cache, file)
+		os.replace(temporary_path, cache_path)
+	return cache
+
+def Leaver(a, mu, l, m, n = 0, sign = -1, tol = 1e-12, max_iterations = 100, cache_path = None):
+	"""
+	Computes the reference quasi-bound state frequency for arbitrary (a, mu, l, m, n), finding the root of
+	leaver_continued_fraction with the secant method, seeded by Detweiler (with the hydrogenic real part).
+	The depth of the continued fraction is doubled until the root is stable, and the results are memoized in
+	a JSON file, so each configuration is only solved once. The file is updated under a lock (cache_path.lock)
+	and replaced atomically, so the workers of a parallel study can share it.
+	Receives as arguments:
+	- a, mu, l, m, n - the configuration (n is the overtone number);
+	- sign - the sign of q, as in F_terms;
+	- tol - relative tolerance of the frequency;
+	- max_iterations - maximum number of secant iterations;
+	- cache_path - the JSON file of the cache (default: LEAVER_CACHE_PATH; False disables the cache).
+	Returns:
+	- w_real, w_img - the real and imaginary parts of the frequency.
+	"""
+	global _leaver_cache
+	cache_path = LEAVER_CACHE_PATH if cache_path is None else cache_path
+	key = f"{float(a)!r},{float(mu)!r},{int(l)},{int(m)},{int(n)},{int(sign)}"
+
+	if cache_path:
+		#Read the file again on a miss, since another worker may have solved the configuration
+		if _leaver_cache is None or _leaver_cache[0] != cache_path or key not in _leaver_cache[1]:
+			_leaver_cache = (cache_path, _read_leaver_cache(cache_path))
+		if key in _leaver_cache[1]:
+			return tuple(_leaver_cache[1][key])
+
+	_, w_img = Detweiler(l, m, a, mu, n)
+	w = complex(mu*(1 - mu**2/(2*(l + 1 + n)**2)), w_img)
+
+	n_terms = 1000
+	previous = None
+	while previous is None or abs(w - previous) > tol*abs(w):
+		previous = w
+		n_terms = 2*n_terms
+
+		#Secant method
+		w0, w1 = w, w*(1 + 1e-4)
+		f0 = leaver_continued_fraction(w0, a, mu, l, m, sign, n_terms)
+		f1 = leaver_continued_fraction(w1, a, mu, l, m, sign, n_terms)
+		for _ in range(max_iterations):
+			if f1 == f0:
+				break
+			w0, f0, w1 = w1, f1, w1 - f1*(w1 - w0)/(f1 - f0)
+			f1 = leaver_continued_fraction(w1, a, mu, l, m, sign, n_terms)
+			if abs(w1 - w0) <= tol*abs(w1):
+				break
+		w = w1
+
+	if cache_path:
+		_leaver_cache = (cache_path, _update_leaver_cache(cache_path, key, [w.real, w.imag]))
+
+	return w.real, w.imag
+
+#Comparison with Leaver's results
+
+def print_results_QNM(w_real, w_img, a, mu = 0.4, l = 1, m = 1, n = 0):
+	"""
+	Function that prints the results of the model and compares them with Leaver's results
+	Args:
+		w_real
+        w_img
+        a
+        mu, l, m, n (by default the configuration of the study)
+	Returns:
+		error_real, error_img, average_error
+	"""
+	Leaver_real = None
+	if (mu == 0.4 and l == 1 and m == 1 and n == 0):
+		if(a == 0.1):
+			Leaver_real = 0.389635
+			Leaver_img = -0.00046769
+		elif(a == 0.5):
+			Leaver_real = 0.390012
+			Leaver_img = -0.00015369
+		elif(a == 0.9):
+			Leaver_real = 0.390438
+			Leaver_img = -4.41169*10**-6
+		elif(a == 0.95):
+			Leaver_real = 0.390487
+			Leaver_img = -5.82368*10**-7
+
+	#Any other configuration is solved with the continued fraction (and cached)
+	if Leaver_real is None:
+		Leaver_real, Leaver_img = Leaver(a, mu, l, m, n)
+
+	error_real = 100*np.abs(w_real - Leaver_real) / np.abs(Leaver_real)
+	#print("Percentual error for the real frequency:\n",error_real)
+
+	error_img = 100*np.abs(w_img - Leaver_img) / np.abs(Leaver_img)
+	#print("Percentual error for the imaginary frequency:\n", error_img)
+
+	average_error = (error_real + error_img)/2
+	#print("Average error:\n", average_error)
+
+	return error_real, error_img, average_error
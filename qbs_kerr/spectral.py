@@ -0,0 +1,198 @@
+"""
+Chebyshev spectral collocation of the radial and angular equations, solved for (w, A) with Newton's method:
+a fast baseline of the PINN and a better initial guess than Detweiler.
+"""
+import torch
+import numpy as np
+
+from .physics import Detweiler, FTermsEngine, G_terms
+
+def chebyshev_gauss(N):
+	"""
+	Returns the N Chebyshev-Gauss nodes t_k = cos(pi(2k+1)/(2N)) in (-1, 1) (the roots of T_N, in decreasing order),
+	their barycentric weights and the differentiation matrix D, such that D @ p(t_k) = p'(t_k) for the polynomials of degree < N.
+	The nodes do not include the endpoints, where the equations are singular.
+	"""
+	theta = np.pi*(2*np.arange(N) + 1)/(2*N)
+	nodes = np.cos(theta)
+	weights = (-1)**np.arange(N)*np.sin(theta)
+
+	difference = nodes[:, None] - nodes[None, :]
+	np.fill_diagonal(difference, 1)
+	D = weights[None, :]/weights[:, None]/difference
+	np.fill_diagonal(D, 0)
+	D -= np.diag(D.sum(axis = 1))
+
+	return nodes, weights, D
+
+def barycentric_row(nodes, weights, t):
+	"""
+	Returns the row vector that evaluates the interpolating polynomial of the values at the nodes at the point t
+	(which is not a node), with the barycentric formula.
+	"""
+	row = weights/(t - nodes)
+	return row/row.sum()
+
+class SpectralSolver:
+	"""
+	Spectral discretization of the radial equation F2 f'' + F1 f' + F0 f = 0 on x in (0, 1/r_plus) and of the angular
+	equation G2 g'' + G1 g' + G0 g = 0 on u in (-1, 1), with the same F and G terms as CustomLoss (FTermsEngine and G_terms),
+	collocated at N_x and N_u Chebyshev-Gauss nodes. The normalization f(1/r_plus) = 1 and g(-1) = 1 of the hard enforcement
+	closes the system, and the nonlinear eigenproblem for (f, g, w, A) is solved with Newton's method.
+	The regularity at the singular endpoints is implicit in the polynomial approximation.
+	Receives as arguments:
+	- a, mu, l, m, sign, M - the configuration, as in CustomLoss;
+	- N_x, N_u - number of nodes of the radial and angular grids.
+	"""
+	def __init__(self, a, mu, l, m, sign = -1, M = 1, N_x = 48, N_u = 24):
+		self.a, self.mu, self.l, self.m, self.sign, self.M = a, mu, l, m, sign, M
+		self.r_plus = M + np.sqrt(M**2 - a**2)
+		self.F_engine = FTermsEngine(a, m, mu, M)
+
+		#Radial grid, mapped from (-1, 1) to (0, 1/r_plus)
+		nodes, weights, D = chebyshev_gauss(N_x)
+		self.x = (nodes + 1)/(2*self.r_plus)
+		self.Dx = 2*self.r_plus*D
+		self.Dx2 = self.Dx @ self.Dx
+		self.horizon = barycentric_row(nodes, weights, 1.0)
+
+		#Angular grid
+		nodes, weights, D = chebyshev_gauss(N_u)
+		self.u = nodes
+		self.Du = D
+		self.Du2 = D @ D
+		self.pole = barycentric_row(nodes, weights, -1.0)
+
+		self._x = torch.tensor(self.x, dtype = torch.float64).view(-1,1)
+		self._u = torch.tensor(self.u, dtype = torch.float64).view(-1,1)
+		self._m = torch.tensor(m)
+		self._sign = torch.tensor(sign)
+
+	def operators(self, w, A):
+		"""
+		Returns the matrices of the radial and angular operators, F2 Dx^2 + F1 Dx + F0 and G2 Du^2 + G1 Du + G0, for complex w and A.
+		"""
+		w, A = torch.tensor(w, dtype = torch.complex128), torch.tensor(A, dtype = torch.complex128)
+		F0, F1, F2 = [t.numpy().reshape(-1)*np.ones(len(self.x)) for t in self.F_engine(w, A, self._x, self._sign)]
+		G0, G1, G2 = [t.numpy().reshape(-1)*np.ones(len(self.u)) for t in G_terms(self.a, w, A, self._m, self._u, self.mu, self.sign)]
+
+		return F2[:, None]*self.Dx2 + F1[:, None]*self.Dx + np.diag(F0), G2[:, None]*self.Du2 + G1[:, None]*self.Du + np.diag(G0)
+
+	def residual(self, w, A, f, g, scale_F = None, scale_G = None):
+		"""
+		Returns the root mean square of the residuals of the equations at the nodes and of the normalization conditions,
+		with the rows of each equation scaled by their largest coefficient (by default, the one of the operators at w and A).
+		"""
+		LF, LG = self.operators(w, A)
+		scale_F = 1/np.abs(LF).max(axis = 1) if scale_F is None else scale_F
+		scale_G = 1/np.abs(LG).max(axis = 1) if scale_G is None else scale_G
+		residual = np.concatenate((scale_F*(LF @ f), scale_G*(LG @ g), [self.horizon @ f - 1, self.pole @ g - 1]))
+		return np.sqrt(np.mean(np.abs(residual)**2))
+
+	def solve(self, w, A, f = None, g = None, tol = 1e-10, max_iterations = 30, step = 1e-7, residual_tol = 1e-5):
+		"""
+		Newton's method for (f, g, w, A), starting from w, A and the values f and g at the nodes (default: ones).
+		The rows of each equation are scaled by their largest coefficient, and the derivatives with respect to w and A
+		are finite differences with the given step. The iterations stop when the steps of w and A are below tol (relative),
+		or when they stop decreasing below sqrt(tol), the level of the rounding errors of the F terms.
+		Small steps alone do not make a root (Newton can stall far from one), so the solution has only converged
+		if the residual (see residual) at the last iterate is also below residual_tol.
+		Returns a dictionary with w and A (complex), f and g at the nodes, the number of iterations, the "residual"
+		and "converged".
+		"""
+		N_x, N_u = len(self.x), len(self.u)
+		n = N_x + N_u
+		f = np.ones(N_x, dtype = complex) if f is None else np.array(f, dtype = complex)
+		g = np.ones(N_u, dtype = complex) if g is None else np.array(g, dtype = complex)
+		w, A = complex(w), complex(A)
+
+		J = np.zeros((n + 2, n + 2), dtype = complex)
+		J[n, :N_x] = self.horizon
+		J[n + 1, N_x:n] = self.pole
+
+		scale_F = scale_G = None
+		previous = np.inf
+		converged = False
+		for iteration in range(1, max_iterations + 1):
+			LF, LG = self.operators(w, A)
+			if scale_F is None:
+				scale_F, scale_G = 1/np.abs(LF).max(axis = 1), 1/np.abs(LG).max(axis = 1)
+			LF_w, LG_w = self.operators(w + step, A)
+			LF_A, LG_A = self.operators(w, A + step)
+
+			Lf, Lg = LF @ f, LG @ g
+			residual = np.concatenate((scale_F*Lf, scale_G*Lg, [self.horizon @ f - 1, self.pole @ g - 1]))
+			J[:N_x, :N_x] = scale_F[:, None]*LF
+			J[N_x:n, N_x:n] = scale_G[:, None]*LG
+			J[:N_x, n], J[:N_x, n + 1] = scale_F*(LF_w @ f - Lf)/step, scale_F*(LF_A @ f - Lf)/step
+			J[N_x:n, n], J[N_x:n, n + 1] = scale_G*(LG_w @ g - Lg)/step, scale_G*(LG_A @ g - Lg)/step
+
+			delta = np.linalg.solve(J, -residual)
+			f, g = f + delta[:N_x], g + delta[N_x:n]
+			w, A = w + delta[n], A + delta[n + 1]
+
+			change = max(abs(delta[n])/abs(w), abs(delta[n + 1])/abs(A))
+			if change < tol or (change < np.sqrt(tol) and change > previous/2):
+				converged = True
+				break
+			previous = change
+
+		residual = self.residual(w, A, f, g, scale_F, scale_G)
+		converged = converged and residual < residual_tol
+		return {"w": w, "A": A, "f": f, "g": g, "iterations": iteration, "residual": residual, "converged": converged}
+
+	def interpolate(self, solver, solution):
+		"""
+		Returns f and g of the solution of another SpectralSolver interpolated at the nodes of this one.
+		"""
+		radial_nodes, radial_weights, _ = chebyshev_gauss(len(solver.x))
+		angular_nodes, angular_weights, _ = chebyshev_gauss(len(solver.u))
+		f = np.array([barycentric_row(radial_nodes, radial_weights, 2*self.r_plus*x - 1) @ solution["f"] for x in self.x])
+		g = np.array([barycentric_row(angular_nodes, angular_weights, u) @ solution["g"] for u in self.u])
+		return f, g
+
+def spectral_QBS(a, mu, l, m, n = 0, sign = -1, M = 1, N_x = 48, N_u = 24, w = None, A = None, tol = 1e-10, max_iterations = 30,
+		residual_tol = 1e-5, error_tol = 1e-4):
+	"""
+	Computes the quasi-bound state frequency w and separation constant A with SpectralSolver. The equations are first
+	solved on grids with half the nodes, from the hydrogenic frequency mu(1 - mu^2/(2(l+1+n)^2)) with Detweiler's imaginary
+	part and A = l(l+1) (or the given w and A), and then on the full grids from the coarse solution; the difference of both
+	frequencies estimates the discretization error.
+	Receives as arguments:
+	- a, mu, l, m, n, sign, M - the configuration (n is the overtone number of the initial guess, see below);
+	- N_x, N_u - number of nodes of the radial and angular grids;
+	- w, A - optional initial guess (complex);
+	- tol, max_iterations, residual_tol - as in SpectralSolver.solve;
+	- error_tol - largest error_estimate of a converged solution.
+	Returns a dictionary with w_real, w_img, A_real, A_img, error_estimate (|w - w_coarse|/|w|), residual (of the fine solution),
+	iterations and converged. The solution has only converged if both solves converged (with small residuals) and error_estimate
+	is below error_tol: Newton's method can also settle on a spurious root of the discretization, which moves with the grid.
+	With the default grids, the converged solutions were checked against Leaver for l = m = 1, 0.4 <= mu <= 0.5 and
+	0 <= a <= 0.95 (relative errors below 1e-5 in w_real and 2e-2 in w_img). The modes with m != l, l = 2 or mu <= 0.3 are not
+	resolved by them and are reported as not converged, so objective falls back to Detweiler for them.
+	Neither are the overtones: from the hydrogenic frequency of n > 0, Newton's method settles on the fundamental mode
+	(e.g. w = 0.3900116 - 1.54e-4 i for a = 0.5, mu = 0.4, l = m = 1 and n = 1 or 2, where Leaver's overtones are
+	0.3956556 - 6.83e-5 i and 0.3976348 - 3.15e-5 i) or on spurious roots, also when f is seeded with n nodes, so the
+	solutions of n > 0 are always reported as not converged.
+	The rounding errors of the F terms limit the absolute accuracy of w to about 1e-8, so the tiny imaginary parts
+	of the small mu configurations are only approximate.
+	"""
+	if w is None:
+		w = complex(mu*(1 - mu**2/(2*(l + 1 + n)**2)), Detweiler(l, m, a, mu, n, M)[1])
+	if A is None:
+		A = complex(l*(l + 1))
+
+	coarse = SpectralSolver(a, mu, l, m, sign, M, max(8, N_x//2), max(8, N_u//2))
+	coarse_solution = coarse.solve(w, A, tol = tol, max_iterations = max_iterations, residual_tol = residual_tol)
+
+	fine = SpectralSolver(a, mu, l, m, sign, M, N_x, N_u)
+	f, g = fine.interpolate(coarse, coarse_solution)
+	solution = fine.solve(coarse_solution["w"], coarse_solution["A"], f, g, tol = tol, max_iterations = max_iterations,
+		residual_tol = residual_tol)
+
+	w, A = solution["w"], solution["A"]
+	error_estimate = float(abs(w - coarse_solution["w"])/abs(w))
+	return {"w_real": float(w.real), "w_img": float(w.imag), "A_real": float(A.real), "A_img": float(A.imag),
+		"error_estimate": error_estimate, "residual": float(solution["residual"]),
+		"iterations": coarse_solution["iterations"] + solution["iterations"],
+		"converged": bool(n == 0 and coarse_solution["converged"] and solution["converged"] and error_estimate < error_tol)}
@@ -0,0 +1,400 @@
+"""
+Optuna study of the hyperparameters: the objective of a trial and the parallel study runner.
+"""
+import torch
+import numpy as np
+import os
+import datetime
+import functools
+import multiprocessing
+
+#Optuna
+import optuna
+from optuna.trial import TrialState
+
+from .backend import device
+from .physics import Detweiler
+from .networks import NeuralNetwork
+from .loss import CustomLoss, compile_loss
+from .profiling import PhaseProfiler
+from .reference import print_results_QNM
+from .spectral import spectral_QBS
+from .training import collocation_points, CollocationSampler, TrialCheckpointer, ConvergenceMonitor, EigenvalueRefiner, train_model
+from .trajectories import TrajectoryWriter
+from .health import HealthMonitor, NumericalInstability
+from .inference import export_profiles
+from .pruning import create_pruner
+
+#Multi-fidelity schedule of objective: (fraction of the collocation points, fraction of the Adam epochs) of each rung
+FIDELITY_RUNGS = ((0.25, 0.2), (0.5, 0.3), (1.0, 0.5))
+
+def objective (trial, report_every = 10, checkpoint_dir = None, checkpoint_every = 100, collocation = "uniform", N_x = 100, N_u = 100,
+		N_pool = 10000, batch_size = None, rar_every = 0, rar_points = 10, compile_backend = None,
+		mixed_precision = False, fused = False, profile = False, trace_epochs = (), trace_dir = None,
+		convergence_window = 0, eigenvalue_tol = 1e-6, loss_ratio_tol = 1e-2, fidelity_rungs = None,
+		trajectory_dir = None, health_action = "prune", initial_guess = "detweiler", refinement = "LBFGS",
+		chunk_size = None, activation_checkpointing = False, export_dir = None, export_points = 1000000):
+	"""
+	Objective of the Optuna study: trains one model and returns its average error with respect to Leaver's results.
+	Receives as arguments:
+	- trial - the Optuna trial;
+	- report_every - number of epochs between the reports of the accuracy to the pruner (and host synchronizations);
+	- checkpoint_dir - optional directory where the training is checkpointed every checkpoint_every epochs,
+		so a trial enqueued again by resume_interrupted_trials continues from its last checkpoint;
+	- collocation - kind of the initial collocation points ("uniform", "chebyshev" or "random", see collocation_points);
+	- N_x, N_u - number of initial collocation points of the radial and angular equations;
+	- N_pool - number of random candidate points of each equation for the residual-adaptive refinement;
+	- batch_size - number of points of each equation per Adam epoch (None uses all the collocation points);
+	- rar_every, rar_points - the rar_points candidate points with the largest residual are added every rar_every Adam epochs (0 disables it);
+	- compile_backend - optional backend of torch.compile (e.g. "inductor") for the compiled loss (see compile_loss);
+	- mixed_precision - if True, the Adam phase runs in float32/complex64 and the LBFGS phase in float64 (see train_model);
+	- fused - if True, the radial and angular networks are evaluated together with batched matrix products (see TwinNetwork);
+	- profile - if True, the time of each phase of the training and the peak memory are stored as user_attrs of the trial
+		(see PhaseProfiler; on the CPU the peak is the one of the whole worker process, so it never decreases between trials);
+	- trace_epochs, trace_dir - epochs exported as Chrome traces of torch.profiler to trace_dir/trial_<number>;
+	- convergence_window, eigenvalue_tol, loss_ratio_tol - if convergence_window > 0, each phase ends when the eigenvalues
+		and the loss reach a plateau of convergence_window epochs (see ConvergenceMonitor);
+	- fidelity_rungs - optional multi-fidelity schedule (e.g. FIDELITY_RUNGS): a sequence of rungs (points_fraction, epochs_fraction).
+		Each rung trains the model with points_fraction of N_x and N_u and epochs_fraction of epochs_Adam, carrying the weights
+		over to the next rung, and the pruner sees the epochs of all the rungs as one sequence of steps, so the trials that are not
+		promoted stop in the cheap rungs. Only the last rung (normally with points_fraction = 1) has the LBFGS phase;
+	- trajectory_dir - optional directory of a columnar store (see TrajectoryWriter) where the loss, lossF, lossG and eigenvalues
+		of every epoch of the trial are appended, also for pruned trials;
+	- health_action - "prune" or "fail": what happens to a trial whose F or G terms, loss or eigenvalues become NaN or Inf
+		(see HealthMonitor). The diagnostics are stored in the user_attr "health" of the trial and the study continues;
+	- initial_guess - "detweiler" or "spectral": the initial w and A of the model are Detweiler's frequency and l(l+1),
+		or the solution of the spectral solver (see spectral_QBS, stored in the user_attr "spectral" of the trial;
+		Detweiler is used if it does not converge);
+	- refinement - "LBFGS" or "LM_polish": the second phase of the training takes LBFGS steps of all the parameters,
+		which "LM_polish" follows with a polish stage of Levenberg-Marquardt steps of the eigenvalues with the networks fixed
+		(see EigenvalueRefiner);
+	- chunk_size, activation_checkpointing - optional blocks of points of the evaluation of the loss, which bound its memory
+		for large N_x and N_u (see CustomLoss.blocks);
+	- export_dir, export_points - optional directory where f and g of the trained model are exported on export_points points
+		of x and u, to trial_<number>_radial.npy and trial_<number>_angular.npy (see export_profiles, stored in the user_attr
+		"profiles" of the trial).
+	"""
+	# Set double precision as standard for torch
+	torch.set_default_dtype(torch.float64)
+	if initial_guess not in ("detweiler", "spectral"):
+		raise ValueError(f"Unknown initial guess: {initial_guess}")
+	if refinement not in ("LBFGS", "LM_polish"):
+		raise ValueError(f"Unknown refinement: {refinement}")
+	#print(device)
+
+	#Definition of a and mu
+	#a_list  = [0.1, 0.5, 0.9, 0.95]
+	a_list = [0.9]
+	mu = 0.4
+	M = 1 # Mass of the black hole
+	sign = -1 # Sign of the frequency (1 for QNM and -1 for QBSs)
+
+	# define the neural network to train
+	l,m = 1,1
+
+	"""
+	##############################################################################################
+	#Values defined by previous studies:
+	hidden_layers = 2
+	neurons_per_layer = 100
+	lr_Adam = 5e-4
+	activation = "tanh"
+	epochs_Adam = 500
+	std_radial = 0.40
+	restarts_optuna = 65
+	lr_LBFGS = 1e-2
+	epochs_LBFGS = 500
+	std_ang = 0.18
+	weight_loss_factor = 3 # 10**weight_loss_factor 
+	##############################################################################################
+	"""
+
+	##############################################################################################
+	#Optuna values:
+	#hidden_layers = trial.suggest_int("hidden_layers", 1, 3)
+	hidden_layers = 2
+	neurons_per_layer = trial.suggest_int("neurons_per_layer", 250, 300)
+	lr_Adam = trial.suggest_float("lr_Adam", 1e-6, 1e-2)
+	#activation = trial.suggest_categorical("activation", ["tanh"])
+	activation = "tanh"
+	epochs_Adam = trial.suggest_int("epochs_Adam", 1500, 3000)
+	std_radial = trial.suggest_float("std_radial", 0.01, 0.99)
+	restarts_optuna = trial.suggest_int("restarts_optuna", 1, 100)
+	lr_LBFGS = trial.suggest_float("lr_LBFGS", 5e-2, 1e-1)
+	epochs_LBFGS = trial.suggest_int("epochs_LBFGS", 200, 300)
+	std_ang = trial.suggest_float("std_ang", 0.01, 0.99)
+	weight_loss_factor = 1
+	##############################################################################################
+
+	#Initialize the model
+	#Find the best frequency to start the model using the Detweiler's method:
+	for a in a_list:
+
+		#Define the spacial domain for each a
+		r_plus = M + np.sqrt(M**2 - a**2)
+		init_w_real, init_w_img = Detweiler(l,m,a,mu)
+		init_A = None
+
+		#The spectral solver gives a much closer w (and A) in a few milliseconds
+		if initial_guess == "spectral":
+			seed = spectral_QBS(a,mu,l,m,sign = sign,M = M)
+			trial.set_user_attr("spectral", seed)
+			if seed["converged"]:
+				init_w_real, init_w_img, init_A = seed["w_real"], seed["w_img"], (seed["A_real"], seed["A_img"])
+			else:
+				print("The spectral solver did not converge, starting from Detweiler's frequency")
+
+		model = NeuralNetwork(activation = activation ,std_radial = std_radial,std_ang_optuna = std_ang,random_seed = 15,hidden_layers = hidden_layers , neurons_per_layer = neurons_per_layer  ,l = l, m = m, init_w_real = init_w_real, init_w_img = init_w_img, fused = fused).to(device)
+		if init_A is not None:
+			with torch.no_grad():
+				model.A_real.fill_(init_A[0])
+				model.A_img.fill_(init_A[1])
+
+		#Initialize the model of the loss
+		model_loss = CustomLoss(model,a,mu,sign,w_real = init_w_real,w_img = init_w_img,chunk_size = chunk_size,
+			activation_checkpointing = activation_checkpointing).to(device) #Change for different mu
+		if compile_backend is not None:
+			compile_loss(model_loss, compile_backend)
+
+		#Epochs trained in the previous rungs, so the steps reported to the pruner count all the epochs of the trial
+		offset = 0
+
+		def report(step, w_real, w_img, loss):
+			#calculate the accuracy of the model
+			accuracy_real, accuracy_img, accuracy_average = print_results_QNM(w_real, w_img, a, mu, l, m)
+
+			trial.report(accuracy_average, offset + step)
+
+			# Handle pruning based on the intermediate value.
+			if trial.should_prune():
+				raise optuna.exceptions.TrialPruned()
+
+		profiler = PhaseProfiler(enabled = profile, trace_epochs = trace_epochs,
+			trace_dir = None if trace_dir is None else os.path.join(trace_dir, f"trial_{trial.number}"))
+
+		#Checkpoints are named after the first trial that ran these parameters
+		if checkpoint_dir is not None:
+			checkpoint_id = trial.user_attrs.get("checkpoint_id", trial.number)
+			trial.set_user_attr("checkpoint_id", checkpoint_id)
+		checkpointers = []
+
+		#Each rung trains the same model (its weights are carried over) on a finer grid; only the last one has the LBFGS phase
+		rungs = ((1.0, 1.0),) if fidelity_rungs is None else fidelity_rungs
+		refiner = EigenvalueRefiner() if refinement == "LM_polish" else None
+		trial.set_user_attr("final_step", sum(max(1, round(epochs_fraction*epochs_Adam)) for _, epochs_fraction in rungs) + epochs_LBFGS - 1
+			+ (0 if refiner is None else refiner.epochs))
+		loss_list = []
+		for rung, (points_fraction, epochs_fraction) in enumerate(rungs):
+			last_rung = rung == len(rungs) - 1
+
+			# sample locations over the problem domain
+			rung_N_x, rung_N_u = max(4, round(points_fraction*N_x)), max(4, round(points_fraction*N_u))
+			generator = torch.Generator().manual_seed(15)
+			x = collocation_points(collocation,rung_N_x,0,1/r_plus,generator).requires_grad_(True).to(device)
+			u = collocation_points(collocation,rung_N_u,-1,1,generator).requires_grad_(True).to(device)
+
+			sampler = None
+			if batch_size is not None or rar_every:
+				x_pool = collocation_points("random",N_pool,0,1/r_plus,generator).to(device) if rar_every else None
+				u_pool = collocation_points("random",N_pool,-1,1,generator).to(device) if rar_every else None
+				sampler = CollocationSampler(x, u, x_pool, u_pool, batch_size = batch_size, refine_every = rar_every, refine_points = rar_points)
+
+			checkpointer = None
+			if checkpoint_dir is not None:
+				checkpointer = TrialCheckpointer(checkpoint_dir, checkpoint_id if len(rungs) == 1 else f"{checkpoint_id}_rung{rung}", checkpoint_every)
+				checkpointers.append(checkpointer)
+
+			#Train the model, reporting to the pruner every report_every epochs
+			try:
+				history = train_model(model, model_loss, x, u, weight_loss_factor, lr_Adam, max(1, round(epochs_fraction*epochs_Adam)),
+					restarts_optuna, lr_LBFGS, epochs_LBFGS if last_rung else 0,
+					report = report, report_every = report_every, checkpointer = checkpointer, collocation = sampler,
+					adam_dtype = torch.float32 if mixed_precision else None, profiler = profiler,
+					monitor = ConvergenceMonitor(convergence_window, eigenvalue_tol, loss_ratio_tol) if convergence_window else None,
+					trajectory = None if trajectory_dir is None else functools.partial(TrajectoryWriter.shared(trajectory_dir).append,
+						trial.number, epoch_offset = offset),
+					health = HealthMonitor(action = health_action),
+					refiner = refiner if last_rung else None)
+			except optuna.exceptions.TrialPruned:
+				for checkpointer in checkpointers:
+					checkpointer.remove()
+				raise
+			except NumericalInstability as error:
+				for checkpointer in checkpointers:
+					checkpointer.remove()
+				#Steps of the whole trial, as the ones reported to the pruner
+				diagnostics = error.diagnostics
+				diagnostics["step"] += offset
+				if diagnostics["last_healthy_step"] is not None:
+					diagnostics["last_healthy_step"] += offset
+				message = f"Trial {trial.number} is not healthy: {diagnostics}"
+				print(message)
+				trial.set_user_attr("health", diagnostics)
+				if health_action == "prune":
+					raise optuna.exceptions.TrialPruned(message)
+				#A NaN value makes Optuna mark the trial as failed without stopping the study
+				return float("nan")
+			finally:
+				if profile:
+					profiler.attach(trial)
+
+			offset += history["epochs"]
+			loss_list += history["loss"].tolist()
+
+		for checkpointer in checkpointers:
+			checkpointer.remove()
+
+		#Export f and g of the trained model on dense grids
+		if export_dir is not None:
+			paths = [os.path.join(export_dir, f"trial_{trial.number}_{kind}.npy") for kind in ("radial", "angular")]
+			export_profiles(model, a, *paths, N_x = export_points, N_u = export_points)
+			trial.set_user_attr("profiles", paths)
+
+		#Values of the loss function for plots (loss_list, with the epochs of all the rungs)
+        
+        #Plot the loss function
+		#plot_losses(loss_list, a, mu)
+
+		#Print the results of the model
+		#print("For a = ", a)    
+		print("Real frequency:", model.w_real.item())
+		print("Imaginary frequency:", model.w_img.item())
+
+		#Print the results of the model and compare with Leaver's results
+		accuracy_real, accuracy_img, accuracy_average = print_results_QNM(model.w_real.item(), model.w_img.item(), a, mu, l, m)
+		print("Average error:", accuracy_average)
+		print("Real error:", accuracy_real)
+		print("Imaginary error:", accuracy_img)
+
+		return accuracy_average
+
+
+def get_storage(storage_path):
+	"""
+	Returns the Optuna storage shared by all the worker processes of a study.
+	Receives as arguments:
+	- storage_path - path of the local file: SQLite database if it ends with ".db" or ".sqlite3",
+		otherwise an append-only journal file.
+	"""
+	if storage_path.endswith((".db", ".sqlite3")):
+		return optuna.storages.RDBStorage(f"sqlite:///{storage_path}")
+
+	try:
+		backend = optuna.storages.journal.JournalFileBackend(storage_path)
+	except AttributeError:
+		# Optuna < 4.0
+		backend = optuna.storages.JournalFileStorage(storage_path)
+	return optuna.storages.JournalStorage(backend)
+
+def study_worker(study_name, storage_path, n_trials, threads, cores=None, objective_kwargs=None, pruner="hyperband"):
+	"""
+	Runs trials of an existing study in a worker process, until the study has n_trials finished trials.
+	Receives as arguments:
+	- study_name, storage_path - the study to load (see get_storage);
+	- n_trials - total number of trials of the study (shared by all the workers);
+	- threads - number of intra-op threads given to torch in this process;
+	- cores - optional list of CPU cores to pin this process to;
+	- objective_kwargs - optional keyword arguments passed to objective;
+	- pruner - name of the pruner of the study (see create_pruner).
+	"""
+	if cores is not None and hasattr(os, "sched_setaffinity"):
+		os.sched_setaffinity(0, cores)
+	torch.set_num_threads(threads)
+
+	optuna.logging.set_verbosity(optuna.logging.WARNING)
+	study = optuna.load_study(study_name = study_name, storage = get_storage(storage_path), pruner = create_pruner(pruner))
+
+	objective_function = functools.partial(objective, **(objective_kwargs or {}))
+	try:
+		study.optimize(objective_function, callbacks = [optuna.study.MaxTrialsCallback(n_trials, states = (TrialState.COMPLETE, TrialState.PRUNED))])
+	finally:
+		#The rows of the last trials are written when the worker ends, not only by the atexit hook
+		TrajectoryWriter.close_shared()
+
+def resume_interrupted_trials(study):
+	"""
+	Marks the trials left running by a killed run of the study as failed and enqueues their parameters again,
+	with the same checkpoint_id, so objective resumes them from their last checkpoint instead of starting over.
+	It must only be called while no worker of the study is running.
+	Returns the number of resumed trials.
+	"""
+	interrupted = study.get_trials(deepcopy = False, states = [TrialState.RUNNING])
+	for trial in interrupted:
+		study._storage.set_trial_state_values(trial._trial_id, state = TrialState.FAIL)
+		study.enqueue_trial(trial.params, user_attrs = {"checkpoint_id": trial.user_attrs.get("checkpoint_id", trial.number)})
+
+	return len(interrupted)
+
+def run_parallel_study(n_trials, n_workers, storage_path = "optuna_QBS_K.log", study_name = "QBS_Kerr", threads_per_worker = None,
+		pin_cores = True, objective_kwargs = None, checkpoint_dir = "checkpoints_QBS_K", pruner = "hyperband"):
+	"""
+	Runs the Optuna study with n_workers processes sharing a file-backed storage, so the trials survive a crash
+	and the machine's cores are used without oversubscription.
+	Receives as arguments:
+	- n_trials - total number of trials of the study;
+	- n_workers - number of worker processes;
+	- storage_path, study_name - the shared storage (see get_storage) and the name of the study, which is resumed if it exists;
+	- threads_per_worker - torch threads of each worker (default: the available cores divided by n_workers);
+	- pin_cores - if True, each worker is pinned to its own block of cores (Linux only);
+	- objective_kwargs - optional keyword arguments passed to objective;
+	- checkpoint_dir - directory of the trial checkpoints (None disables them). Trials interrupted by a previous run
+		of the study are resumed from their checkpoints;
+	- pruner - "hyperband" or "extrapolation", the pruner of the workers (see create_pruner).
+	Returns the study.
+	"""
+	cores = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(os.cpu_count()))
+	if threads_per_worker is None:
+		threads_per_worker = max(1, len(cores) // n_workers)
+
+	study = optuna.create_study(study_name = study_name, storage = get_storage(storage_path), direction = "minimize",
+		pruner = create_pruner(pruner), load_if_exists = True)
+
+	if checkpoint_dir is not None:
+		objective_kwargs = dict(objective_kwargs or {}, checkpoint_dir = checkpoint_dir)
+		resumed = resume_interrupted_trials(study)
+		if resumed:
+			print(f"Resuming {resumed} interrupted trials")
+
+	start = datetime.datetime.now()
+	context = multiprocessing.get_context("spawn")
+	workers = []
+	for i in range(n_workers):
+		worker_cores = None
+		if pin_cores and (i + 1) * threads_per_worker <= len(cores):
+			worker_cores = cores[i * threads_per_worker:(i + 1) * threads_per_worker]
+		worker = context.Process(target = study_worker,
+			args = (study_name, storage_path, n_trials, threads_per_worker, worker_cores, objective_kwargs, pruner))
+		worker.start()
+		workers.append(worker)
+
+	for worker in workers:
+		worker.join()
+
+	#Aggregate throughput of this run
+	hours = (datetime.datetime.now() - start).total_seconds() / 3600
+	finished = [t for t in study.get_trials(deepcopy = False) if t.datetime_complete is not None and t.datetime_complete >= start]
+	print(f"{len(finished)} trials finished in {hours:.3f} h with {n_workers} workers x {threads_per_worker} threads: "
+		f"{len(finished) / hours if hours > 0 else float('nan'):.1f} trials/hour")
+
+	return study
+
+def print_study_statistics(study):
+	"""
+	Prints the number of finished, pruned and complete trials of the study and the best trial.
+	"""
+	pruned_trials = study.get_trials(deepcopy=False, states=[TrialState.PRUNED])
+	complete_trials = study.get_trials(deepcopy=False, states=[TrialState.COMPLETE])
+
+	print("Study statistics:")
+	print("  Number of finished trials:", len(study.trials))
+	print("  Number of pruned trials:", len(pruned_trials))
+	print("  Number of complete trials:", len(complete_trials))
+
+	print("Best trial:")
+	best_trial = study.best_trial
+
+	print("  Value:", best_trial.value)
+
+	print("  Params:")
+	for key, value in best_trial.params.items():
+		print("    {}: {}".format(key, value))
@@ -0,0 +1,102 @@
+"""
+Sweep of the QBS over a grid of (a, mu, l, m), with warm-start continuation.
+"""
+import torch
+import numpy as np
+import copy
+import datetime
+import csv
+
+from .backend import device
+from .physics import Detweiler
+from .networks import NeuralNetwork
+from .loss import CustomLoss
+from .reference import print_results_QNM
+from .training import train_model
+
+#Hyperparameters of the best trial found by the study (trial 23), used by the parameter sweep
+SWEEP_HYPERPARAMETERS = {"hidden_layers": 2, "neurons_per_layer": 294, "lr_Adam": 0.0020703458561315605, "epochs_Adam": 2516,
+	"std_radial": 0.1312151793633246, "restarts_optuna": 24, "lr_LBFGS": 0.08055439918400112, "epochs_LBFGS": 249,
+	"std_ang": 0.09901445620375583, "weight_loss_factor": 1}
+
+def nearest_solved(point, solved):
+	"""
+	Returns the solved point (a, mu, l, m) nearest to point with the same l and m, or None if there is none.
+	Receives as arguments:
+	- point - the tuple (a, mu, l, m);
+	- solved - dictionary {(a, mu, l, m): state} of the points already solved.
+	"""
+	a, mu, l, m = point
+	neighbours = [p for p in solved if p[2:] == (l, m)]
+	if not neighbours:
+		return None
+	return min(neighbours, key = lambda p: (p[0] - a)**2 + (p[1] - mu)**2)
+
+def sweep_QBS(grid, hyperparameters = None, table_path = "sweep_QBS_K.csv", warm_start = True, warm_epochs_fraction = 0.25,
+		stop_loss = None, report_every = 10, sign = -1, M = 1, N_x = 100, N_u = 100):
+	"""
+	Solves the QBS for every point (a, mu, l, m) of grid, in order.
+	With warm_start, each point is initialized from the converged weights and eigenvalues of its nearest solved neighbour
+	(same l and m): the frequency is continued with the shift predicted by Detweiler between both points and the
+	training uses only warm_epochs_fraction of the Adam and LBFGS epochs. The first point (and any point without
+	a neighbour) starts from scratch with the Detweiler frequency.
+	Receives as arguments:
+	- grid - list of tuples (a, mu, l, m);
+	- hyperparameters - dictionary with the hyperparameters of the training (default: SWEEP_HYPERPARAMETERS);
+	- table_path - CSV file where the table of results is written (rewritten after each point), or None;
+	- warm_start, warm_epochs_fraction - the continuation options;
+	- stop_loss, report_every - passed to train_model;
+	- sign, M, N_x, N_u - as in objective.
+	Returns the table, a list with one dictionary per point.
+	"""
+	torch.set_default_dtype(torch.float64)
+	hp = dict(SWEEP_HYPERPARAMETERS if hyperparameters is None else hyperparameters)
+
+	solved = {}
+	table = []
+	for point in grid:
+		a, mu, l, m = point
+		start = datetime.datetime.now()
+
+		#Define the spacial domain for each a
+		r_plus = M + np.sqrt(M**2 - a**2)
+		x = torch.linspace(0,1/r_plus,N_x).view(-1,1).requires_grad_(True).to(device)
+		u = torch.linspace(-1,1,N_u).view(-1,1).requires_grad_(True).to(device)
+
+		init_w_real, init_w_img = Detweiler(l,m,a,mu)
+		model = NeuralNetwork(activation = "tanh", std_radial = hp["std_radial"], std_ang_optuna = hp["std_ang"], random_seed = 15,
+			hidden_layers = hp["hidden_layers"], neurons_per_layer = hp["neurons_per_layer"], l = l, m = m,
+			init_w_real = init_w_real, init_w_img = init_w_img).to(device)
+
+		neighbour = nearest_solved(point, solved) if warm_start else None
+		epochs_Adam, epochs_LBFGS = hp["epochs_Adam"], hp["epochs_LBFGS"]
+		if neighbour is not None:
+			model.load_state_dict(solved[neighbour])
+
+			#Continue the frequency with the shift predicted by Detweiler between the neighbour and this point
+			neighbour_w_real, neighbour_w_img = Detweiler(l,m,neighbour[0],neighbour[1])
+			with torch.no_grad():
+				model.w_real += init_w_real - neighbour_w_real
+				model.w_img += init_w_img - neighbour_w_img
+
+			epochs_Adam = max(1, int(warm_epochs_fraction * epochs_Adam))
+			epochs_LBFGS = max(1, int(warm_epochs_fraction * epochs_LBFGS))
+
+		model_loss = CustomLoss(model,a,mu,sign,w_real = init_w_real,w_img = init_w_img).to(device)
+		history = train_model(model, model_loss, x, u, hp["weight_loss_factor"], hp["lr_Adam"], epochs_Adam, hp["restarts_optuna"],
+			hp["lr_LBFGS"], epochs_LBFGS, report_every = report_every, stop_loss = stop_loss)
+
+		solved[point] = copy.deepcopy(model.state_dict())
+		error_real, error_img, error_average = print_results_QNM(model.w_real.item(), model.w_img.item(), a, mu, l, m)
+		table.append({"a": a, "mu": mu, "l": l, "m": m, "w_real": model.w_real.item(), "w_img": model.w_img.item(),
+			"A_real": model.A_real.item(), "A_img": model.A_img.item(), "error_real": error_real, "error_img": error_img,
+			"error_average": error_average, "loss": history["loss"][-1], "epochs": history["epochs"],
+			"warm_start_from": "" if neighbour is None else str(neighbour), "seconds": (datetime.datetime.now() - start).total_seconds()})
+
+		if table_path is not None:
+			with open(table_path, "w", newline = "") as file:
+				writer = csv.DictWriter(file, fieldnames = list(table[0]))
+				writer.writeheader()
+				writer.writerows(table)
+
+	return table
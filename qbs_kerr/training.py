@@ -0,0 +1,730 @@
+"""
+Training loop of the models: collocation points, checkpoints, convergence monitor, train_model, train_ensemble and train_modes.
+"""
+import torch
+import numpy as np
+import math
+import os
+import concurrent.futures
+
+from .backend import device
+from .physics import Detweiler
+from .networks import NeuralNetwork, MultiModeNetwork
+from .loss import NeuralNetworkEnsemble, MultiModeLoss
+from .spectral import spectral_QBS
+from .health import HealthMonitor, NumericalInstability
+
+def collocation_points(kind, N, low, high, generator = None):
+	"""
+	Returns N collocation points in [low, high] as a tensor with shape (N,1).
+	Receives as arguments:
+	- kind - "uniform" (equally spaced, as torch.linspace), "chebyshev" (Chebyshev-Gauss-Lobatto nodes, clustered at both ends
+		of the interval, i.e. near the horizon for x and near the poles for u) or "random" (uniformly distributed, sorted);
+	- N - number of points;
+	- low, high - limits of the interval;
+	- generator - optional torch.Generator for the random points.
+	"""
+	if kind == "uniform":
+		points = torch.linspace(low, high, N)
+	elif kind == "chebyshev":
+		points = low + (high - low)*(1 - torch.cos(math.pi*torch.arange(N)/max(N - 1, 1)))/2
+	elif kind == "random":
+		points = low + (high - low)*torch.sort(torch.rand(N, generator = generator))[0]
+	else:
+		raise ValueError(f"Unknown collocation points: {kind}")
+
+	return points.view(-1,1)
+
+class CollocationSampler:
+	"""
+	Collocation points of the radial and angular equations used by train_model.
+	The active points are streamed in shuffled mini-batches of batch_size points, and every refine_every epochs
+	the residual-adaptive refinement (RAR) adds to them the refine_points points of the candidate pools with the largest residual.
+	Receives as arguments:
+	- x, u - the initial active points, with shapes (N_x,1) and (N_u,1);
+	- x_pool, u_pool - optional candidate points for the refinement;
+	- batch_size - number of points of each equation per mini-batch (None uses all the active points every epoch);
+	- refine_every - number of epochs between refinements (0 disables the refinement);
+	- refine_points - number of points added to each equation at every refinement;
+	- chunk_size - number of candidate points whose residual is evaluated at once;
+	- seed - seed of the shuffling of the mini-batches.
+	"""
+	def __init__(self, x, u, x_pool = None, u_pool = None, batch_size = None, refine_every = 0, refine_points = 0, chunk_size = 4096, seed = 0):
+		self.x = x
+		self.u = u
+		self.dtype = x.dtype
+		self.active = None
+		self.x_pool = x_pool
+		self.u_pool = u_pool
+		self.batch_size = batch_size
+		self.refine_every = refine_every if x_pool is not None or u_pool is not None else 0
+		self.refine_points = refine_points
+		self.chunk_size = chunk_size
+		self.generator = torch.Generator().manual_seed(seed)
+
+		#Candidate points already added to the active points
+		self.x_added = None if x_pool is None else torch.zeros(len(x_pool), dtype = torch.bool)
+		self.u_added = None if u_pool is None else torch.zeros(len(u_pool), dtype = torch.bool)
+
+		#Shuffled order of the active points and position of the next mini-batch in it
+		self.order = {"x": None, "u": None}
+		self.cursor = {"x": 0, "u": 0}
+
+	def points(self):
+		"""
+		Returns all the active points x and u, in the dtype set by to.
+		"""
+		if self.active is None:
+			self.active = tuple(p if p.dtype == self.dtype else p.detach().to(self.dtype).requires_grad_(p.requires_grad) for p in (self.x, self.u))
+		return self.active
+
+	def _next(self, name, points):
+		n = len(points)
+		if self.batch_size is None or self.batch_size >= n:
+			return points
+
+		order, cursor = self.order[name], self.cursor[name]
+		if order is None or len(order) != n or cursor + self.batch_size > n:
+			order, cursor = torch.randperm(n, generator = self.generator), 0
+		self.order[name], self.cursor[name] = order, cursor + self.batch_size
+
+		return points[order[cursor:cursor + self.batch_size].to(points.device)]
+
+	def batch(self):
+		"""
+		Returns the next mini-batch of points x and u.
+		"""
+		x, u = self.points()
+		return self._next("x", x), self._next("u", u)
+
+	def _largest_residuals(self, residual, pool, added, requires_grad):
+		values = []
+		for chunk in torch.split(pool, self.chunk_size):
+			#Summed over the modes of a MultiModeLoss
+			chunk = chunk.detach().to(self.dtype).requires_grad_(requires_grad)
+			values.append(torch.abs(residual(chunk)).detach().sum(dim=1))
+		values = torch.cat(values).cpu()
+		values[added] = -1
+
+		new = torch.topk(values, min(self.refine_points, int((~added).sum())))[1]
+		added[new] = True
+		return pool[new.to(pool.device)]
+
+	def refine(self, model_loss):
+		"""
+		Adds to the active points the refine_points candidate points of each equation with the largest residual of model_loss.
+		"""
+		w, A = model_loss.eigenvalues()
+		w, A = w.detach(), A.detach()
+
+		#The Taylor mode derivatives do not need the graph of the candidate points
+		autograd = model_loss.derivatives == "autograd"
+		with torch.set_grad_enabled(autograd):
+			if self.x_pool is not None:
+				new = self._largest_residuals(lambda x: model_loss.residual_F(x, w, A), self.x_pool, self.x_added, autograd)
+				self.x = torch.cat((self.x.detach(), new)).requires_grad_(self.x.requires_grad)
+			if self.u_pool is not None:
+				new = self._largest_residuals(lambda u: model_loss.residual_G(u, w, A), self.u_pool, self.u_added, autograd)
+				self.u = torch.cat((self.u.detach(), new)).requires_grad_(self.u.requires_grad)
+		self.active = None
+
+	def step(self, epoch, model_loss):
+		"""
+		Refines the active points at the end of every refine_every epochs.
+		"""
+		if self.refine_every and (epoch + 1) % self.refine_every == 0:
+			self.refine(model_loss)
+
+	def to(self, dtype):
+		"""
+		Sets the dtype of the points returned by points and batch and of the candidate points evaluated by the refinement.
+		The points are stored in their original precision and only cast on their way out, so going back to it loses nothing.
+		"""
+		self.dtype = dtype
+		self.active = None
+		return self
+
+	def state_dict(self):
+		return {"x": self.x.detach(), "u": self.u.detach(), "x_added": self.x_added, "u_added": self.u_added,
+			"order": dict(self.order), "cursor": dict(self.cursor), "generator": self.generator.get_state()}
+
+	def load_state_dict(self, state):
+		self.x = state["x"].to(self.x.device, self.x.dtype).requires_grad_(self.x.requires_grad)
+		self.u = state["u"].to(self.u.device, self.u.dtype).requires_grad_(self.u.requires_grad)
+		self.active = None
+		self.x_added, self.u_added = state["x_added"], state["u_added"]
+		self.order, self.cursor = dict(state["order"]), dict(state["cursor"])
+		self.generator.set_state(state["generator"])
+
+class TrialCheckpointer:
+	"""
+	Periodic checkpoints of a training run (model, optimiser and scheduler states, eigenvalues and loss history),
+	tied to an Optuna trial. The state is copied to the host in the training loop and written by a background thread
+	to a temporary file that atomically replaces the previous checkpoint, so a crash never leaves a partial file.
+	If the previous write is still running when a new checkpoint is due, that checkpoint is skipped instead of
+	stalling the loop.
+	Receives as arguments:
+	- directory - the directory of the checkpoints;
+	- checkpoint_id - the identifier of the run (the number of the original Optuna trial);
+	- every - number of epochs between checkpoints.
+	"""
+
+	def __init__(self, directory, checkpoint_id, every = 100):
+		os.makedirs(directory, exist_ok = True)
+		self.path = os.path.join(directory, f"trial_{checkpoint_id}.pt")
+		self.every = every
+		self.executor = concurrent.futures.ThreadPoolExecutor(max_workers = 1)
+		self.pending = None
+
+	@staticmethod
+	def snapshot(value):
+		"""
+		Returns a copy of value (tensors, dictionaries, lists and tuples of them) on the host.
+		"""
+		if torch.is_tensor(value):
+			return value.detach().to("cpu", copy = True)
+		if isinstance(value, dict):
+			return {key: TrialCheckpointer.snapshot(item) for key, item in value.items()}
+		if isinstance(value, (list, tuple)):
+			return type(value)(TrialCheckpointer.snapshot(item) for item in value)
+		return value
+
+	def _write(self, state):
+		temporary_path = self.path + ".tmp"
+		torch.save(state, temporary_path)
+		os.replace(temporary_path, self.path)
+
+	def save(self, state):
+		"""
+		Saves the state (a dictionary) asynchronously.
+		"""
+		if self.pending is not None and not self.pending.done():
+			return
+		self.pending = self.executor.submit(self._write, self.snapshot(state))
+
+	def load(self):
+		"""
+		Returns the last saved state, or None if there is no checkpoint.
+		"""
+		self.wait()
+		if not os.path.exists(self.path):
+			return None
+		return torch.load(self.path, map_location = device)
+
+	def wait(self):
+		if self.pending is not None:
+			self.pending.result()
+
+	def remove(self):
+		"""
+		Deletes the checkpoint, once the trial has finished.
+		"""
+		self.wait()
+		if os.path.exists(self.path):
+			os.remove(self.path)
+
+class ConvergenceMonitor:
+	"""
+	Plateau rules that end a phase of train_model early, checked at its reporting points.
+	A phase has converged when, over the last window epochs of the phase, every enabled rule holds:
+	- the relative drift of the eigenvalues, |w - w_old|/|w| and |A - A_old|/|A|, is below eigenvalue_tol;
+	- the loss decreased by less than the fraction loss_ratio_tol, i.e. loss/loss_old > 1 - loss_ratio_tol.
+	Receives as arguments:
+	- window - number of epochs of the plateau;
+	- eigenvalue_tol, loss_ratio_tol - the tolerances of the rules (None disables a rule);
+	- phases - the phases that can end early ("Adam" and/or "LBFGS").
+	"""
+	def __init__(self, window = 100, eigenvalue_tol = 1e-6, loss_ratio_tol = 1e-2, phases = ("Adam", "LBFGS")):
+		self.window = window
+		self.eigenvalue_tol = eigenvalue_tol
+		self.loss_ratio_tol = loss_ratio_tol
+		self.phases = phases
+
+	def converged(self, loss, eigenvalues):
+		"""
+		Receives the losses [old, new] and the eigenvalues [old, new], each one [w_real, w_img, A_real, A_img],
+		of the first and last epochs of the window (lists, one value per mode, for a MultiModeNetwork: the drift is the largest one).
+		Returns True if the phase has converged.
+		"""
+		if self.eigenvalue_tol is not None:
+			(w_old, A_old), (w_new, A_new) = [(np.asarray(values[0]) + 1j*np.asarray(values[1]), np.asarray(values[2]) + 1j*np.asarray(values[3]))
+				for values in eigenvalues]
+			drift = max(np.max(np.abs(w_new - w_old)/np.abs(w_new)), np.max(np.abs(A_new - A_old)/np.abs(A_new)))
+			if not drift < self.eigenvalue_tol:
+				return False
+
+		if self.loss_ratio_tol is not None and not loss[1]/loss[0] > 1 - self.loss_ratio_tol:
+			return False
+
+		return True
+
+class EigenvalueRefiner:
+	"""
+	Levenberg-Marquardt refinement of the eigenvalues w_real, w_img, A_real and A_img: a polish stage of epochs steps that
+	train_model runs after the LBFGS phase has ended, with the networks fixed. It is not an alternative to the LBFGS phase:
+	alternating its steps with LBFGS steps of the networks only (resetting the LBFGS history after each one, since the
+	eigenvalues move the loss surface under its curvature pairs) ended with errors about 30 times larger than LBFGS alone
+	in benchmark_refinement, also when LBFGS kept training the eigenvalues.
+	With the networks fixed, the loss of each mode,
+	sum_i s_i |R_i| with s_i = 10**weight_loss_factor/N_x for the residuals R_F of the radial equation and 1/N_u for the residuals R_G
+	of the angular equation, only depends on w and A. Each step is a damped Gauss-Newton step of its iteratively reweighted
+	least squares form, sum_i s_i |R_i|^2/|R_i^0| (R^0 the residuals at the current eigenvalues), whose Jacobian with respect to the
+	four eigenvalues follows from dR/dw and dR/dA (R is holomorphic in w and A), computed with central differences of relative
+	step step_size, so the networks are evaluated once per step.
+	Each step solves (J^T J + damping diag(J^T J)) dp = -J^T r and is accepted if it reduces the loss, dividing the damping by factor;
+	otherwise the damping is multiplied by factor and the step is tried again (up to max_tries times).
+	The modes of a MultiModeNetwork are independent, so each one has its own step and damping.
+	The NaN/Inf flags of model_loss are not set by the rejected steps (a step is rejected if its residuals are not finite).
+	If model_loss has a chunk_size, the networks are evaluated in blocks of chunk_size points, as in CustomLoss.blocks.
+	Receives as arguments:
+	- damping - initial damping;
+	- factor - factor of the changes of the damping;
+	- max_tries - maximum number of evaluations of the residuals per step;
+	- step_size - relative step of the differences;
+	- epochs - number of steps of the polish stage.
+	"""
+	def __init__(self, damping = 1e-3, factor = 10, max_tries = 10, step_size = 1e-6, epochs = 20):
+		self.initial_damping = damping
+		self.epochs = epochs
+		self.components = None
+		self.damping = None
+		self.factor = factor
+		self.max_tries = max_tries
+		self.step_size = step_size
+
+	def state_dict(self):
+		return {"damping": self.damping}
+
+	def load_state_dict(self, state):
+		self.damping = state["damping"]
+
+	def step(self, model_loss, x, u, weight_loss_factor):
+		"""
+		Takes one Levenberg-Marquardt step of the eigenvalues of the model of model_loss (updated in place).
+		Returns the loss of each mode after the step, whose lossF and lossG are kept in components (as in CustomLoss).
+		"""
+		health, model_loss.health = model_loss.health, HealthMonitor(enabled = False)
+		try:
+			current = self._step(model_loss, x, u, weight_loss_factor)
+		finally:
+			model_loss.health = health
+		health.check("eigenvalues", model_loss.NeuralNetwork.w_real, model_loss.NeuralNetwork.w_img,
+			model_loss.NeuralNetwork.A_real, model_loss.NeuralNetwork.A_img)
+		return current
+
+	@staticmethod
+	def _network_outputs(model_loss, x, u):
+		#The tuples (f, f', f'') and (g, g', g''), evaluated in blocks if model_loss has a chunk_size
+		if model_loss.chunk_size is None:
+			return model_loss.network_outputs(x,u)
+		model, a = model_loss.NeuralNetwork, model_loss.a
+		with model_loss.profiler.phase("network"):
+			radial = [model.radial_derivatives(block,a) for block in torch.split(x, model_loss.chunk_size)]
+			angular = [model.angular_derivatives(block) for block in torch.split(u, model_loss.chunk_size)]
+		return tuple(torch.cat(parts) for parts in zip(*radial)), tuple(torch.cat(parts) for parts in zip(*angular))
+
+	def _step(self, model_loss, x, u, weight_loss_factor):
+		model = model_loss.NeuralNetwork
+		with torch.no_grad():
+			radial, angular = self._network_outputs(model_loss, x, u)
+			w, A = model_loss.eigenvalues()
+			shape = w.shape
+			w, A = w.reshape(-1), A.reshape(-1)
+			weights = torch.cat((torch.full((len(x),1), 10**weight_loss_factor/len(x)), torch.full((len(u),1), 1/len(u)))).to(x)
+
+			def residuals(w, A):
+				#Residuals of each mode, with shape (N_x + N_u, K)
+				R_F = model_loss.residual_F(x,w.view(shape),A.view(shape),radial).reshape(len(x),-1)
+				R_G = model_loss.residual_G(u,w.view(shape),A.view(shape),angular).reshape(len(u),-1)
+				return torch.cat((R_F, R_G))
+
+			def loss(R):
+				return (weights*torch.abs(R)).sum(dim=0)
+
+			R = residuals(w,A)
+			accepted_R = R
+			h_w, h_A = self.step_size*torch.abs(w), self.step_size*torch.abs(A)
+			R_w = (residuals(w + h_w,A) - residuals(w - h_w,A))/(2*h_w)
+			R_A = (residuals(w,A + h_A) - residuals(w,A - h_A))/(2*h_A)
+
+			#Reweighted residuals and their Jacobian (real and imaginary parts), with shapes (K, 2(N_x + N_u)) and (K, 2(N_x + N_u), 4)
+			scale = torch.sqrt(weights/torch.clamp(torch.abs(R), min = torch.finfo(R.real.dtype).tiny))
+			r = torch.view_as_real(scale*R).permute(1,0,2).reshape(len(w),-1,1)
+			J = torch.view_as_real(scale.unsqueeze(-1)*torch.stack((R_w, 1j*R_w, R_A, 1j*R_A), dim=-1)).permute(1,0,3,2).reshape(len(w),-1,4)
+			JTJ = J.mT @ J
+			gradient = J.mT @ r
+
+			if self.damping is None:
+				self.damping = torch.full((len(w),), self.initial_damping, dtype = JTJ.dtype, device = JTJ.device)
+			current = loss(R)
+			accepted = torch.zeros(len(w), dtype = torch.bool, device = JTJ.device)
+			for _ in range(self.max_tries):
+				damped = JTJ + self.damping.view(-1,1,1)*torch.diag_embed(torch.diagonal(JTJ, dim1=-2, dim2=-1))
+				dp = -torch.linalg.solve(damped, gradient)[..., 0]
+				w_new = torch.where(accepted, w, w + torch.complex(dp[:,0], dp[:,1]))
+				A_new = torch.where(accepted, A, A + torch.complex(dp[:,2], dp[:,3]))
+				R_new = residuals(w_new,A_new)
+				new = loss(R_new)
+
+				better = ~accepted & (new < current)
+				w, A = torch.where(better, w_new, w), torch.where(better, A_new, A)
+				accepted_R = torch.where(better, R_new, accepted_R)
+				current = torch.where(better, new, current)
+				self.damping = torch.where(better, self.damping/self.factor, torch.where(accepted, self.damping, self.damping*self.factor))
+				accepted |= better
+				if accepted.all():
+					break
+
+			model.w_real.copy_(w.real.view(shape))
+			model.w_img.copy_(w.imag.view(shape))
+			model.A_real.copy_(A.real.view(shape))
+			model.A_img.copy_(A.imag.view(shape))
+
+			self.components = torch.stack((torch.abs(accepted_R[:len(x)]).sum(dim=0)/len(x),
+				torch.abs(accepted_R[len(x):]).sum(dim=0)/len(u))).view(2,*shape)
+
+		return current
+
+def train_model(model, model_loss, x, u, weight_loss_factor, lr_Adam, epochs_Adam, restarts_optuna, lr_LBFGS, epochs_LBFGS,
+		report = None, report_every = 1, stop_loss = None, checkpointer = None, collocation = None, adam_dtype = None,
+		profiler = None, monitor = None, trajectory = None, health = None, refiner = None):
+	"""
+	Trains the model with the Adam optimiser followed by the LBFGS optimiser.
+	The loss and the eigenvalues of every epoch are kept in preallocated tensors on the device of the model,
+	so the hot loop never synchronizes with the host; they are only read at the reporting points.
+	Receives as arguments:
+	- model, model_loss - the NeuralNetwork and its CustomLoss, or a MultiModeNetwork and its MultiModeLoss
+		(w_real, w_img and the columns of the history then have one value per mode);
+	- x, u - the radial and angular grids;
+	- weight_loss_factor, lr_Adam, epochs_Adam, restarts_optuna, lr_LBFGS, epochs_LBFGS - the hyperparameters of the training;
+	- report - optional function report(step, w_real, w_img, loss), called with Python floats every report_every epochs
+		and at the last epoch of each phase. It can raise optuna.exceptions.TrialPruned to stop the training;
+	- report_every - number of epochs between reporting points;
+	- stop_loss - optional value of the loss that ends the training when it is reached at a reporting point;
+	- checkpointer - optional TrialCheckpointer: the training resumes from its last checkpoint and saves a new one every checkpointer.every epochs;
+	- collocation - optional CollocationSampler that replaces x and u: the Adam epochs use its mini-batches and refinements,
+		and the LBFGS epochs all of its active points;
+	- adam_dtype - optional dtype of the Adam phase (e.g. torch.float32, with complex64 residuals): the model and the points
+		are cast to it for the Adam epochs and back to their dtype for the LBFGS epochs. The F and G terms are always
+		evaluated in double precision (see CustomLoss.residual_F);
+	- profiler - optional PhaseProfiler that times the phases of the training (it replaces the profiler of model_loss);
+	- monitor - optional ConvergenceMonitor, checked at the reporting points, that ends the Adam or the LBFGS phase
+		when the eigenvalues and the loss reach a plateau;
+	- trajectory - optional function trajectory(history) called with the history returned by train_model when the training ends,
+		also if report stops it with an exception (e.g. when the trial is pruned). It can be the append of a TrajectoryWriter;
+	- health - optional HealthMonitor (it replaces the one of model_loss). Its NaN/Inf flags are read at the reporting points,
+		before report (only at the end of each phase if there is no report, stop_loss or monitor), and a NumericalInstability
+		with the diagnostics is raised if any of them is set;
+	- refiner - optional EigenvalueRefiner: after the LBFGS phase, refiner.epochs Levenberg-Marquardt steps of the eigenvalues
+		are taken with the networks fixed (phase "LM", numbered after the last LBFGS epoch and not checkpointed: a run resumed
+		from the LBFGS phase takes them again).
+	If model_loss has a chunk_size (and no activation checkpointing), the gradients are accumulated block by block (see CustomLoss.blocks).
+	The LBFGS epochs log the loss returned by the step of the optimiser (the loss at the start of the step),
+	without evaluating the closure again. They are numbered from epochs_Adam, even if the Adam phase ended early.
+	Returns a dictionary with the numpy arrays "loss", "lossF", "lossG", "w_real", "w_img", "A_real" and "A_img" (one value per epoch trained),
+	the number of "epochs" trained and the number of them in the Adam phase ("Adam_epochs").
+	"""
+	n_epochs = epochs_Adam + epochs_LBFGS + (0 if refiner is None else refiner.epochs)
+	dtype = x.dtype
+	if profiler is not None:
+		model_loss.profiler = profiler
+	profiler = model_loss.profiler
+	if health is not None:
+		model_loss.health = health
+	health = model_loss.health
+	health.reset()
+	loss_history = torch.zeros(n_epochs, device = x.device)
+	eigenvalue_history = torch.zeros(n_epochs, 4, *model.w_real.shape, device = x.device)
+	component_history = torch.zeros(n_epochs, 2, *model.w_real.shape, device = x.device)
+	epochs = 0
+	stop = False
+	converged = False
+
+	def record(step, loss, components, last, phase, phase_start):
+		nonlocal epochs, stop, converged
+		loss_history[step] = loss.detach()
+		component_history[step] = components
+		eigenvalue_history[step] = torch.stack((model.w_real, model.w_img, model.A_real, model.A_img)).detach()
+		epochs = step + 1
+
+		#Without a report, stop_loss or monitor, the health is only checked at the end of each phase
+		listening = report is not None or stop_loss is not None or monitor is not None
+		if (listening and (step + 1) % report_every == 0) or (last and (listening or health.enabled)):
+			if health.enabled and not health.healthy(step):
+				error = NumericalInstability(health.diagnostics(step, phase, loss_history[step].item(), eigenvalue_history[step].tolist()))
+				if trajectory is not None:
+					trajectory(history(epochs if phase == "Adam" else adam_epochs))
+				raise error
+
+			w_real, w_img = eigenvalue_history[step, :2].tolist()
+			loss_value = loss_history[step].item()
+			if report is not None:
+				try:
+					report(step, w_real, w_img, loss_value)
+				except Exception:
+					if trajectory is not None:
+						trajectory(history(epochs if phase == "Adam" else adam_epochs))
+					raise
+			stop = stop_loss is not None and loss_value <= stop_loss
+
+			if monitor is not None and phase in monitor.phases and step - monitor.window >= phase_start:
+				window = [step - monitor.window, step]
+				converged = monitor.converged(loss_history[window].tolist(), eigenvalue_history[window].tolist())
+
+	def history(adam_epochs):
+		#Flush the history of the epochs trained to the host
+		trained = torch.cat((torch.arange(adam_epochs), torch.arange(epochs_Adam, max(epochs, epochs_Adam)))).to(loss_history.device)
+		eigenvalues = eigenvalue_history[trained].cpu().numpy()
+		components = component_history[trained].cpu().numpy()
+		return {"loss": loss_history[trained].cpu().numpy(), "lossF": components[:, 0], "lossG": components[:, 1],
+			"w_real": eigenvalues[:, 0], "w_img": eigenvalues[:, 1], "A_real": eigenvalues[:, 2], "A_img": eigenvalues[:, 3],
+			"epochs": len(trained), "Adam_epochs": adam_epochs}
+
+	#Resume from the last checkpoint of this run
+	checkpoint = checkpointer.load() if checkpointer is not None else None
+	if checkpoint is not None:
+		model.load_state_dict(checkpoint["model"])
+		epochs = checkpoint["epochs"]
+		loss_history[:epochs] = checkpoint["loss"]
+		eigenvalue_history[:epochs] = checkpoint["eigenvalues"]
+		if "components" in checkpoint:
+			component_history[:epochs] = checkpoint["components"]
+		if collocation is not None:
+			collocation.load_state_dict(checkpoint["collocation"])
+		if refiner is not None and checkpoint.get("refiner") is not None:
+			refiner.load_state_dict(checkpoint["refiner"])
+
+	def save_checkpoint(phase, optimiser, scheduler = None):
+		if checkpointer is not None and epochs % checkpointer.every == 0:
+			checkpointer.save({"phase": phase, "epochs": epochs, "model": model.state_dict(), "optimiser": optimiser.state_dict(),
+				"scheduler": None if scheduler is None else scheduler.state_dict(),
+				"loss": loss_history[:epochs], "eigenvalues": eigenvalue_history[:epochs], "components": component_history[:epochs],
+				"Adam_epochs": epochs if phase == "Adam" else adam_epochs,
+				"collocation": None if collocation is None else collocation.state_dict(),
+				"refiner": None if refiner is None else refiner.state_dict()})
+
+	#Precision of the Adam phase (the points are cast from the original x and u, which are kept for the LBFGS phase)
+	def cast(precision):
+		model.to(precision)
+		if collocation is not None:
+			collocation.to(precision)
+		return [t if t.dtype == precision else t.detach().to(precision).requires_grad_(t.requires_grad) for t in (x, u)]
+
+	#Loss and gradients, accumulated block by block for a chunked loss
+	blockwise = model_loss.chunk_size is not None and not model_loss.activation_checkpointing
+
+	def loss_and_gradients(x, u):
+		if blockwise:
+			with profiler.phase("loss_and_backward"):
+				return model_loss.blocks(x,u,weight_loss_factor,backward = True)
+		with profiler.phase("loss"):
+			loss = model_loss(x,u,weight_loss_factor)
+		with profiler.phase("backward"):
+			loss.backward()
+		return loss
+
+	adam_cast = adam_dtype is not None and epochs < epochs_Adam
+	x_Adam, u_Adam = cast(adam_dtype) if adam_cast else (x, u)
+
+	#Initialize the optimiser
+	optimiser = torch.optim.Adam(model.parameters(), lr = lr_Adam)
+
+	scheduler = torch.optim.lr_scheduler.CosineAnnealingWarmRestarts(optimizer = optimiser, T_0 = restarts_optuna )
+
+	if checkpoint is not None and checkpoint["phase"] == "Adam":
+		optimiser.load_state_dict(checkpoint["optimiser"])
+		scheduler.load_state_dict(checkpoint["scheduler"])
+
+	#Train the model with the ADAM optimiser
+	for i in range(min(epochs, epochs_Adam), epochs_Adam):
+		with profiler.epoch(i):
+			x_batch, u_batch = (x_Adam, u_Adam) if collocation is None else collocation.batch()
+
+			optimiser.zero_grad()
+
+			# backpropagate joint loss, take optimiser step
+			loss = loss_and_gradients(x_batch,u_batch)
+			with profiler.phase("optimiser_step"):
+				optimiser.step()
+				scheduler.step()
+
+			with profiler.phase("record"):
+				record(i, loss, model_loss.components, i == epochs_Adam - 1, "Adam", 0)
+			if stop or converged:
+				break
+			if collocation is not None:
+				with profiler.phase("collocation"):
+					collocation.step(i, model_loss)
+			with profiler.phase("checkpoint"):
+				save_checkpoint("Adam", optimiser, scheduler)
+
+	#Number of epochs of the Adam phase, which can end early
+	adam_epochs = checkpoint["Adam_epochs"] if checkpoint is not None and checkpoint["phase"] == "LBFGS" else epochs
+	converged = False
+
+	#Back to the precision of the model for the LBFGS phase
+	if adam_cast:
+		cast(dtype)
+
+	#The LBFGS optimiser needs the same points at every evaluation of the closure
+	if collocation is not None:
+		x, u = collocation.points()
+
+	#Define the closure for the LBFGS optimiser
+	optimiser_tuning = torch.optim.LBFGS(model.parameters(), lr = lr_LBFGS)
+
+	#lossF and lossG of the first evaluation of the closure of each step, which gives the loss returned by the step
+	step_components = []
+
+	def closure():
+		profiler.count("LBFGS_closures")
+		optimiser_tuning.zero_grad()
+		loss = loss_and_gradients(x,u)
+		if not step_components:
+			step_components.append(model_loss.components)
+		return loss
+
+	if checkpoint is not None and checkpoint["phase"] == "LBFGS":
+		optimiser_tuning.load_state_dict(checkpoint["optimiser"])
+
+	#Train the model with the fine tuning optimiser, from the last LBFGS checkpoint (there is no LBFGS phase if stop_loss ended the Adam phase)
+	lbfgs_start = epochs - epochs_Adam if checkpoint is not None and checkpoint["phase"] == "LBFGS" else 0
+	for j in range(lbfgs_start, 0 if stop else epochs_LBFGS):
+		with profiler.epoch(epochs_Adam + j):
+			step_components.clear()
+			with profiler.phase("LBFGS_step"):
+				loss = optimiser_tuning.step(closure)
+
+			with profiler.phase("record"):
+				record(epochs_Adam + j, loss, step_components[0], j == epochs_LBFGS - 1, "LBFGS", epochs_Adam)
+			if stop or converged:
+				break
+			with profiler.phase("checkpoint"):
+				save_checkpoint("LBFGS", optimiser_tuning)
+
+	#Polish the eigenvalues with the networks of the last LBFGS epoch
+	converged = False
+	polish_start = max(epochs, epochs_Adam)
+	for k in range(0 if stop or refiner is None else refiner.epochs):
+		with profiler.epoch(polish_start + k):
+			with profiler.phase("LM_step"):
+				loss = refiner.step(model_loss, x, u, weight_loss_factor).sum()
+
+			with profiler.phase("record"):
+				record(polish_start + k, loss, refiner.components, k == refiner.epochs - 1, "LM", polish_start)
+			if stop or converged:
+				break
+
+	result = history(adam_epochs)
+	if trajectory is not None:
+		trajectory(result)
+	return result
+
+
+def train_ensemble(configs, a, mu, l = 1, m = 1, sign = -1, M = 1, N_x = 100, N_u = 100, hidden_layers = 2, neurons_per_layer = 300,
+		lr_Adam = 1e-3, epochs_Adam = 1500, restarts_optuna = 50, weight_loss_factor = 1):
+	"""
+	Trains several models at once (one per configuration) with the Adam optimiser, using NeuralNetworkEnsemble.
+	Receives as arguments:
+	- configs - list of dictionaries, one per model, with the keys "std_radial", "std_ang" and "random_seed"
+		(and optionally "init_w_real" and "init_w_img", by default given by Detweiler);
+	- a, mu, l, m, sign, M - the configuration of the black hole and of the field;
+	- N_x, N_u - number of points of the radial and angular grids;
+	- hidden_layers, neurons_per_layer, lr_Adam, epochs_Adam, restarts_optuna, weight_loss_factor - shared by all the models.
+	Returns a list with one dictionary per model with the final loss, the loss history and w_real, w_img, A_real and A_img.
+	"""
+	torch.set_default_dtype(torch.float64)
+
+	r_plus = M + np.sqrt(M**2 - a**2)
+	x = torch.linspace(0,1/r_plus,N_x).view(-1,1).to(device)
+	u = torch.linspace(-1,1,N_u).view(-1,1).to(device)
+
+	models = []
+	for config in configs:
+		init_w_real, init_w_img = Detweiler(l,m,a,mu)
+		models.append(NeuralNetwork(activation = "tanh", std_radial = config["std_radial"], std_ang_optuna = config["std_ang"],
+			random_seed = config["random_seed"], hidden_layers = hidden_layers, neurons_per_layer = neurons_per_layer, l = l, m = m,
+			init_w_real = config.get("init_w_real", init_w_real), init_w_img = config.get("init_w_img", init_w_img)).to(device))
+
+	ensemble = NeuralNetworkEnsemble(models, a, mu, sign, M)
+
+	optimiser = torch.optim.Adam(ensemble.parameters(), lr = lr_Adam)
+	scheduler = torch.optim.lr_scheduler.CosineAnnealingWarmRestarts(optimizer = optimiser, T_0 = restarts_optuna)
+
+	loss_history = torch.zeros(epochs_Adam, ensemble.size, device = device)
+	for i in range(epochs_Adam):
+		optimiser.zero_grad()
+		losses = ensemble(x,u,weight_loss_factor)
+
+		# The models are independent, so the gradient of the sum is the gradient of each loss
+		losses.sum().backward()
+		optimiser.step()
+		scheduler.step()
+
+		loss_history[i] = losses.detach()
+
+	w_real, w_img, A_real, A_img = ensemble.eigenvalues()
+	loss_history = loss_history.cpu().numpy()
+
+	results = []
+	for k in range(ensemble.size):
+		results.append({"loss": loss_history[-1, k], "loss_history": loss_history[:, k], "w_real": w_real[k].item(),
+			"w_img": w_img[k].item(), "A_real": A_real[k].item(), "A_img": A_img[k].item()})
+
+	return results
+
+def train_modes(modes, a, mu, sign = -1, M = 1, N_x = 100, N_u = 100, hidden_layers = 2, neurons_per_layer = 300, std_radial = 0.1,
+		std_ang = 0.1, random_seed = 15, lr_Adam = 1e-3, epochs_Adam = 1500, restarts_optuna = 50, lr_LBFGS = 0.05, epochs_LBFGS = 0,
+		weight_loss_factor = 1, initial_guess = "spectral", fused = False, report_every = 1, monitor = None):
+	"""
+	Trains one MultiModeNetwork on several modes (l, m, n) of the same black hole and field at once, with a shared trunk,
+	one output head and one w and A per mode, and the sum of the losses of the modes (see MultiModeLoss), using train_model.
+	Receives as arguments:
+	- modes - list of the modes (l, m, n);
+	- a, mu, sign, M - the configuration of the black hole and of the field;
+	- N_x, N_u - number of points of the radial and angular grids;
+	- hidden_layers, neurons_per_layer, std_radial, std_ang, random_seed, fused - the MultiModeNetwork;
+	- lr_Adam, epochs_Adam, restarts_optuna, lr_LBFGS, epochs_LBFGS, weight_loss_factor, report_every, monitor - passed to train_model;
+	- initial_guess - "detweiler" or "spectral": the initial w and A of each mode are the hydrogenic frequency
+		mu(1 - mu^2/(2(l+1+n)^2)) with Detweiler's imaginary part and l(l+1), or the solution of spectral_QBS
+		(which only converges for the fundamental modes, n = 0; the first guess is used for the other modes).
+		Detweiler's real part (mu) does not depend on n, so the heads of the overtones would all start from the
+		same frequency and collapse onto the fundamental mode.
+	Returns the history of train_model (with one column per mode) and a list with one dictionary per mode
+	with l, m, n, the final lossF and lossG and w_real, w_img, A_real and A_img.
+	"""
+	torch.set_default_dtype(torch.float64)
+	if initial_guess not in ("detweiler", "spectral"):
+		raise ValueError(f"Unknown initial guess: {initial_guess}")
+
+	r_plus = M + np.sqrt(M**2 - a**2)
+	x = torch.linspace(0,1/r_plus,N_x).view(-1,1).to(device)
+	u = torch.linspace(-1,1,N_u).view(-1,1).to(device)
+
+	init = {"w_real": [], "w_img": [], "A_real": [], "A_img": []}
+	for l, m, n in modes:
+		_, w_img = Detweiler(l,m,a,mu,n,M)
+		guess = {"w_real": mu*(1 - mu**2/(2*(l + 1 + n)**2)), "w_img": w_img, "A_real": float(l*(l+1)), "A_img": 0.0}
+		if initial_guess == "spectral":
+			seed = spectral_QBS(a,mu,l,m,n,sign = sign,M = M)
+			if seed["converged"]:
+				guess = seed
+			else:
+				print(f"The spectral solver did not converge for the mode {(l, m, n)}, starting from the hydrogenic frequency")
+		for name in init:
+			init[name].append(guess[name])
+
+	model = MultiModeNetwork(activation = "tanh", std_radial = std_radial, std_ang_optuna = std_ang, random_seed = random_seed,
+		modes = modes, init_w_real = init["w_real"], init_w_img = init["w_img"], init_A_real = init["A_real"], init_A_img = init["A_img"],
+		hidden_layers = hidden_layers, neurons_per_layer = neurons_per_layer, fused = fused).to(device)
+	model_loss = MultiModeLoss(model,a,mu,sign,M)
+
+	history = train_model(model, model_loss, x, u, weight_loss_factor, lr_Adam, epochs_Adam, restarts_optuna, lr_LBFGS, epochs_LBFGS,
+		report_every = report_every, monitor = monitor)
+
+	results = []
+	for k, (l, m, n) in enumerate(model.modes):
+		results.append({"l": l, "m": m, "n": n, "lossF": float(history["lossF"][-1, k]), "lossG": float(history["lossG"][-1, k]),
+			"w_real": model.w_real[k].item(), "w_img": model.w_img[k].item(), "A_real": model.A_real[k].item(), "A_img": model.A_img[k].item()})
+
+	return history, results
@@ -0,0 +1,199 @@
+"""
+Columnar store of the per-epoch training trajectories (loss, lossF, lossG and the eigenvalues) of many trials.
+
+A store is a directory with one subdirectory per column and one .npy file per chunk of rows in each of them:
+
+	store/trial/<chunk>.npy, store/epoch/<chunk>.npy, store/loss/<chunk>.npy, ...
+
+Chunks are only appended (each writer names its own), so several processes can write to the same store,
+and the readers memory-map the columns they need instead of loading the whole store.
+"""
+import os
+import uuid
+import atexit
+import concurrent.futures
+
+import numpy as np
+
+#Columns of the store and their dtypes
+TRAJECTORY_COLUMNS = {"trial": np.int64, "epoch": np.int64, "loss": np.float64, "lossF": np.float64, "lossG": np.float64,
+	"w_real": np.float64, "w_img": np.float64, "A_real": np.float64, "A_img": np.float64}
+
+class TrajectoryWriter:
+	"""
+	Appends the histories returned by train_model to a store. The rows are buffered in memory and every chunk_size rows
+	a chunk is written by a background thread (as in TrialCheckpointer), so the training never waits for the disk.
+	The rest of the rows are written when the writer is closed (for the shared writers, when the worker ends), so the store
+	holds few large chunks however many trials and rungs fill them; a worker killed abruptly loses its buffered rows.
+	Each column of a chunk is written to a temporary file that atomically replaces its final name, and the trial column
+	is written last, so the readers only see complete chunks.
+	Receives as arguments:
+	- path - the directory of the store;
+	- chunk_size - number of rows per chunk.
+	"""
+
+	#Writers shared by the trials of each process (see shared)
+	_shared = {}
+
+	def __init__(self, path, chunk_size = 65536):
+		self.path = path
+		self.chunk_size = chunk_size
+		for column in TRAJECTORY_COLUMNS:
+			os.makedirs(os.path.join(path, column), exist_ok = True)
+
+		self.name = f"{os.getpid()}-{uuid.uuid4().hex[:12]}"
+		self.chunks = 0
+		self.buffer = {column: [] for column in TRAJECTORY_COLUMNS}
+		self.rows = 0
+		self.executor = concurrent.futures.ThreadPoolExecutor(max_workers = 1)
+		self.pending = []
+
+	@classmethod
+	def shared(cls, path, chunk_size = 65536):
+		"""
+		Returns the writer of this process for the store path, created on first use and closed at exit,
+		so the trials run by one worker fill the same chunks.
+		"""
+		key = (os.getpid(), os.path.abspath(path))
+		if key not in cls._shared:
+			cls._shared[key] = cls(path, chunk_size)
+			atexit.register(cls._shared[key].close)
+		return cls._shared[key]
+
+	@classmethod
+	def close_shared(cls):
+		"""
+		Closes the shared writers of this process, writing their buffered rows.
+		"""
+		for key in [key for key in cls._shared if key[0] == os.getpid()]:
+			cls._shared.pop(key).close()
+
+	def append(self, trial, history, epoch_offset = 0):
+		"""
+		Appends the trajectory of one training run.
+		Receives as arguments:
+		- trial - the number of the trial;
+		- history - the dictionary returned by train_model (the columns it does not have are stored as NaN);
+		- epoch_offset - the epoch of the first row (e.g. the epochs of the previous rungs of the trial).
+		"""
+		n = len(history["loss"])
+		self.buffer["trial"].append(np.full(n, trial, dtype = np.int64))
+		self.buffer["epoch"].append(np.arange(epoch_offset, epoch_offset + n, dtype = np.int64))
+		for column in list(TRAJECTORY_COLUMNS)[2:]:
+			values = history.get(column)
+			self.buffer[column].append(np.full(n, np.nan) if values is None else np.asarray(values, dtype = np.float64))
+		self.rows += n
+
+		if self.rows >= self.chunk_size:
+			self.flush(wait = False)
+
+	def _write(self, name, columns):
+		#The trial column is written last, marking the chunk as complete
+		for column in list(TRAJECTORY_COLUMNS)[1:] + ["trial"]:
+			path = os.path.join(self.path, column, f"{name}.npy")
+			with open(path + ".tmp", "wb") as file:
+				np.save(file, columns[column])
+			os.replace(path + ".tmp", path)
+
+	def flush(self, wait = True, background = True):
+		"""
+		Writes the buffered rows as a new chunk, by the background thread if background is True (otherwise in this thread),
+		waiting for the writes to finish if wait is True.
+		"""
+		if self.rows > 0:
+			columns = {column: np.concatenate(values).astype(TRAJECTORY_COLUMNS[column], copy = False)
+				for column, values in self.buffer.items()}
+			name = f"{self.name}-{self.chunks:06d}"
+			if background:
+				self.pending.append(self.executor.submit(self._write, name, columns))
+			else:
+				self._write(name, columns)
+			self.chunks += 1
+			self.buffer = {column: [] for column in TRAJECTORY_COLUMNS}
+			self.rows = 0
+
+		#Raise the errors of the finished writes
+		for future in [future for future in self.pending if wait or future.done()]:
+			self.pending.remove(future)
+			future.result()
+
+	def close(self):
+		#The last chunk is written in this thread: at exit (see shared) the executor no longer accepts writes
+		self.flush(background = False)
+		self.executor.shutdown()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exception):
+		self.close()
+
+class TrajectoryStore:
+	"""
+	Reader of a store written by TrajectoryWriter. The columns of each chunk are memory-mapped on demand,
+	so a query only reads the columns (and the pages of them) it needs.
+	Receives as arguments:
+	- path - the directory of the store.
+	"""
+
+	def __init__(self, path):
+		self.path = path
+		self.refresh()
+
+	def refresh(self):
+		"""
+		Looks for the chunks written since the store was opened.
+		"""
+		directory = os.path.join(self.path, "trial")
+		names = os.listdir(directory) if os.path.isdir(directory) else []
+		self.chunks = sorted(name[:-4] for name in names if name.endswith(".npy"))
+
+	def column(self, name, chunk):
+		"""
+		Returns the column name of a chunk, memory-mapped.
+		"""
+		if name not in TRAJECTORY_COLUMNS:
+			raise ValueError(f"Unknown column: {name}")
+		return np.load(os.path.join(self.path, name, f"{chunk}.npy"), mmap_mode = "r")
+
+	def __len__(self):
+		return sum(len(self.column("trial", chunk)) for chunk in self.chunks)
+
+	def trials(self):
+		"""
+		Returns the sorted numbers of the trials in the store.
+		"""
+		return np.unique(np.concatenate([np.unique(self.column("trial", chunk)) for chunk in self.chunks] or [np.zeros(0, np.int64)]))
+
+	def select(self, columns = None, trials = None):
+		"""
+		Returns a dictionary with the rows of the trials (all of them if trials is None), sorted by trial and epoch,
+		for the columns (by default all of them; "trial" and "epoch" are always included).
+		"""
+		columns = list(TRAJECTORY_COLUMNS) if columns is None else ["trial", "epoch"] + [c for c in columns if c not in ("trial", "epoch")]
+		selected = {column: [] for column in columns}
+		for chunk in self.chunks:
+			rows = slice(None) if trials is None else np.flatnonzero(np.isin(self.column("trial", chunk), trials))
+			if trials is not None and len(rows) == 0:
+				continue
+			for column in columns:
+				selected[column].append(np.asarray(self.column(column, chunk)[rows]))
+
+		selected = {column: np.concatenate(values) if values else np.zeros(0, TRAJECTORY_COLUMNS[column])
+			for column, values in selected.items()}
+		order = np.lexsort((selected["epoch"], selected["trial"]))
+		return {column: values[order] for column, values in selected.items()}
+
+	def trial(self, number, columns = None):
+		"""
+		Returns the trajectory of one trial (see select).
+		"""
+		return self.select(columns, [number])
+
+	def last(self, column = "loss"):
+		"""
+		Returns the numbers of the trials and the value of column at the last epoch of each of them.
+		"""
+		rows = self.select([column])
+		last = np.flatnonzero(np.diff(rows["trial"], append = np.inf))[:len(rows["trial"])]
+		return rows["trial"][last], rows[column][last]
@@ -0,0 +1,85 @@
+import warnings
+
+import numpy as np
+import pytest
+import torch
+
+from qbs_kerr.physics import Detweiler
+from qbs_kerr.networks import NeuralNetwork
+from qbs_kerr.loss import CustomLoss, compile_function
+
+a, mu, l, m = 0.9, 0.4, 1, 1
+
+@pytest.fixture(autouse = True)
+def double_precision():
+	default = torch.get_default_dtype()
+	torch.set_default_dtype(torch.float64)
+	yield
+	torch.set_default_dtype(default)
+
+def make_loss(**kwargs):
+	init_w_real, init_w_img = Detweiler(l,m,a,mu)
+	model = NeuralNetwork(activation = "tanh", std_radial = 0.13, std_ang_optuna = 0.1, random_seed = 15, hidden_layers = 1,
+		neurons_per_layer = 16, l = l, m = m, init_w_real = init_w_real, init_w_img = init_w_img)
+	return CustomLoss(model,a,mu,-1,w_real = init_w_real,w_img = init_w_img,**kwargs)
+
+def grids(requires_grad = False):
+	r_plus = 1 + np.sqrt(1 - a**2)
+	x = torch.linspace(0,1/r_plus,50).view(-1,1).requires_grad_(requires_grad)
+	u = torch.linspace(-1,1,40).view(-1,1).requires_grad_(requires_grad)
+	return x, u
+
+def loss_and_gradients(model_loss, x, u, backward = False):
+	model_loss.NeuralNetwork.zero_grad()
+	if backward:
+		loss = model_loss.blocks(x, u, 1, backward = True)
+	else:
+		loss = model_loss(x, u, 1)
+		loss.backward()
+	return loss.detach(), {name: p.grad.clone() for name, p in model_loss.NeuralNetwork.named_parameters() if p.grad is not None}
+
+def failing_backend(graph, inputs):
+	raise RuntimeError("no compiler")
+
+def double(x):
+	return 2*x
+
+def product(x, y):
+	return x @ y
+
+def test_compilation_errors_fall_back_to_eager_mode():
+	compiled = compile_function(double, backend = failing_backend)
+	with pytest.warns(RuntimeWarning, match = "falling back to eager mode"):
+		assert torch.equal(compiled(torch.ones(3)), 2*torch.ones(3))
+
+	#The fallback is permanent
+	with warnings.catch_warnings():
+		warnings.simplefilter("error")
+		assert torch.equal(compiled(torch.ones(3)), 2*torch.ones(3))
+
+def test_errors_of_the_function_are_raised():
+	compiled = compile_function(product, backend = "eager")
+	with warnings.catch_warnings():
+		warnings.simplefilter("error")
+		with pytest.raises(RuntimeError):
+			compiled(torch.ones(2), torch.ones(3))
+
+@pytest.mark.parametrize("derivatives", ["taylor", "autograd"])
+@pytest.mark.parametrize("mode", ["blocks", "backward", "checkpointing"])
+def test_chunked_loss_matches_the_full_loss(derivatives, mode):
+	x, u = grids(derivatives == "autograd")
+	loss, gradients = loss_and_gradients(make_loss(derivatives = derivatives), x, u)
+
+	chunked = make_loss(derivatives = derivatives, chunk_size = 16, activation_checkpointing = mode == "checkpointing")
+	chunked_loss, chunked_gradients = loss_and_gradients(chunked, x, u, backward = mode == "backward")
+
+	torch.testing.assert_close(chunked_loss, loss)
+	assert chunked_gradients.keys() == gradients.keys()
+	for name in ("w_real", "w_img", "A_real", "A_img"):
+		assert name in gradients
+	for name, gradient in gradients.items():
+		torch.testing.assert_close(chunked_gradients[name], gradient)
+
+	#The blocks share the grid of the F terms of the whole x
+	assert chunked.F_engine._grid_x() is x
+	assert len(chunked.F_engine._grid[0]) == len(x)
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+import torch
+
+from qbs_kerr.physics import Detweiler
+from qbs_kerr.networks import NeuralNetwork
+from qbs_kerr.loss import CustomLoss
+
+a, mu, l, m = 0.9, 0.4, 1, 1
+
+EIGENVALUES = ("w_real", "w_img", "A_real", "A_img")
+
+@pytest.fixture(autouse = True)
+def double_precision():
+	default = torch.get_default_dtype()
+	torch.set_default_dtype(torch.float64)
+	yield
+	torch.set_default_dtype(default)
+
+def loss_and_gradients(derivatives, fused):
+	init_w_real, init_w_img = Detweiler(l,m,a,mu)
+	model = NeuralNetwork(activation = "tanh", std_radial = 0.13, std_ang_optuna = 0.1, random_seed = 15, hidden_layers = 2,
+		neurons_per_layer = 16, l = l, m = m, init_w_real = init_w_real, init_w_img = init_w_img, fused = fused)
+	model_loss = CustomLoss(model,a,mu,-1,w_real = init_w_real,w_img = init_w_img,derivatives = derivatives)
+
+	#Different numbers of radial and angular points, so the fused pass pads the angular ones
+	r_plus = 1 + np.sqrt(1 - a**2)
+	x = torch.linspace(0,1/r_plus,50).view(-1,1).requires_grad_(derivatives == "autograd")
+	u = torch.linspace(-1,1,30).view(-1,1).requires_grad_(derivatives == "autograd")
+	loss = model_loss(x, u, 1)
+	loss.backward()
+
+	gradients = {name: getattr(model, name).grad for name in EIGENVALUES}
+	#The gradients of the layers, stacked as the weights of a TwinNetwork (radial network first)
+	if fused:
+		gradients["weights"] = [weight.grad for weight in model.twin_network.weights]
+		gradients["biases"] = [bias.grad for bias in model.twin_network.biases]
+	else:
+		linears = [(x, u) for x, u in zip(model.x_network, model.u_network) if isinstance(x, torch.nn.Linear)]
+		gradients["weights"] = [torch.stack((x.weight.grad, u.weight.grad)) for x, u in linears]
+		gradients["biases"] = [torch.stack((x.bias.grad, u.bias.grad)) for x, u in linears]
+	return loss.detach(), model_loss.components, gradients
+
+@pytest.mark.parametrize("derivatives, fused", [("taylor", False), ("taylor", True), ("autograd", True)])
+def test_derivative_modes_and_fused_networks_match_autograd(derivatives, fused):
+	reference_loss, reference_components, reference = loss_and_gradients("autograd", False)
+	loss, components, gradients = loss_and_gradients(derivatives, fused)
+
+	torch.testing.assert_close(loss, reference_loss)
+	torch.testing.assert_close(components, reference_components)
+	for name in EIGENVALUES:
+		torch.testing.assert_close(gradients[name], reference[name])
+	for name in ("weights", "biases"):
+		assert len(gradients[name]) == len(reference[name]) == 4
+		for gradient, expected in zip(gradients[name], reference[name]):
+			torch.testing.assert_close(gradient, expected)
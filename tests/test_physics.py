@@ -0,0 +1,27 @@
+import numpy as np
+import torch
+
+from qbs_kerr.physics import F_terms, FTermsEngine
+
+a, mu, m, sign = 0.9, 0.4, 1, -1
+w = torch.tensor(0.39 - 1e-4j, dtype = torch.complex128)
+A = torch.tensor(2.0 + 0j, dtype = torch.complex128)
+
+def test_engine_matches_F_terms_for_fresh_tensors():
+	#New tensors of the same shape are often allocated at the address of the freed ones
+	engine = FTermsEngine(a, m, mu)
+	generator = np.random.default_rng(0)
+	r_plus = 1 + np.sqrt(1 - a**2)
+	for _ in range(200):
+		x = torch.tensor(generator.random((50, 1))/r_plus)
+		for term, reference in zip(engine(w, A, x, sign), F_terms(a, w, A, m, x, mu, sign)):
+			torch.testing.assert_close(term, reference)
+		del x
+
+def test_engine_sees_in_place_updates_of_the_grid():
+	engine = FTermsEngine(a, m, mu)
+	x = torch.linspace(0.1, 0.5, 20, dtype = torch.float64).view(-1,1)
+	engine(w, A, x, sign)
+	x.mul_(0.5)
+	for term, reference in zip(engine(w, A, x, sign), F_terms(a, w, A, m, x, mu, sign)):
+		torch.testing.assert_close(term, reference)
@@ -0,0 +1,10 @@
+from qbs_kerr.backend import device
+from qbs_kerr.profiling import PhaseProfiler
+
+def test_peak_memory_is_labelled_by_its_scope():
+	summary = PhaseProfiler().summary()
+	if device.type == "cuda":
+		assert "peak_memory_MB" in summary and "process_peak_memory_MB" not in summary
+	else:
+		#On the CPU only the peak of the whole process is known
+		assert "process_peak_memory_MB" in summary and "peak_memory_MB" not in summary
@@ -0,0 +1,35 @@
+import numpy as np
+import optuna
+import pytest
+
+from qbs_kerr.pruning import TrajectoryExtrapolationPruner
+
+STEPS = np.arange(1, 31)
+generator = np.random.default_rng(0)
+
+#Reported errors of 30 steps of trials whose final step is 1000
+TRAJECTORIES = {
+	"decaying": STEPS**-1.5*np.exp(0.1*generator.standard_normal(30)),
+	"plateau": 0.05*np.exp(0.05*generator.standard_normal(30)),
+	"oscillating": 0.05*STEPS**-0.3*np.exp(1.5*(-1)**STEPS),
+}
+
+def study():
+	#Complete trials whose final error is 1e-3
+	study = optuna.create_study(direction = "minimize")
+	for _ in range(5):
+		study.add_trial(optuna.trial.create_trial(value = 1e-3, intermediate_values = {1000: 1e-3}))
+	return study
+
+def trial(values):
+	return optuna.trial.create_trial(state = optuna.trial.TrialState.RUNNING, user_attrs = {"final_step": 1000},
+		intermediate_values = dict(zip(STEPS.tolist(), values)))
+
+@pytest.mark.parametrize("name, pruned", [("decaying", False), ("plateau", True), ("oscillating", True)])
+def test_extrapolation_pruner(name, pruned):
+	assert TrajectoryExtrapolationPruner().prune(study(), trial(TRAJECTORIES[name])) == pruned
+
+def test_oscillations_make_the_prediction_worse():
+	pruner = TrajectoryExtrapolationPruner()
+	trend = 0.05*STEPS**-0.3
+	assert pruner.predict(STEPS, TRAJECTORIES["oscillating"], 1000) > pruner.predict(STEPS, trend, 1000)
@@ -0,0 +1,24 @@
+import os
+import sys
+import json
+import subprocess
+
+from qbs_kerr.reference import Leaver
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_concurrent_workers_share_the_cache(tmp_path):
+	cache_path = str(tmp_path / "leaver_cache.json")
+	workers = []
+	for worker in range(3):
+		script = ("from qbs_kerr.reference import Leaver\n"
+			f"for mu in (0.30 + 0.01*{worker}, 0.36 + 0.01*{worker}):\n"
+			f"\tLeaver(0.9, mu, 1, 1, cache_path = {cache_path!r})\n")
+		workers.append(subprocess.Popen([sys.executable, "-c", script], cwd = ROOT))
+	assert all(worker.wait() == 0 for worker in workers)
+
+	with open(cache_path) as file:
+		cache = json.load(file)
+	assert len(cache) == 6
+	assert tuple(cache[f"{0.9!r},{0.31!r},1,1,0,-1"]) == Leaver(0.9, 0.31, 1, 1, cache_path = False)
+	assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
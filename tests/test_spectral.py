@@ -0,0 +1,35 @@
+import pytest
+import torch
+
+from qbs_kerr.reference import Leaver
+from qbs_kerr.spectral import spectral_QBS
+
+@pytest.fixture(autouse = True)
+def double_precision():
+	default = torch.get_default_dtype()
+	torch.set_default_dtype(torch.float64)
+	yield
+	torch.set_default_dtype(default)
+
+#Configurations (a, mu, l, m) of the range where the spectral seed is trusted (see spectral_QBS)
+TRUSTED = [(0.0, 0.4, 1, 1), (0.5, 0.4, 1, 1), (0.95, 0.4, 1, 1), (0.9, 0.5, 1, 1)]
+
+#Configurations that the default grids do not resolve, including a spurious root with small Newton steps (0.9, 0.4, 1, 0)
+UNRESOLVED = [(0.9, 0.4, 1, 0), (0.9, 0.5, 2, 2), (0.0, 0.2, 1, 1), (0.9, 0.4, 1, -1)]
+
+@pytest.mark.parametrize("configuration", TRUSTED)
+def test_converged_solutions_match_Leaver(configuration):
+	result = spectral_QBS(*configuration)
+	w_real, w_img = Leaver(*configuration, cache_path = False)
+	assert result["converged"]
+	assert abs(result["w_real"] - w_real) < 1e-5*abs(w_real)
+	assert abs(result["w_img"] - w_img) < 2e-2*abs(w_img)
+
+@pytest.mark.parametrize("configuration", UNRESOLVED)
+def test_unresolved_configurations_are_not_converged(configuration):
+	assert not spectral_QBS(*configuration)["converged"]
+
+@pytest.mark.parametrize("n", [1, 2])
+def test_overtones_are_not_converged(n):
+	#Newton's method settles on the fundamental mode instead of the overtone
+	assert not spectral_QBS(0.5, 0.4, 1, 1, n)["converged"]
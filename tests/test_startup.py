@@ -0,0 +1,37 @@
+import os
+import sys
+import time
+import subprocess
+
+import qbs_kerr
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+#Modules that the package and its command line must only import on first use
+HEAVY_MODULES = ("torch", "optuna", "scipy", "numpy", "matplotlib")
+
+#Generous bound of the startup time of a new interpreter, in seconds
+STARTUP_SECONDS = 5.0
+
+def imported_modules(command):
+	#Runs command in a new interpreter and returns the heavy modules it imported and the time it took
+	check = command + f"\nimport sys\nprint(' '.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+	start = time.perf_counter()
+	output = subprocess.run([sys.executable, "-c", check], cwd = ROOT, capture_output = True, text = True, check = True).stdout
+	return output.split(), time.perf_counter() - start
+
+def test_import_is_lazy_and_fast():
+	modules, seconds = imported_modules("import qbs_kerr")
+	assert modules == []
+	assert seconds < STARTUP_SECONDS
+
+def test_command_line_help_is_lazy():
+	command = ("import contextlib, io\nfrom qbs_kerr.cli import main\n"
+		"with contextlib.redirect_stdout(io.StringIO()), contextlib.suppress(SystemExit): main(['--help'])")
+	modules, seconds = imported_modules(command)
+	assert modules == []
+	assert seconds < STARTUP_SECONDS
+
+def test_every_export_resolves():
+	for name, module in qbs_kerr._EXPORTS.items():
+		assert getattr(qbs_kerr, name) is getattr(sys.modules[f"qbs_kerr.{module}"], name)
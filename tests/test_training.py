@@ -0,0 +1,163 @@
+import numpy as np
+import pytest
+import torch
+
+from qbs_kerr.physics import Detweiler
+from qbs_kerr.networks import NeuralNetwork
+from qbs_kerr.loss import CustomLoss
+from qbs_kerr.training import CollocationSampler, EigenvalueRefiner, TrialCheckpointer, train_model, train_modes
+
+a, mu, l, m = 0.9, 0.4, 1, 1
+
+@pytest.fixture(autouse = True)
+def double_precision():
+	default = torch.get_default_dtype()
+	torch.set_default_dtype(torch.float64)
+	yield
+	torch.set_default_dtype(default)
+
+def make_model():
+	init_w_real, init_w_img = Detweiler(l,m,a,mu)
+	model = NeuralNetwork(activation = "tanh", std_radial = 0.13, std_ang_optuna = 0.1, random_seed = 15, hidden_layers = 1,
+		neurons_per_layer = 16, l = l, m = m, init_w_real = init_w_real, init_w_img = init_w_img)
+	return model, CustomLoss(model,a,mu,-1,w_real = init_w_real,w_img = init_w_img)
+
+def grids():
+	r_plus = 1 + np.sqrt(1 - a**2)
+	return torch.linspace(0,1/r_plus,20).view(-1,1), torch.linspace(-1,1,20).view(-1,1)
+
+class Interrupted(Exception):
+	pass
+
+def train(checkpointer = None, interrupt_at = None, stop_loss = None, epochs_Adam = 6, epochs_LBFGS = 3):
+	model, model_loss = make_model()
+	x, u = grids()
+
+	def report(step, w_real, w_img, loss):
+		#Every checkpoint is written before the next one is due, so none of them is skipped
+		if checkpointer is not None:
+			checkpointer.wait()
+		if step == interrupt_at:
+			raise Interrupted()
+
+	return train_model(model, model_loss, x, u, 1, 1e-3, epochs_Adam, 5, 0.1, epochs_LBFGS, report = report, stop_loss = stop_loss,
+		checkpointer = checkpointer)
+
+def test_stop_loss_skips_the_LBFGS_phase():
+	history = train(stop_loss = np.inf)
+	assert history["epochs"] == 1
+	assert history["Adam_epochs"] == 1
+
+def test_stop_loss_after_resuming_in_the_Adam_phase(tmp_path):
+	checkpointer = TrialCheckpointer(str(tmp_path), 0, every = 1)
+	with pytest.raises(Interrupted):
+		train(checkpointer, interrupt_at = 3)
+
+	#The run resumes at epoch 3 and stop_loss ends it there, without LBFGS epochs
+	history = train(checkpointer, stop_loss = np.inf)
+	assert history["epochs"] == 4
+	assert history["Adam_epochs"] == 4
+
+def test_resume_in_the_LBFGS_phase(tmp_path):
+	checkpointer = TrialCheckpointer(str(tmp_path), 0, every = 1)
+	with pytest.raises(Interrupted):
+		train(checkpointer, interrupt_at = 7)
+
+	#The LBFGS epoch 6 was checkpointed, so only epochs 7 and 8 are left
+	history = train(checkpointer)
+	assert history["epochs"] == 9
+	assert history["Adam_epochs"] == 6
+	assert len(history["loss"]) == 9
+
+class RecordingLoss(CustomLoss):
+	#Keeps the radial points of every evaluation of the loss
+	def forward(self, x, u, weight_loss_factor):
+		self.seen.append(x.detach().clone())
+		return super().forward(x, u, weight_loss_factor)
+
+@pytest.mark.parametrize("sampled", [False, True])
+def test_mixed_precision_LBFGS_phase_uses_the_original_points(sampled):
+	model, _ = make_model()
+	model_loss = RecordingLoss(model,a,mu,-1,w_real = model.w_real.item(),w_img = model.w_img.item())
+	model_loss.seen = []
+	x, u = grids()
+	collocation = CollocationSampler(x, u, batch_size = 10) if sampled else None
+
+	train_model(model, model_loss, x, u, 1, 1e-3, 3, 5, 0.1, 2, adam_dtype = torch.float32, collocation = collocation)
+
+	assert all(seen.dtype == torch.float32 for seen in model_loss.seen[:3])
+	assert model_loss.seen[-1].dtype == torch.float64
+	assert torch.equal(model_loss.seen[-1], x)
+
+def test_LM_polish_follows_the_LBFGS_phase():
+	x, u = grids()
+	model, model_loss = make_model()
+	baseline = train_model(model, model_loss, x, u, 1, 1e-3, 5, 5, 0.1, 3)
+
+	model, model_loss = make_model()
+	polished = train_model(model, model_loss, x, u, 1, 1e-3, 5, 5, 0.1, 3, refiner = EigenvalueRefiner(epochs = 4))
+
+	#The Adam and LBFGS epochs are not changed by the refiner, and the polish never increases the loss
+	assert polished["epochs"] == 12
+	np.testing.assert_array_equal(polished["loss"][:8], baseline["loss"])
+	assert np.all(np.diff(polished["loss"][8:]) <= 0)
+	np.testing.assert_allclose(polished["lossF"][8:]*10 + polished["lossG"][8:], polished["loss"][8:])
+
+@pytest.mark.parametrize("derivatives", ["autograd", "taylor"])
+def test_refine_adds_the_largest_residuals(derivatives):
+	model, _ = make_model()
+	model_loss = CustomLoss(model,a,mu,-1,w_real = model.w_real.item(),w_img = model.w_img.item(),derivatives = derivatives)
+	x, u = grids()
+	x, u = x.requires_grad_(derivatives == "autograd"), u.requires_grad_(derivatives == "autograd")
+	x_pool, u_pool = grids()
+	x_pool, u_pool = x_pool[1:-1] + 0.01, u_pool[1:-1]*0.99
+	sampler = CollocationSampler(x, u, x_pool = x_pool, u_pool = u_pool, refine_every = 1, refine_points = 3, chunk_size = 7)
+
+	sampler.refine(model_loss)
+
+	w, A = (value.detach() for value in model_loss.eigenvalues())
+	with torch.set_grad_enabled(derivatives == "autograd"):
+		residual = torch.abs(model_loss.residual_F(x_pool.clone().requires_grad_(derivatives == "autograd"), w, A)).detach().sum(dim=1)
+	assert len(sampler.x) == 23 and len(sampler.u) == 23
+	assert sampler.x.requires_grad == (derivatives == "autograd")
+	torch.testing.assert_close(sampler.x[20:], x_pool[torch.topk(residual, 3)[1]])
+
+def test_LM_step_is_the_same_in_blocks():
+	x, u = grids()
+	steps = []
+	for chunk_size in (None, 7):
+		model, model_loss = make_model()
+		model_loss.chunk_size = chunk_size
+		refiner = EigenvalueRefiner()
+		losses = [refiner.step(model_loss, x, u, 1) for _ in range(3)]
+		steps.append((torch.stack(losses), torch.stack([p.detach() for p in (model.w_real, model.w_img, model.A_real, model.A_img)])))
+
+	for full, chunked in zip(*steps):
+		torch.testing.assert_close(chunked, full)
+
+@pytest.mark.parametrize("initial_guess", ["detweiler", "spectral"])
+def test_overtone_heads_train_to_different_eigenvalues(initial_guess):
+	modes = [(1, 1, 0), (1, 1, 1), (1, 1, 2)]
+	_, results = train_modes(modes, a, mu, N_x = 30, N_u = 30, hidden_layers = 1, neurons_per_layer = 16, lr_Adam = 1e-4,
+		epochs_Adam = 20, initial_guess = initial_guess)
+
+	#The heads start from the hydrogenic levels of their overtones and keep their order
+	w_real = np.array([result["w_real"] for result in results])
+	assert np.all(np.diff(w_real) > 1e-3)
+
+def test_LM_step_lowers_the_loss():
+	x, u = grids()
+	model, model_loss = make_model()
+	train_model(model, model_loss, x, u, 1, 1e-3, 5, 5, 0.1, 3)
+	networks = [p.detach().clone() for name, p in model.named_parameters() if "network" in name]
+
+	refiner = EigenvalueRefiner()
+	losses = [model_loss(x, u, 1).item()]
+	for _ in range(3):
+		losses.append(refiner.step(model_loss, x, u, 1).item())
+		#The loss of the new eigenvalues is the one returned by the step
+		np.testing.assert_allclose(model_loss(x, u, 1).item(), losses[-1])
+
+	assert losses[1] < losses[0]
+	assert np.all(np.diff(losses) <= 0)
+	assert all(torch.equal(p, q) for p, q in zip(networks, [p for name, p in model.named_parameters() if "network" in name]))
@@ -0,0 +1,60 @@
+import os
+import sys
+import subprocess
+
+import numpy as np
+
+from qbs_kerr.trajectories import TrajectoryWriter, TrajectoryStore
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def history(n, start = 0.0):
+	return {"loss": np.arange(start, start + n), "lossF": np.ones(n), "lossG": np.zeros(n),
+		"w_real": np.full(n, 0.39), "w_img": np.full(n, -1e-5), "A_real": np.full(n, 2.0), "A_img": np.zeros(n)}
+
+def test_rows_below_chunk_size_are_written_on_close(tmp_path):
+	with TrajectoryWriter(str(tmp_path)) as writer:
+		writer.append(3, history(5))
+		writer.append(4, history(2, 10.0), epoch_offset = 7)
+
+	store = TrajectoryStore(str(tmp_path))
+	assert len(store) == 7
+	assert list(store.trials()) == [3, 4]
+	rows = store.trial(4, ["loss"])
+	assert list(rows["epoch"]) == [7, 8]
+	assert list(rows["loss"]) == [10.0, 11.0]
+
+def test_shared_writer_is_flushed_at_exit(tmp_path):
+	#The shared writer is closed by an atexit hook, after the executors of the interpreter are shut down
+	script = ("import numpy as np\n"
+		"from qbs_kerr.trajectories import TrajectoryWriter\n"
+		f"TrajectoryWriter.shared({str(tmp_path)!r}).append(1, {{'loss': np.arange(3.0)}})\n")
+	subprocess.run([sys.executable, "-c", script], check = True, cwd = ROOT)
+
+	rows = TrajectoryStore(str(tmp_path)).trial(1)
+	assert list(rows["loss"]) == [0.0, 1.0, 2.0]
+	assert np.isnan(rows["w_real"]).all()
+
+def test_trials_and_rungs_of_several_workers_fill_few_chunks(tmp_path):
+	#Two workers, each running 3 trials of 3 rungs of 50 epochs, with chunks of at least 120 rows
+	script = ("import sys\n"
+		"from qbs_kerr.trajectories import TrajectoryWriter\n"
+		"from tests.test_trajectories import history\n"
+		"worker = int(sys.argv[1])\n"
+		"for trial in range(3*worker, 3*worker + 3):\n"
+		"	for rung in range(3):\n"
+		f"		TrajectoryWriter.shared({str(tmp_path)!r}, chunk_size = 120).append(trial, history(50, 1000*trial + 50*rung), epoch_offset = 50*rung)\n"
+		"TrajectoryWriter.close_shared()\n")
+	workers = [subprocess.Popen([sys.executable, "-c", script, str(worker)], cwd = ROOT) for worker in range(2)]
+	assert all(worker.wait() == 0 for worker in workers)
+
+	store = TrajectoryStore(str(tmp_path))
+	assert len(store) == 900
+	assert len(store.chunks) == 6
+	assert list(store.trials()) == list(range(6))
+	for trial in range(6):
+		rows = store.trial(trial, ["loss", "w_real"])
+		assert list(rows["epoch"]) == list(range(150))
+		assert list(rows["loss"]) == list(np.arange(1000.0*trial, 1000.0*trial + 150))
+	trials, loss = store.last()
+	assert list(loss) == [1000.0*trial + 149 for trial in trials]